@@ -6,23 +6,18 @@ from collections import defaultdict, Counter
 import statistics
 import math
 
+from client_repository import ClientRepository, get_client_repository
+
 class AnalyticsEngine:
     """Advanced analytics engine for client risk assessment and resource tracking."""
     
-    def __init__(self):
-        self.clients_file = 'clients.json'
+    def __init__(self, client_repository: Optional[ClientRepository] = None):
+        self.client_repository = client_repository or get_client_repository()
         self.resources_file = 'structured_resources.json'
     
     def load_clients(self) -> Dict[str, Any]:
-        """Load clients data from JSON file."""
-        try:
-            if os.path.exists(self.clients_file):
-                with open(self.clients_file, 'r') as f:
-                    return json.load(f)
-            return {'clients': []}
-        except Exception as e:
-            print(f"Error loading clients: {e}")
-            return {'clients': []}
+        """Get clients data from the shared in-memory client repository."""
+        return self.client_repository.snapshot()
     
     def load_resources(self) -> List[Dict[str, Any]]:
         """Load resources data from JSON file."""
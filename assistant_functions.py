@@ -1,7 +1,8 @@
 import json
 import os
 import logging
-from openai import OpenAI
+from client_repository import get_client_repository
+from llm_gateway import get_llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -9,15 +10,15 @@ class AssistantFnc:
     def __init__(self):
         self.conversation_history = []
         self.current_client = None
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        self.llm_gateway = get_llm_gateway()
+        self.client_repository = get_client_repository()
 
     async def lookup_client(self, client_id: str) -> dict:
         """Look up a client by their ID number."""
-        clients_data = self.load_clients()
-        for client in clients_data.get('clients', []):
-            if str(client.get('id', '')) == client_id:
-                self.current_client = client
-                return client
+        client = self.client_repository.get(client_id)
+        if client:
+            self.current_client = client
+            return client
         return {"error": "Client not found"}
 
     async def get_case_history(self) -> dict:
@@ -36,7 +37,7 @@ class AssistantFnc:
     async def translate_text(self, text: str, target_language: str) -> dict:
         """Translate text to the specified language using OpenAI."""
         try:
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm_gateway.openai.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -90,7 +91,7 @@ class AssistantFnc:
                 "4. Track client progress and resource assignments"
             ],
             "total_resources": len(self.load_resources().get('resources', [])),
-            "total_clients": len(self.load_clients().get('clients', []))
+            "total_clients": self.client_repository.count()
         }
     
     async def search_resources_by_category(self, category: str) -> dict:
@@ -133,15 +134,8 @@ class AssistantFnc:
         return stats
 
     def load_clients(self):
-        """Load clients from JSON file."""
-        try:
-            if os.path.exists('clients.json'):
-                with open('clients.json', 'r') as f:
-                    return json.load(f)
-            return {'clients': []}
-        except Exception as e:
-            logger.error(f"Error loading clients: {e}")
-            return {'clients': []}
+        """Get clients from the shared in-memory client repository."""
+        return self.client_repository.snapshot()
 
     def load_resources(self):
         """Load resources from JSON file."""
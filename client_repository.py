@@ -0,0 +1,622 @@
+import asyncio
+import bisect
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from client_storage import ClientStorage, apply_client_op, create_client_storage
+
+logger = logging.getLogger(__name__)
+
+# Parsed records kept in memory when the storage backend is non-resident (jsonl)
+CLIENT_CACHE_SIZE = int(os.environ.get('CLIENT_CACHE_SIZE', 1024))
+
+
+def normalize_email(email: Optional[str]) -> str:
+    """Normalize an email address the same way every lookup in the API does."""
+    return (email or '').strip().lower()
+
+
+def _assessment(client: Dict[str, Any]) -> Dict[str, Any]:
+    assessment = client.get('needsAssessment')
+    return assessment if isinstance(assessment, dict) else {}
+
+
+def _needed_categories(client: Dict[str, Any]) -> List[str]:
+    """Need categories currently marked as needed in the client's assessment."""
+    current_needs = _assessment(client).get('currentNeeds') or {}
+    return [need for need, details in current_needs.items() if isinstance(details, dict) and details.get('needed')]
+
+
+# Secondary indexes: filter name -> the values a client is filed under
+INDEXED_FIELDS = {
+    'riskLevel': lambda client: [client.get('riskLevel')],
+    'source': lambda client: [client.get('source')],
+    'registrationStatus': lambda client: [client.get('registrationStatus')],
+    'needsAssessment.status': lambda client: [_assessment(client).get('status', 'pending')],
+    'need': _needed_categories,
+}
+
+SORT_FIELDS = ('createdAt', 'priorityScore', 'lastDailySurvey')
+
+
+def _index_value(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+def _sort_value(client: Dict[str, Any], field: str) -> Tuple[bool, Any]:
+    """(present, value) with a type-stable placeholder for missing values."""
+    value = client.get(field)
+    if field == 'priorityScore':
+        try:
+            return True, float(value)
+        except (TypeError, ValueError):
+            return False, 0.0
+    if value in (None, ''):
+        return False, ''
+    return True, str(value)
+
+
+RISK_RANK = {'CRITICAL': 4, 'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+
+
+def caseload_priority_key(client: Dict[str, Any]) -> Tuple[int, float, str]:
+    """(risk rank, priorityScore, lastDailySurvey) - larger sorts as more urgent."""
+    try:
+        score = float(client.get('priorityScore'))
+    except (TypeError, ValueError):
+        score = -1.0
+    rank = RISK_RANK.get(str(client.get('riskLevel') or '').strip().upper(), 0)
+    return rank, score, str(client.get('lastDailySurvey') or '')
+
+
+class _CaseloadQueue:
+    """Client ids kept sorted by caseload_priority_key; bisect updates, top-n is a slice."""
+
+    def __init__(self):
+        self._entries: List[Tuple] = []  # (rank, score, lastDailySurvey, id), ascending
+        self._keys: Dict[Any, Tuple] = {}
+
+    def key(self, client_id: Any) -> Optional[Tuple]:
+        return self._keys.get(client_id)
+
+    def update(self, client_id: Any, key: Optional[Tuple]) -> None:
+        """Move a client to its new position (key None removes it)."""
+        old = self._keys.pop(client_id, None)
+        if old is not None:
+            entry = old + (client_id,)
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+        if key is not None:
+            bisect.insort(self._entries, key + (client_id,))
+            self._keys[client_id] = key
+
+    def top(self, n: int) -> List[Any]:
+        return [entry[-1] for entry in reversed(self._entries[-n:])] if n > 0 else []
+
+
+def _coerce_id(client_id: Any) -> Any:
+    """Client ids are stored as ints; accept numeric strings from JSON bodies and the voice agent."""
+    if isinstance(client_id, str) and client_id.strip().isdigit():
+        return int(client_id.strip())
+    return client_id
+
+
+class ClientLock:
+    """
+    Reentrant per-client lock shared by threads and by coroutines on any event loop.
+
+    Ownership is per asyncio task when acquired inside one, otherwise per thread, so
+    a handler holding the lock can call repository methods that take it again.
+    Use ``async with`` from coroutines: it polls with a short backoff instead of
+    blocking the loop while another thread (e.g. the background form processor)
+    holds the lock. Never await while holding it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._owner = None
+        self._depth = 0
+
+    @staticmethod
+    def _current_owner() -> Any:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return task if task is not None else threading.get_ident()
+
+    def acquire(self, blocking: bool = True) -> bool:
+        me = self._current_owner()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+                return True
+            while self._owner is not None:
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self._owner = me
+            self._depth = 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            if self._owner != self._current_owner():
+                raise RuntimeError("ClientLock released by a non-owner")
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        delay = 0.0005
+        while not self.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class _MutationGate:
+    """Shared/exclusive gate: mutations enter shared, storage compaction enters exclusive."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._active = 0
+        self._exclusive = False
+
+    def __enter__(self):
+        with self._cond:
+            while self._exclusive:
+                self._cond.wait()
+            self._active += 1
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._active -= 1
+            if self._active == 0:
+                self._cond.notify_all()
+
+    def exclusive(self) -> '_ExclusiveGate':
+        return _ExclusiveGate(self)
+
+
+class _ExclusiveGate:
+    def __init__(self, gate: _MutationGate):
+        self.gate = gate
+
+    def __enter__(self):
+        with self.gate._cond:
+            while self.gate._exclusive or self.gate._active:
+                self.gate._cond.wait()
+            self.gate._exclusive = True
+
+    def __exit__(self, *exc):
+        with self.gate._cond:
+            self.gate._exclusive = False
+            self.gate._cond.notify_all()
+
+
+class _LazyClientMap(MutableMapping):
+    """
+    id -> client mapping over a non-resident storage backend.
+
+    Every id is known up front; records are parsed from storage on first access and
+    kept in a bounded LRU cache. Assigning a key pins the given record in the cache.
+    """
+
+    def __init__(self, storage: ClientStorage, client_ids: Iterable[Any], cache_size: int = CLIENT_CACHE_SIZE):
+        self.storage = storage
+        self.cache_size = max(cache_size, 1)
+        self._ids = dict.fromkeys(client_ids)
+        self._cache: 'OrderedDict[Any, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, client_id: Any) -> Dict[str, Any]:
+        with self._lock:
+            if client_id not in self._ids:
+                raise KeyError(client_id)
+            client = self._cache.get(client_id)
+            if client is None:
+                client = self.storage.read_client(client_id)
+                if client is None:
+                    raise KeyError(client_id)
+                self._remember(client_id, client)
+            else:
+                self._cache.move_to_end(client_id)
+            return client
+
+    def _remember(self, client_id: Any, client: Dict[str, Any]) -> None:
+        self._cache[client_id] = client
+        self._cache.move_to_end(client_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __setitem__(self, client_id: Any, client: Dict[str, Any]) -> None:
+        with self._lock:
+            self._ids[client_id] = None
+            self._remember(client_id, client)
+
+    def __delitem__(self, client_id: Any) -> None:
+        with self._lock:
+            del self._ids[client_id]
+            self._cache.pop(client_id, None)
+
+    def __contains__(self, client_id: Any) -> bool:
+        return client_id in self._ids
+
+    def __iter__(self):
+        return iter(list(self._ids))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def values(self) -> List[Dict[str, Any]]:
+        """Every record, without flushing the hot set out of the cache."""
+        clients = []
+        for client_id in list(self._ids):
+            with self._lock:
+                client = self._cache.get(client_id)
+            if client is None:
+                client = self.storage.read_client(client_id)
+            if client is not None:
+                clients.append(client)
+        return clients
+
+
+class ClientRepository:
+    """
+    Process-wide, in-memory view of the client records.
+
+    The storage backend is read once at startup. Point lookups by id or normalized
+    email are O(1) dictionary hits and never touch storage again (with a non-resident
+    backend such as jsonl only the ids and emails are loaded, and a lookup parses
+    the one record on a cache miss). Secondary indexes over INDEXED_FIELDS back
+    query(), so filtered views only touch the matching records, and a caseload
+    queue ordered by caseload_priority_key backs top_priority().
+
+    Every mutation is described as an op (see client_storage.apply_client_op),
+    applied to the resident records and then handed to the storage backend to
+    persist. Backends may persist
+    lazily; pass durable=True (or call flush(), or await aflush() on an event loop)
+    where the response must not be sent before the change is on disk.
+    Returned client dicts are the live records and must be treated as read-only.
+
+    Locking: each client has its own ClientLock, so writes to different clients run
+    in parallel while writes to the same client are linearized. The store lock only
+    covers id allocation and the dict/index structure. Handlers that read a client,
+    derive new values from it and write them back hold client_lock() for the whole
+    read-modify-write.
+    """
+
+    def __init__(self, storage: Optional[ClientStorage] = None):
+        self.storage = storage or create_client_storage()
+        self.storage.attach(self)
+        self._lock = threading.RLock()  # id allocation and index structure only
+        self._client_locks: Dict[Any, ClientLock] = {}
+        self._gate = _MutationGate()
+        self._clients: Dict[Any, Dict[str, Any]] = {}  # insertion-ordered, like the JSON list
+        self._ids_by_email: Dict[str, List[Any]] = {}
+        self._field_index: Dict[str, Dict[str, set]] = {name: {} for name in INDEXED_FIELDS}
+        self._field_keys: Dict[Any, Dict[str, frozenset]] = {}  # id -> values it is filed under
+        self._caseload = _CaseloadQueue()
+        self._next_id = 1
+        self._load()
+
+    def _load(self) -> None:
+        """Load clients from storage and build the indexes."""
+        if self.storage.resident:
+            data = self.storage.load()
+            for client in data.get('clients', []):
+                self._clients[client.get('id')] = client
+                self._index_email(client)
+        else:
+            # Only ids and emails are resident; records are parsed on demand
+            data = self.storage.load_index()
+            self._clients = _LazyClientMap(self.storage, [client_id for client_id, _ in data['clients']])
+            for client_id, email in data['clients']:
+                self._index_email({'id': client_id, 'email': email})
+        # One pass over the records (a single streaming parse for non-resident storage)
+        for client in self._clients.values():
+            self._reindex(client.get('id'), client)
+        self._next_id = data.get('next_id', 1)
+        logger.info(f"Client repository loaded {len(self._clients)} clients from the {self.storage.name} store")
+
+    # ---------- indexes ----------
+
+    def _index_email(self, client: Dict[str, Any]) -> None:
+        email = normalize_email(client.get('email'))
+        if email:
+            ids = self._ids_by_email.setdefault(email, [])
+            if client.get('id') not in ids:
+                ids.append(client.get('id'))
+
+    @staticmethod
+    def _field_keys_for(client: Dict[str, Any]) -> Dict[str, frozenset]:
+        return {name: frozenset(_index_value(value) for value in extract(client) if value not in (None, ''))
+                for name, extract in INDEXED_FIELDS.items()}
+
+    def _index_fields(self, client_id: Any, keys: Optional[Dict[str, frozenset]]) -> None:
+        """Refile a client under new secondary-index keys (None removes it). Caller holds the store lock."""
+        old = self._field_keys.pop(client_id, {})
+        if keys is not None:
+            self._field_keys[client_id] = keys
+        for name in INDEXED_FIELDS:
+            before = old.get(name, frozenset())
+            after = keys.get(name, frozenset()) if keys is not None else frozenset()
+            index = self._field_index[name]
+            for value in before - after:
+                ids = index.get(value)
+                if ids is not None:
+                    ids.discard(client_id)
+                    if not ids:
+                        del index[value]
+            for value in after - before:
+                index.setdefault(value, set()).add(client_id)
+
+    def _reindex(self, client_id: Any, client: Optional[Dict[str, Any]]) -> None:
+        """Refile a client in the secondary indexes and caseload queue (None removes it). Caller holds the store lock."""
+        self._index_fields(client_id, self._field_keys_for(client) if client is not None else None)
+        self._caseload.update(client_id, caseload_priority_key(client) if client is not None else None)
+
+    def _needs_reindex(self, client_id: Any, client: Dict[str, Any]) -> bool:
+        return (self._field_keys_for(client) != self._field_keys.get(client_id)
+                or caseload_priority_key(client) != self._caseload.key(client_id))
+
+    def _unindex_email(self, client: Dict[str, Any]) -> None:
+        email = normalize_email(client.get('email'))
+        ids = self._ids_by_email.get(email)
+        if ids and client.get('id') in ids:
+            ids.remove(client.get('id'))
+            if not ids:
+                del self._ids_by_email[email]
+
+    def client_lock(self, client_id: Any) -> ClientLock:
+        """The lock serializing writes to one client (a private throwaway lock for unknown ids)."""
+        client_id = _coerce_id(client_id)
+        with self._lock:
+            lock = self._client_locks.get(client_id)
+            if lock is None:
+                lock = ClientLock()
+                if client_id in self._clients:
+                    self._client_locks[client_id] = lock
+            return lock
+
+    def _commit(self, op: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply an op to the resident records, keep indexes in sync and persist it."""
+        client_id = op['client']['id'] if op['op'] == 'add_client' else op.get('client_id')
+        with self._gate, self.client_lock(client_id):
+            structural = op['op'] in ('add_client', 'delete_client') or 'email' in op.get('fields', {})
+            if structural:
+                with self._lock:
+                    before = self._clients.get(client_id)
+                    if before is not None:
+                        self._unindex_email(before)
+                    client = apply_client_op(self._clients, op)
+                    if client is not None and op['op'] != 'delete_client':
+                        self._index_email(client)
+                        self._reindex(client_id, client)
+                    if op['op'] == 'delete_client':
+                        self._reindex(client_id, None)
+                        self._client_locks.pop(client_id, None)
+            else:
+                client = apply_client_op(self._clients, op)
+                if client is not None and self._needs_reindex(client_id, client):
+                    with self._lock:
+                        self._reindex(client_id, client)
+            if client is not None:
+                self.storage.write(op, None if op['op'] == 'delete_client' else client)
+                if not self.storage.resident and op['op'] != 'delete_client':
+                    # Keep the updated record cached even if it was evicted while being changed
+                    self._clients[client_id] = client
+            return client
+
+    # ---------- reads ----------
+
+    def get(self, client_id: Any) -> Optional[Dict[str, Any]]:
+        """Get a client by id."""
+        return self._clients.get(_coerce_id(client_id))
+
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get the first client registered under an email (case/whitespace insensitive)."""
+        ids = self._ids_by_email.get(normalize_email(email))
+        if not ids:
+            return None
+        return self._clients.get(ids[0])
+
+    def all(self) -> List[Dict[str, Any]]:
+        """All clients in insertion order."""
+        return list(self._clients.values())
+
+    def count(self) -> int:
+        return len(self._clients)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The clients in the same shape as clients.json ({'clients': [...], 'next_id': n})."""
+        with self._lock:
+            return {'clients': list(self._clients.values()), 'next_id': self._next_id}
+
+    def consistent_snapshot(self) -> Dict[str, Any]:
+        """Like snapshot(), but each client is deep-copied under its own lock so it can be serialized safely."""
+        data = self.snapshot()
+        clients = []
+        for client in data['clients']:
+            with self.client_lock(client.get('id')):
+                clients.append(copy.deepcopy(client))
+        return {'clients': clients, 'next_id': data['next_id']}
+
+    def query(self, filters: Optional[Dict[str, Iterable[Any]]] = None, sort: str = 'createdAt',
+              descending: bool = True, limit: int = 50,
+              cursor: Optional[Iterable[Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[List[Any]], int]:
+        """
+        Clients matching every filter (any of the listed values per field, case-insensitive),
+        ordered by a SORT_FIELDS field with clients missing it last.
+
+        Candidates come from the secondary indexes, so only matching records are read.
+        Returns (page, next_cursor, total); pass next_cursor back to get the next page.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        with self._lock:
+            candidates = None
+            for name, values in (filters or {}).items():
+                if name not in INDEXED_FIELDS:
+                    raise ValueError(f"Unknown client filter: {name}")
+                index = self._field_index[name]
+                matched = set()
+                for value in values:
+                    matched |= index.get(_index_value(value), set())
+                candidates = matched if candidates is None else candidates & matched
+            client_ids = list(self._clients) if candidates is None else list(candidates)
+
+        # Keyset order: (has value, value, id), descending or ascending, missing values last.
+        # Keys are kept ascending; a descending page is read backwards from the cursor
+        keyed = []
+        for client_id in client_ids:
+            client = self._clients.get(client_id)
+            if client is None:
+                continue
+            present, value = _sort_value(client, sort)
+            key = (present, value, client_id) if descending else (not present, value, client_id)
+            keyed.append((key, client))
+        keyed.sort(key=lambda item: item[0])
+        keys = [key for key, _ in keyed]
+
+        after = tuple(cursor) if cursor is not None else None
+        if descending:
+            end = bisect.bisect_left(keys, after) if after is not None else len(keyed)
+            page = keyed[max(end - limit, 0):end][::-1]
+            more = end - limit > 0
+        else:
+            start = bisect.bisect_right(keys, after) if after is not None else 0
+            page = keyed[start:start + limit]
+            more = start + limit < len(keyed)
+        next_cursor = list(page[-1][0]) if page and more else None
+        return [client for _, client in page], next_cursor, len(keyed)
+
+    def top_priority(self, n: int) -> List[Dict[str, Any]]:
+        """The n most urgent clients by caseload_priority_key, most urgent first."""
+        with self._lock:
+            client_ids = self._caseload.top(n)
+        return [client for client in (self._clients.get(client_id) for client_id in client_ids) if client is not None]
+
+    @staticmethod
+    def find_resource(client: Dict[str, Any], resource_id: Any) -> Optional[Dict[str, Any]]:
+        """Find a resource entry in a client's portfolio."""
+        for resource in client.get('resources', []):
+            if resource.get('resource_id') == resource_id:
+                return resource
+        return None
+
+    # ---------- writes ----------
+
+    def add_client(self, client_data: Dict[str, Any], durable: bool = False) -> Dict[str, Any]:
+        """Assign the next id to a new client and store it."""
+        with self._gate, self._lock:
+            client_data['id'] = self._next_id
+            self._next_id += 1
+            client = self._commit({'op': 'add_client', 'client': client_data, 'next_id': self._next_id})
+        if durable:
+            self.flush()
+        return client
+
+    def delete_client(self, client_id: Any, durable: bool = False) -> Optional[Dict[str, Any]]:
+        """Remove a client; returns the deleted record or None if it did not exist."""
+        client = self._commit({'op': 'delete_client', 'client_id': _coerce_id(client_id)})
+        if durable:
+            self.flush()
+        return client
+
+    def update_client(self, client_id: Any, fields: Dict[str, Any], durable: bool = False) -> Optional[Dict[str, Any]]:
+        """Shallow-merge fields into a client record."""
+        client = self._commit({'op': 'update_client', 'client_id': _coerce_id(client_id), 'fields': fields})
+        if durable:
+            self.flush()
+        return client
+
+    def add_resource(self, client_id: Any, resource_entry: Dict[str, Any],
+                     fields: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Add a resource to a client's portfolio unless one with the same resource_id exists.
+        Returns (resource, added); resource is None if the client does not exist.
+        """
+        with self.client_lock(client_id):
+            client = self.get(client_id)
+            if client is None:
+                return None, False
+            existing = self.find_resource(client, resource_entry.get('resource_id'))
+            if existing:
+                return existing, False
+            self._commit({'op': 'add_resource', 'client_id': client['id'],
+                          'resource': resource_entry, 'fields': fields or {}})
+            return resource_entry, True
+
+    def update_resource(self, client_id: Any, resource_id: Any, changes: Dict[str, Any],
+                        fields: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Update one resource entry of a client; returns None if either is missing."""
+        with self.client_lock(client_id):
+            client = self.get(client_id)
+            if client is None or self.find_resource(client, resource_id) is None:
+                return None
+            client = self._commit({'op': 'update_resource', 'client_id': client['id'], 'resource_id': resource_id,
+                                   'changes': changes, 'fields': fields or {}})
+            # Read from the committed record: the copy above may have been evicted and re-parsed meanwhile
+            return self.find_resource(client, resource_id) if client is not None else None
+
+    def append_daily_survey(self, client_id: Any, survey_entry: Dict[str, Any],
+                            fields: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Append a daily survey entry and apply the derived current-status fields."""
+        return self._commit({'op': 'append_daily_survey', 'client_id': _coerce_id(client_id),
+                             'survey': survey_entry, 'fields': fields or {}})
+
+    def update_needs_assessment(self, client_id: Any, changes: Dict[str, Any],
+                                response: Optional[Dict[str, Any]] = None,
+                                fields: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Update a client's needs assessment, optionally recording a new form response."""
+        return self._commit({'op': 'update_needs_assessment', 'client_id': _coerce_id(client_id),
+                             'changes': changes, 'response': response, 'fields': fields or {}})
+
+    def exclusive(self):
+        """Context manager that waits for in-flight mutations and blocks new ones (used by storage compaction)."""
+        return self._gate.exclusive()
+
+    def flush(self) -> None:
+        """Wait until every committed change is persisted. Must not be called while holding exclusive()."""
+        self.storage.flush()
+
+    async def aflush(self) -> None:
+        """flush() for async handlers: the file rewrite and fsync run on a worker thread, not the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def close(self) -> None:
+        """Flush pending writes and release the storage backend."""
+        self.storage.close()
+
+
+_repository: Optional[ClientRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_client_repository() -> ClientRepository:
+    """Return the process-wide client repository, loading it on first use."""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = ClientRepository()
+    return _repository
@@ -0,0 +1,831 @@
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+CLIENTS_FILE = SCRIPT_DIR / 'clients.json'
+CLIENTS_DB_FILE = SCRIPT_DIR / 'clients.db'
+CLIENTS_JOURNAL_FILE = SCRIPT_DIR / 'clients.journal.jsonl'
+CLIENTS_JSONL_FILE = SCRIPT_DIR / 'clients.jsonl'
+
+# Write-behind window for the JSON file store: mutations inside it share one rewrite
+FLUSH_INTERVAL_MS = int(os.environ.get('CLIENT_FLUSH_INTERVAL_MS', 200))
+
+# Fold the journal into a new clients.json snapshot once it grows past this size
+JOURNAL_COMPACT_BYTES = int(os.environ.get('CLIENT_JOURNAL_COMPACT_BYTES', 4 * 1024 * 1024))
+
+# Rewrite clients.jsonl once superseded line versions pass this size and outweigh the live ones
+JSONL_COMPACT_BYTES = int(os.environ.get('CLIENT_JSONL_COMPACT_BYTES', 4 * 1024 * 1024))
+
+# Client list fields that the SQLite backend keeps in child tables instead of the client row
+CHILD_COLLECTIONS = ('resources', 'dailySurveys')
+
+
+def apply_client_op(clients: Dict[Any, Dict[str, Any]], op: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Apply one mutation op to an id -> client mapping and return the affected record.
+
+    Ops are plain JSON-serializable dicts so the same description of a change can be
+    applied in memory, written to a storage backend, and replayed later.
+    """
+    kind = op['op']
+    if kind == 'add_client':
+        client = op['client']
+        clients[client['id']] = client
+        return client
+    if kind == 'delete_client':
+        return clients.pop(op['client_id'], None)
+
+    client = clients.get(op['client_id'])
+    if client is None:
+        return None
+
+    if kind == 'update_client':
+        pass
+    elif kind == 'add_resource':
+        client.setdefault('resources', []).append(op['resource'])
+    elif kind == 'update_resource':
+        for resource in client.get('resources', []):
+            if resource.get('resource_id') == op['resource_id']:
+                resource.update(op['changes'])
+                break
+    elif kind == 'append_daily_survey':
+        client.setdefault('dailySurveys', []).append(op['survey'])
+    elif kind == 'update_needs_assessment':
+        assessment = client.get('needsAssessment')
+        if not isinstance(assessment, dict):
+            assessment = client['needsAssessment'] = {
+                'status': 'pending',
+                'lastSent': None,
+                'lastCompleted': None,
+                'responses': [],
+                'currentNeeds': {}
+            }
+        if op.get('response') is not None:
+            assessment.setdefault('responses', []).append(op['response'])
+        assessment.update(op['changes'])
+    else:
+        raise ValueError(f"Unknown client op: {kind}")
+
+    if op.get('fields'):
+        client.update(op['fields'])
+    if kind == 'append_daily_survey':
+        client['dailySurveyCount'] = len(client['dailySurveys'])
+    return client
+
+
+class ClientStorage:
+    """
+    Persistence backend for the ClientRepository.
+
+    Resident backends hand every record to the repository at load(). Non-resident
+    ones (resident = False) implement load_index() and read_client() instead, and
+    the repository parses records on demand.
+    """
+
+    name = 'base'
+    resident = True
+
+    def attach(self, repository) -> None:
+        """Called by the repository that owns this storage."""
+        self.repository = repository
+
+    def load(self) -> Dict[str, Any]:
+        """Return all clients as {'clients': [...], 'next_id': n}."""
+        raise NotImplementedError
+
+    def write(self, op: Dict[str, Any], client: Optional[Dict[str, Any]]) -> None:
+        """Persist one applied op; client is the record after the change (None for deletes)."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Block until every write accepted so far is durable on disk."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    """Write a file via temp file + fsync + rename so a crash never leaves a truncated document."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonFileStorage(ClientStorage):
+    """
+    Development backend: the whole document lives in clients.json.
+
+    Writes are write-behind: a mutation only marks the store dirty and a flusher
+    thread rewrites the file at most once per flush interval, so a burst of survey
+    submissions costs one rewrite instead of dozens. flush() forces a synchronous
+    write for callers that need durability before responding; an interval of 0
+    hands every write to the flusher at once.
+
+    write() runs under the repository's client lock and never flushes itself:
+    a flush snapshots every client under its lock, so flushing there would
+    deadlock two writers to different clients.
+    """
+
+    name = 'json'
+
+    def __init__(self, clients_file: Path = CLIENTS_FILE, flush_interval_ms: int = FLUSH_INTERVAL_MS):
+        self.clients_file = Path(clients_file)
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._dirty = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_lock = threading.Lock()
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            if self.clients_file.exists():
+                with open(self.clients_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading clients: {e}")
+        return {'clients': [], 'next_id': 1}
+
+    def write(self, op: Dict[str, Any], client: Optional[Dict[str, Any]]) -> None:
+        self._dirty.set()
+        if self._flusher is None:
+            with self._flusher_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._run_flusher, name='client-store-flusher',
+                                                     daemon=True)
+                    self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        # Keeps running after close() so late writes are still persisted
+        while True:
+            self._dirty.wait()
+            if self.flush_interval > 0 and not self._closed:
+                # Let the rest of a burst land before rewriting the file
+                time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing clients: {e}")
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            if not self._dirty.is_set():
+                return
+            # Clear first: a write landing mid-serialization re-marks the store dirty
+            self._dirty.clear()
+            payload = json.dumps(self.repository.consistent_snapshot(), indent=2)
+            try:
+                _atomic_write_text(self.clients_file, payload)
+            except Exception:
+                self._dirty.set()
+                raise
+
+    def close(self) -> None:
+        self._closed = True
+        self.flush()
+
+
+class JournaledJsonStorage(JsonFileStorage):
+    """
+    clients.json snapshot plus an append-only mutation journal.
+
+    Each write appends one op line to clients.journal.jsonl, so its cost scales with the
+    size of the change rather than the dataset. Startup replays the journal on top of
+    the snapshot, and a background compactor folds the journal into a new snapshot once
+    it passes JOURNAL_COMPACT_BYTES. Journal entries carry a sequence number and the
+    snapshot records the last one it contains, so a crash mid-compaction never
+    replays an op twice.
+    """
+
+    name = 'journal'
+
+    def __init__(self, clients_file: Path = CLIENTS_FILE, journal_file: Path = CLIENTS_JOURNAL_FILE,
+                 compact_bytes: int = JOURNAL_COMPACT_BYTES):
+        super().__init__(clients_file)
+        self.journal_file = Path(journal_file)
+        self.rotated_file = self.journal_file.with_name(self.journal_file.name + '.compacting')
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._compacting = False
+        self._compactor: Optional[threading.Thread] = None
+
+    def load(self) -> Dict[str, Any]:
+        data = super().load()
+        snapshot_seq = data.pop('journal_seq', 0)
+        clients = {client.get('id'): client for client in data.get('clients', [])}
+        next_id = data.get('next_id', 1)
+        self._seq = snapshot_seq
+
+        replayed = 0
+        for path in (self.rotated_file, self.journal_file):
+            for entry in self._read_journal(path):
+                if entry['seq'] <= snapshot_seq:
+                    continue
+                apply_client_op(clients, entry)
+                if entry['op'] == 'add_client':
+                    next_id = max(next_id, entry['next_id'])
+                self._seq = max(self._seq, entry['seq'])
+                replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} journaled client mutations")
+
+        self._drop_torn_tail()
+        self._journal = open(self.journal_file, 'a')
+        return {'clients': list(clients.values()), 'next_id': next_id}
+
+    @staticmethod
+    def _read_journal(path: Path):
+        if not path.exists():
+            return
+        with open(path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; everything before it is intact
+                    logger.warning(f"Ignoring unreadable journal entry at {path}:{line_number}")
+
+    def _drop_torn_tail(self) -> None:
+        """Cut a partial last line left by a crash so new entries start on a fresh line."""
+        if not self.journal_file.exists():
+            return
+        with open(self.journal_file, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def write(self, op: Dict[str, Any], client: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._seq += 1
+            self._journal.write(json.dumps(dict(op, seq=self._seq)) + '\n')
+            self._journal.flush()
+            size = self._journal.tell()
+        if size >= self.compact_bytes:
+            self._start_compaction()
+
+    def _start_compaction(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compactor = threading.Thread(target=self.compact, name='client-journal-compactor', daemon=True)
+        self._compactor.start()
+
+    def compact(self) -> None:
+        """Fold the journal into a fresh clients.json snapshot and start a new journal."""
+        try:
+            # Block mutations only while capturing a consistent snapshot and rotating the journal
+            with self.repository.exclusive(), self._lock:
+                snapshot = self.repository.snapshot()
+                snapshot['journal_seq'] = self._seq
+                payload = json.dumps(snapshot, indent=2)
+                self._journal.close()
+                if self.journal_file.exists():
+                    os.replace(self.journal_file, self.rotated_file)
+                self._journal = open(self.journal_file, 'a')
+
+            _atomic_write_text(self.clients_file, payload)
+            if self.rotated_file.exists():
+                self.rotated_file.unlink()
+            logger.info(f"Compacted client journal into {self.clients_file}")
+        except Exception as e:
+            logger.error(f"Error compacting client journal: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+
+    def close(self) -> None:
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+class JsonLinesClientStorage(ClientStorage):
+    """
+    clients.jsonl: one client per line plus a sidecar offset index (clients.jsonl.idx).
+
+    Non-resident: the repository keeps only ids and emails in memory and parses a
+    record from an mmap of the file when it is asked for, so a profile lookup costs
+    one small json.loads instead of loading the whole dataset. A write appends the
+    new version of the client's line (or a tombstone for deletes) and repoints the
+    index; a background compactor rewrites the file once superseded lines outweigh
+    live ones. Lines appended after the sidecar was last written are recovered by
+    scanning the file tail on startup.
+    """
+
+    name = 'jsonl'
+    resident = False
+
+    def __init__(self, jsonl_file: Path = CLIENTS_JSONL_FILE, compact_bytes: int = JSONL_COMPACT_BYTES):
+        self.jsonl_file = Path(jsonl_file)
+        self.index_file = self.jsonl_file.with_name(self.jsonl_file.name + '.idx')
+        self.compact_bytes = compact_bytes
+        self._lock = threading.RLock()
+        self._offsets: Dict[Any, Tuple[int, int]] = {}  # id -> (offset, length), in creation order
+        self._emails: Dict[Any, str] = {}
+        self._next_id = 1
+        self._size = 0
+        self._indexed_size = 0
+        self._dead_bytes = 0
+        self._file = None
+        self._reader = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._compacting = False
+        self._compactor: Optional[threading.Thread] = None
+
+    # ---------- index ----------
+
+    def _read_index_file(self) -> Optional[Dict[str, Any]]:
+        try:
+            if self.index_file.exists():
+                with open(self.index_file, 'r') as f:
+                    index = json.load(f)
+                # An index written for a file that has since been replaced is useless
+                if index.get('inode') == self.jsonl_file.stat().st_ino and index.get('size', 0) <= self._size:
+                    return index
+        except Exception as e:
+            logger.error(f"Error reading client index {self.index_file}: {e}")
+        return None
+
+    def _write_index(self) -> None:
+        index = {
+            'size': self._size,
+            'inode': self.jsonl_file.stat().st_ino,
+            'next_id': self._next_id,
+            'dead_bytes': self._dead_bytes,
+            'clients': [[client_id, offset, length, self._emails.get(client_id, '')]
+                        for client_id, (offset, length) in self._offsets.items()]
+        }
+        _atomic_write_text(self.index_file, json.dumps(index))
+        self._indexed_size = self._size
+
+    def _scan(self, start: int) -> int:
+        """Index the lines from byte offset start onwards; returns the number of lines read."""
+        scanned = 0
+        with open(self.jsonl_file, 'rb+') as f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    # A torn final line from a crash mid-append; everything before it is intact
+                    logger.warning(f"Dropping partial client line at {self.jsonl_file}:{offset}")
+                    f.truncate(offset)
+                    break
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring unreadable client line at {self.jsonl_file}:{offset}")
+                    self._dead_bytes += len(raw)
+                else:
+                    self._index_line(record, offset, len(raw))
+                offset += len(raw)
+                scanned += 1
+        self._size = offset
+        return scanned
+
+    def _index_line(self, record: Dict[str, Any], offset: int, line_bytes: int) -> None:
+        if '_deleted' in record:
+            client_id = record['_deleted']
+            previous = self._offsets.pop(client_id, None)
+            self._emails.pop(client_id, None)
+            self._dead_bytes += line_bytes + (previous[1] + 1 if previous else 0)
+            self._next_id = max(self._next_id, record.get('next_id', 1))
+            return
+        client_id = record.get('id')
+        previous = self._offsets.get(client_id)
+        if previous:
+            self._dead_bytes += previous[1] + 1
+        self._offsets[client_id] = (offset, line_bytes - 1)
+        self._emails[client_id] = record.get('email') or ''
+        if isinstance(client_id, int):
+            self._next_id = max(self._next_id, client_id + 1)
+
+    def load_index(self) -> Dict[str, Any]:
+        """Open the file and return {'clients': [(id, email), ...], 'next_id': n} without parsing records."""
+        with self._lock:
+            self.jsonl_file.touch(exist_ok=True)
+            self._size = self.jsonl_file.stat().st_size
+            index = self._read_index_file()
+            start = 0
+            if index:
+                for client_id, offset, length, email in index['clients']:
+                    self._offsets[client_id] = (offset, length)
+                    self._emails[client_id] = email
+                self._next_id = index.get('next_id', 1)
+                self._dead_bytes = index.get('dead_bytes', 0)
+                start = self._indexed_size = index['size']
+            scanned = self._scan(start)
+            if scanned:
+                logger.info(f"Indexed {scanned} client lines from {self.jsonl_file} (offset {start})")
+            self._file = open(self.jsonl_file, 'ab')
+            return {'clients': [(client_id, self._emails.get(client_id, '')) for client_id in self._offsets],
+                    'next_id': self._next_id}
+
+    def load(self) -> Dict[str, Any]:
+        """Parse every live record (for migrations and tools; the repository uses load_index)."""
+        index = self.load_index()
+        return {'clients': [self.read_client(client_id) for client_id, _ in index['clients']],
+                'next_id': index['next_id']}
+
+    # ---------- reads ----------
+
+    def _read_raw(self, offset: int, length: int) -> bytes:
+        if self._mmap is None or offset + length > len(self._mmap):
+            # The file grew (or was compacted) since it was mapped
+            if self._mmap is not None:
+                self._mmap.close()
+                self._reader.close()
+            self._reader = open(self.jsonl_file, 'rb')
+            self._mmap = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[offset:offset + length]
+
+    def read_client(self, client_id: Any) -> Optional[Dict[str, Any]]:
+        """Parse one client's current line, or None if the id is unknown."""
+        with self._lock:
+            entry = self._offsets.get(client_id)
+            if entry is None:
+                return None
+            raw = self._read_raw(*entry)
+        return json.loads(raw)
+
+    # ---------- writes ----------
+
+    def write(self, op: Dict[str, Any], client: Optional[Dict[str, Any]]) -> None:
+        record = client
+        data = json.dumps(record).encode('utf-8') + b'\n' if record is not None else None
+        with self._lock:
+            # _next_id is read by compaction and _write_index, so it only changes under the lock
+            if op['op'] == 'add_client':
+                self._next_id = max(self._next_id, op['next_id'])
+            if record is None:
+                record = {'_deleted': op['client_id'], 'next_id': self._next_id}
+                data = json.dumps(record).encode('utf-8') + b'\n'
+            offset = self._size
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            self._index_line(record, offset, len(data))
+            if self._size - self._indexed_size >= self.compact_bytes:
+                self._write_index()
+            compact = self._dead_bytes >= self.compact_bytes and self._dead_bytes * 2 > self._size
+        if compact:
+            self._start_compaction()
+
+    def _start_compaction(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compactor = threading.Thread(target=self.compact, name='client-jsonl-compactor', daemon=True)
+        self._compactor.start()
+
+    def compact(self) -> None:
+        """Rewrite clients.jsonl with only the current line of each client."""
+        try:
+            with self._lock:
+                tmp_path = self.jsonl_file.with_name(self.jsonl_file.name + '.compacting')
+                offsets = {}
+                position = 0
+                with open(tmp_path, 'wb') as out:
+                    for client_id, (offset, length) in self._offsets.items():
+                        out.write(self._read_raw(offset, length) + b'\n')
+                        offsets[client_id] = (position, length)
+                        position += length + 1
+                    out.flush()
+                    os.fsync(out.fileno())
+                reclaimed = self._size - position
+
+                self._file.close()
+                if self._mmap is not None:
+                    self._mmap.close()
+                    self._reader.close()
+                    self._mmap = None
+                os.replace(tmp_path, self.jsonl_file)
+                self._file = open(self.jsonl_file, 'ab')
+                self._offsets = offsets
+                self._size = position
+                self._dead_bytes = 0
+                self._write_index()
+            logger.info(f"Compacted {self.jsonl_file}, reclaimed {reclaimed} bytes")
+        except Exception as e:
+            logger.error(f"Error compacting {self.jsonl_file}: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._file is None:
+                return
+            self.flush()
+            self._write_index()
+            self._file.close()
+            self._file = None
+            if self._mmap is not None:
+                self._mmap.close()
+                self._reader.close()
+                self._mmap = None
+
+
+class SQLiteClientStorage(ClientStorage):
+    """
+    SQLite backend in WAL mode.
+
+    One row per client holds the scalar/nested profile fields; resources, daily surveys
+    and needs-assessment responses live in child tables so a single status change or
+    survey append touches a couple of rows instead of re-serializing every client.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS clients (
+        id INTEGER PRIMARY KEY,
+        email TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_clients_email ON clients(email);
+    CREATE TABLE IF NOT EXISTS client_resources (
+        client_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        resource_id TEXT,
+        data TEXT NOT NULL,
+        PRIMARY KEY (client_id, position)
+    );
+    CREATE TABLE IF NOT EXISTS daily_surveys (
+        client_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (client_id, position)
+    );
+    CREATE TABLE IF NOT EXISTS needs_assessment_responses (
+        client_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (client_id, position)
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    CHILD_TABLES = {
+        'resources': 'client_resources',
+        'dailySurveys': 'daily_surveys',
+    }
+
+    def __init__(self, db_file: Path = CLIENTS_DB_FILE):
+        self.db_file = Path(db_file)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.executescript(self.SCHEMA)
+
+    # ---------- row encoding ----------
+
+    @staticmethod
+    def _client_row(client: Dict[str, Any]) -> str:
+        """Serialize a client without its child collections (keeps empty placeholders)."""
+        row = dict(client)
+        for key in CHILD_COLLECTIONS:
+            if key in row:
+                row[key] = []
+        assessment = row.get('needsAssessment')
+        if isinstance(assessment, dict) and 'responses' in assessment:
+            row['needsAssessment'] = dict(assessment, responses=[])
+        return json.dumps(row)
+
+    def _upsert_client_row(self, client: Dict[str, Any]) -> None:
+        self.conn.execute(
+            'INSERT INTO clients (id, email, data) VALUES (?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET email = excluded.email, data = excluded.data',
+            (client['id'], (client.get('email') or '').strip().lower(), self._client_row(client))
+        )
+
+    def _replace_children(self, client: Dict[str, Any], key: str) -> None:
+        client_id = client['id']
+        if key == 'responses':
+            self.conn.execute('DELETE FROM needs_assessment_responses WHERE client_id = ?', (client_id,))
+            items = (client.get('needsAssessment') or {}).get('responses', [])
+            self.conn.executemany(
+                'INSERT INTO needs_assessment_responses (client_id, position, data) VALUES (?, ?, ?)',
+                [(client_id, i, json.dumps(item)) for i, item in enumerate(items)]
+            )
+        elif key == 'resources':
+            self.conn.execute('DELETE FROM client_resources WHERE client_id = ?', (client_id,))
+            self.conn.executemany(
+                'INSERT INTO client_resources (client_id, position, resource_id, data) VALUES (?, ?, ?, ?)',
+                [(client_id, i, item.get('resource_id'), json.dumps(item))
+                 for i, item in enumerate(client.get('resources', []))]
+            )
+        else:
+            table = self.CHILD_TABLES[key]
+            self.conn.execute(f'DELETE FROM {table} WHERE client_id = ?', (client_id,))
+            self.conn.executemany(
+                f'INSERT INTO {table} (client_id, position, data) VALUES (?, ?, ?)',
+                [(client_id, i, json.dumps(item)) for i, item in enumerate(client.get(key, []))]
+            )
+
+    def _set_next_id(self, next_id: int) -> None:
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (str(next_id),)
+        )
+
+    # ---------- ClientStorage ----------
+
+    def load(self) -> Dict[str, Any]:
+        with self._lock:
+            clients = {}
+            for client_id, data in self.conn.execute('SELECT id, data FROM clients ORDER BY rowid'):
+                clients[client_id] = json.loads(data)
+
+            for key, table in self.CHILD_TABLES.items():
+                for client_id, data in self.conn.execute(
+                        f'SELECT client_id, data FROM {table} ORDER BY client_id, position'):
+                    if client_id in clients:
+                        clients[client_id].setdefault(key, []).append(json.loads(data))
+
+            for client_id, data in self.conn.execute(
+                    'SELECT client_id, data FROM needs_assessment_responses ORDER BY client_id, position'):
+                client = clients.get(client_id)
+                if client is not None:
+                    assessment = client.setdefault('needsAssessment', {})
+                    assessment.setdefault('responses', []).append(json.loads(data))
+
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+            next_id = int(row[0]) if row else max(clients, default=0) + 1
+            return {'clients': list(clients.values()), 'next_id': next_id}
+
+    def write(self, op: Dict[str, Any], client: Optional[Dict[str, Any]]) -> None:
+        kind = op['op']
+        with self._lock, self.conn:
+            if kind == 'add_client':
+                self.import_client(client)
+                self._set_next_id(op['next_id'])
+            elif kind == 'delete_client':
+                self.conn.execute('DELETE FROM clients WHERE id = ?', (op['client_id'],))
+            elif kind == 'update_client':
+                self._upsert_client_row(client)
+                for key in CHILD_COLLECTIONS:
+                    if key in op['fields']:
+                        self._replace_children(client, key)
+                if isinstance(op['fields'].get('needsAssessment'), dict):
+                    self._replace_children(client, 'responses')
+            elif kind == 'add_resource':
+                resource = op['resource']
+                self.conn.execute(
+                    'INSERT INTO client_resources (client_id, position, resource_id, data) VALUES (?, ?, ?, ?)',
+                    (client['id'], len(client['resources']) - 1, resource.get('resource_id'), json.dumps(resource))
+                )
+                if op.get('fields'):
+                    self._upsert_client_row(client)
+            elif kind == 'update_resource':
+                for position, resource in enumerate(client.get('resources', [])):
+                    if resource.get('resource_id') == op['resource_id']:
+                        self.conn.execute(
+                            'UPDATE client_resources SET data = ? WHERE client_id = ? AND position = ?',
+                            (json.dumps(resource), client['id'], position)
+                        )
+                        break
+                if op.get('fields'):
+                    self._upsert_client_row(client)
+            elif kind == 'append_daily_survey':
+                self.conn.execute(
+                    'INSERT INTO daily_surveys (client_id, position, data) VALUES (?, ?, ?)',
+                    (client['id'], len(client['dailySurveys']) - 1, json.dumps(op['survey']))
+                )
+                self._upsert_client_row(client)
+            elif kind == 'update_needs_assessment':
+                if op.get('response') is not None:
+                    responses = client['needsAssessment']['responses']
+                    self.conn.execute(
+                        'INSERT INTO needs_assessment_responses (client_id, position, data) VALUES (?, ?, ?)',
+                        (client['id'], len(responses) - 1, json.dumps(op['response']))
+                    )
+                self._upsert_client_row(client)
+            else:
+                raise ValueError(f"Unknown client op: {kind}")
+
+    def import_client(self, client: Dict[str, Any]) -> None:
+        """Insert or fully replace one client including its child rows (caller holds the transaction)."""
+        self._upsert_client_row(client)
+        for key in CHILD_COLLECTIONS:
+            self._replace_children(client, key)
+        self._replace_children(client, 'responses')
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+def migrate_json_to_sqlite(clients_file: Path = CLIENTS_FILE, db_file: Path = CLIENTS_DB_FILE) -> int:
+    """One-shot import of clients.json into the SQLite store; returns the number of clients migrated."""
+    data = JsonFileStorage(clients_file).load()
+    clients = data.get('clients', [])
+    next_id = data.get('next_id') or max((c.get('id', 0) for c in clients), default=0) + 1
+
+    storage = SQLiteClientStorage(db_file)
+    try:
+        with storage._lock, storage.conn:
+            for client in clients:
+                storage.import_client(client)
+            storage._set_next_id(next_id)
+    finally:
+        storage.close()
+
+    logger.info(f"Migrated {len(clients)} clients from {clients_file} to {db_file}")
+    return len(clients)
+
+
+def migrate_json_to_jsonl(clients_file: Path = CLIENTS_FILE, jsonl_file: Path = CLIENTS_JSONL_FILE) -> int:
+    """One-shot conversion of clients.json into clients.jsonl; returns the number of clients migrated."""
+    data = JsonFileStorage(clients_file).load()
+    clients = data.get('clients', [])
+    next_id = data.get('next_id') or max((c.get('id', 0) for c in clients), default=0) + 1
+
+    jsonl_file = Path(jsonl_file)
+    _atomic_write_text(jsonl_file, ''.join(json.dumps(client) + '\n' for client in clients))
+    storage = JsonLinesClientStorage(jsonl_file)
+    try:
+        storage.load_index()
+        with storage._lock:
+            storage._next_id = max(storage._next_id, next_id)
+    finally:
+        storage.close()
+
+    logger.info(f"Migrated {len(clients)} clients from {clients_file} to {jsonl_file}")
+    return len(clients)
+
+
+def create_client_storage() -> ClientStorage:
+    """
+    Build the storage backend selected by CLIENT_STORE_BACKEND.
+
+    'json' (default) keeps using clients.json for development; 'journal' keeps
+    clients.json as a snapshot and appends mutations to clients.journal.jsonl;
+    'jsonl' uses the offset-indexed CLIENTS_JSONL_PATH (defaults to clients.jsonl);
+    'sqlite' uses CLIENTS_DB_PATH (defaults to clients.db next to the server).
+    """
+    backend = os.environ.get('CLIENT_STORE_BACKEND', 'json').strip().lower()
+    if backend == 'jsonl':
+        return JsonLinesClientStorage(Path(os.environ.get('CLIENTS_JSONL_PATH', CLIENTS_JSONL_FILE)))
+    if backend == 'sqlite':
+        return SQLiteClientStorage(Path(os.environ.get('CLIENTS_DB_PATH', CLIENTS_DB_FILE)))
+    if backend == 'journal':
+        return JournaledJsonStorage(Path(os.environ.get('CLIENTS_FILE_PATH', CLIENTS_FILE)),
+                                    Path(os.environ.get('CLIENTS_JOURNAL_PATH', CLIENTS_JOURNAL_FILE)))
+    if backend != 'json':
+        logger.warning(f"Unknown CLIENT_STORE_BACKEND '{backend}', falling back to the JSON file store")
+    return JsonFileStorage(Path(os.environ.get('CLIENTS_FILE_PATH', CLIENTS_FILE)))
+
+
+if __name__ == '__main__':
+    # Usage: python client_storage.py [clients.json] [clients.db | clients.jsonl]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS_FILE
+    target = Path(sys.argv[2]) if len(sys.argv) > 2 else CLIENTS_DB_FILE
+    if target.suffix == '.jsonl':
+        migrate_json_to_jsonl(source, target)
+    else:
+        migrate_json_to_sqlite(source, target)
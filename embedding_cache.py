@@ -0,0 +1,204 @@
+"""
+Persistent cache for query embeddings.
+
+Client questions built by the resource matcher repeat heavily (the same category
+boilerplate, ages, needs lists), so CachedEmbeddings keeps their vectors in a small
+SQLite table keyed by the embedding model plus a hash of the normalized question.
+Least recently used entries are evicted once the table exceeds its size cap; hits
+only record their use in memory, and the timestamps are written in batches.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+EMBEDDING_CACHE_PATH = Path(os.environ.get('RAG_EMBEDDING_CACHE_PATH', SCRIPT_DIR / 'embedding_cache.db'))
+# Maximum cached questions; 0 disables the cache
+EMBEDDING_CACHE_SIZE = int(os.environ.get('RAG_EMBEDDING_CACHE_SIZE', '5000'))
+# Buffered last_used updates are written once this many pile up or they get this old
+TOUCH_BATCH_SIZE = 256
+TOUCH_FLUSH_SECONDS = 30.0
+
+
+def normalize_question(text: str) -> str:
+    """Case- and whitespace-insensitive form of a question, used for keys and embedding."""
+    return ' '.join(text.split()).lower()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings object and serves embed_query from the cache.
+
+    embed_documents passes straight through: document chunks are already tracked
+    by the vector index manifest and only re-embedded when they change.
+    """
+
+    def __init__(self, embeddings, model: str, path: Path = EMBEDDING_CACHE_PATH,
+                 max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.model = model
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._miss_seconds = 0.0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._conn.commit()
+        self._count = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        self._touched: Dict[str, float] = {}
+        self._touched_since = time.monotonic()
+
+    def _key(self, normalized: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def _get(self, key: str):
+        with self._lock:
+            row = self._conn.execute('SELECT vector FROM embeddings WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if (len(self._touched) >= TOUCH_BATCH_SIZE
+                    or time.monotonic() - self._touched_since >= TOUCH_FLUSH_SECONDS):
+                self._write_touches()
+                self._conn.commit()
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def _write_touches(self) -> None:
+        """Write buffered last_used updates; the caller holds the lock and commits."""
+        if self._touched:
+            self._conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                   [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+        self._touched_since = time.monotonic()
+
+    def _put(self, key: str, vector: List[float]) -> None:
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._lock:
+            # Recency must be current before choosing what to evict
+            self._write_touches()
+            inserted = self._conn.execute(
+                'INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)', (key, blob, time.time())
+            ).rowcount
+            if inserted:
+                self._count += 1
+            else:
+                self._conn.execute('UPDATE embeddings SET vector = ?, last_used = ? WHERE key = ?',
+                                   (blob, time.time(), key))
+            excess = self._count - self.max_entries
+            if excess > 0:
+                self._count -= self._conn.execute(
+                    'DELETE FROM embeddings WHERE key IN '
+                    '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)', (excess,)
+                ).rowcount
+            self._conn.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.max_entries <= 0:
+            return self.embeddings.embed_query(text)
+        normalized = normalize_question(text)
+        key = self._key(normalized)
+        try:
+            vector = self._get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            vector = None
+        if vector is not None:
+            with self._lock:
+                self.hits += 1
+            return vector
+
+        start = time.monotonic()
+        # Keyed on the normalized question, but the model sees the original text
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._miss_seconds += time.monotonic() - start
+            self.misses += 1
+        try:
+            self._put(key, vector)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """embed_query for many questions; the misses are embedded in one batched request."""
+        if self.max_entries <= 0:
+            return self.embeddings.embed_documents(texts)
+        normalized = [normalize_question(text) for text in texts]
+        keys = [self._key(text) for text in normalized]
+        vectors: List[Any] = []
+        for key in keys:
+            try:
+                vectors.append(self._get(key))
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+                vectors.append(None)
+
+        # One original text per missing normalized question
+        originals: Dict[str, str] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                originals.setdefault(normalized[i], texts[i])
+        missing = sorted(originals)
+        with self._lock:
+            self.hits += len(texts) - sum(1 for vector in vectors if vector is None)
+        if missing:
+            start = time.monotonic()
+            embedded = dict(zip(missing, self.embeddings.embed_documents([originals[text] for text in missing])))
+            with self._lock:
+                self._miss_seconds += time.monotonic() - start
+                self.misses += len(missing)
+            for i, vector in enumerate(vectors):
+                if vector is None:
+                    vectors[i] = embedded[normalized[i]]
+            for text in missing:
+                try:
+                    self._put(self._key(text), embedded[text])
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache write failed: {e}")
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and the embedding time the hits saved, estimated from the mean miss."""
+        with self._lock:
+            entries = self._count
+        mean_miss = self._miss_seconds / self.misses if self.misses else 0.0
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'mean_miss_ms': round(mean_miss * 1000, 1),
+            'saved_seconds': round(self.hits * mean_miss, 3),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._write_touches()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+            self._conn.close()
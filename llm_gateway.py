@@ -0,0 +1,524 @@
+"""
+Shared gateway for every OpenAI call the backend makes.
+
+All clients (the OpenAI SDK clients and the LangChain chat and embedding models)
+are built on pooled httpx clients: one for threaded callers, and one async client
+per event loop (an AsyncClient and its connections must stay on the loop that
+opened them). Their transports apply, per model:
+- a concurrency limit
+- an overall deadline per call, covering the wait for a slot and any retries
+- retries of rate-limit, timeout and server errors with jittered exponential backoff
+- latency and token usage metrics, reported by /health
+
+The SDKs' own retries are turned off so every call is retried in one place.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    """'gpt-4=2,tts-1=4' -> {'gpt-4': 2, 'tts-1': 4}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        model, _, value = item.partition('=')
+        try:
+            limits[model.strip()] = int(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM concurrency limit '{item}'")
+    return limits
+
+
+# In-flight calls per model (separately for async and threaded callers); single models
+# can be overridden with LLM_MODEL_CONCURRENCY, e.g. "gpt-4=2,tts-1=4"
+LLM_CONCURRENCY = int(os.environ.get('LLM_CONCURRENCY', '16'))
+LLM_MODEL_CONCURRENCY = _parse_limits(os.environ.get('LLM_MODEL_CONCURRENCY', ''))
+# Budget for one call including the wait for a slot and all retries; a stream must start within it
+LLM_DEADLINE_SECONDS = float(os.environ.get('LLM_DEADLINE_SECONDS', '60'))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '3'))
+# Backoff before retry n is uniform in [0, base * 2^n] unless the API sends Retry-After
+LLM_RETRY_BASE_SECONDS = float(os.environ.get('LLM_RETRY_BASE_SECONDS', '0.5'))
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', '100'))
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+RETRY_AFTER_CAP_SECONDS = 20.0
+LATENCY_SAMPLES = 1000
+
+
+class LLMMetrics:
+    """Per-model call counts, latency percentiles and token usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, Any]] = {}
+
+    def _model(self, model: str) -> Dict[str, Any]:
+        if model not in self._models:
+            self._models[model] = {
+                'calls': 0, 'errors': 0, 'retries': 0, 'timeouts': 0, 'in_flight': 0,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'latencies': deque(maxlen=LATENCY_SAMPLES),
+            }
+        return self._models[model]
+
+    def started(self, model: str) -> None:
+        with self._lock:
+            self._model(model)['in_flight'] += 1
+
+    def retried(self, model: str) -> None:
+        with self._lock:
+            self._model(model)['retries'] += 1
+
+    def finished(self, model: str, seconds: float, ok: bool, usage: Tuple[int, int] = (0, 0),
+                 timed_out: bool = False) -> None:
+        with self._lock:
+            stats = self._model(model)
+            stats['in_flight'] -= 1
+            stats['calls'] += 1
+            stats['errors'] += not ok
+            stats['timeouts'] += timed_out
+            stats['prompt_tokens'] += usage[0]
+            stats['completion_tokens'] += usage[1]
+            stats['latencies'].append(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            report = {}
+            for model, stats in self._models.items():
+                latencies = sorted(stats['latencies'])
+
+                def percentile(fraction: float) -> float:
+                    return round(latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] * 1000, 1) if latencies else 0.0
+
+                report[model] = {key: value for key, value in stats.items() if key != 'latencies'}
+                report[model].update(p50_ms=percentile(0.5), p95_ms=percentile(0.95))
+            return report
+
+
+def _request_model(request: httpx.Request) -> str:
+    """Model named in a JSON request body, else the last path segment (e.g. 'completions')."""
+    try:
+        model = json.loads(request.content or b'{}').get('model')
+    except (httpx.RequestNotRead, ValueError, AttributeError):
+        model = None
+    return model or request.url.path.rstrip('/').rsplit('/', 1)[-1]
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_AFTER_CAP_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+
+
+def _retryable(error: Exception) -> bool:
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+def _usage(payload: Any) -> Tuple[int, int]:
+    usage = payload.get('usage') if isinstance(payload, dict) else None
+    if not isinstance(usage, dict):
+        return 0, 0
+    return int(usage.get('prompt_tokens') or 0), int(usage.get('completion_tokens') or 0)
+
+
+def _stream_usage(tail: bytes) -> Tuple[int, int]:
+    """Token usage from the final chunk of a streamed completion, when the API included it."""
+    for line in reversed(tail.decode('utf-8', 'ignore').splitlines()):
+        if line.startswith('data: {') and '"usage"' in line:
+            try:
+                return _usage(json.loads(line[len('data: '):]))
+            except ValueError:
+                return 0, 0
+    return 0, 0
+
+
+def _buffered(response: httpx.Response, raw: bytes, request: httpx.Request) -> Tuple[httpx.Response, Tuple[int, int]]:
+    """A fully read copy of a response, and the token usage in its JSON body."""
+    buffered = httpx.Response(response.status_code, headers=response.headers, content=raw,
+                              extensions=response.extensions, request=request)
+    usage = (0, 0)
+    if 'json' in buffered.headers.get('content-type', ''):
+        try:
+            usage = _usage(buffered.json())
+        except ValueError:
+            pass
+    return buffered, usage
+
+
+def _is_stream(response: httpx.Response) -> bool:
+    return 'text/event-stream' in response.headers.get('content-type', '')
+
+
+class _MeteredAsyncStream(httpx.AsyncByteStream):
+    """Passes a streamed body through and reports its end (and usage) once closed."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._tail = b''
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-8192:]
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close:
+                on_close(_stream_usage(self._tail))
+
+
+class _MeteredSyncStream(httpx.SyncByteStream):
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._tail = b''
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-8192:]
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close:
+                on_close(_stream_usage(self._tail))
+
+
+class AsyncGatewayTransport(httpx.AsyncBaseTransport):
+    """Pooled async transport for one event loop, enforcing the gateway's limits, deadline and retries."""
+
+    def __init__(self, gateway: 'LLMGateway', transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.gateway = gateway
+        self._transport = transport or httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.gateway.limit(model))
+        return self._semaphores[model]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        gateway, model = self.gateway, _request_model(request)
+        start = time.monotonic()
+        deadline = start + gateway.deadline
+        semaphore = self._semaphore(model)
+        gateway.metrics.started(model)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), gateway.deadline)
+        except asyncio.TimeoutError:
+            gateway.metrics.finished(model, time.monotonic() - start, ok=False, timed_out=True)
+            raise httpx.PoolTimeout(f"No free {model} slot within {gateway.deadline:.0f}s", request=request)
+
+        def finish(ok: bool, usage: Tuple[int, int] = (0, 0), timed_out: bool = False) -> None:
+            semaphore.release()
+            gateway.metrics.finished(model, time.monotonic() - start, ok, usage, timed_out)
+
+        try:
+            response = await self._send(request, model, deadline)
+        except httpx.TimeoutException:
+            finish(ok=False, timed_out=True)
+            raise
+        except BaseException:
+            finish(ok=False)
+            raise
+        if _is_stream(response):
+            response.stream = _MeteredAsyncStream(
+                response.stream, lambda usage: finish(response.status_code < 400, usage)
+            )
+            return response
+        try:
+            raw = b''.join([chunk async for chunk in response.stream])
+        except BaseException:
+            finish(ok=False)
+            raise
+        finally:
+            await response.aclose()
+        response, usage = _buffered(response, raw, request)
+        finish(response.status_code < 400, usage)
+        return response
+
+    async def _send(self, request: httpx.Request, model: str, deadline: float) -> httpx.Response:
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise httpx.ReadTimeout(f"{model} call exceeded its {self.gateway.deadline:.0f}s deadline",
+                                        request=request)
+            try:
+                response = await asyncio.wait_for(self._transport.handle_async_request(request), remaining)
+            except asyncio.TimeoutError:
+                raise httpx.ReadTimeout(f"{model} call exceeded its {self.gateway.deadline:.0f}s deadline",
+                                        request=request)
+            except Exception as e:
+                if not _retryable(e) or attempt >= self.gateway.max_retries:
+                    raise
+                delay = _retry_delay(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(f"{model} call failed ({e!r}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.gateway.max_retries:
+                    return response
+                delay = _retry_delay(attempt, response)
+                if time.monotonic() + delay >= deadline:
+                    return response
+                await response.aclose()
+                logger.warning(f"{model} call returned {response.status_code}, retrying in {delay:.2f}s")
+            self.gateway.metrics.retried(model)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class SyncGatewayTransport(httpx.BaseTransport):
+    """AsyncGatewayTransport's counterpart for threaded callers; the deadline bounds each attempt's timeouts."""
+
+    def __init__(self, gateway: 'LLMGateway', transport: Optional[httpx.BaseTransport] = None):
+        self.gateway = gateway
+        self._transport = transport or httpx.HTTPTransport(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        )
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, model: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if model not in self._semaphores:
+                self._semaphores[model] = threading.BoundedSemaphore(self.gateway.limit(model))
+            return self._semaphores[model]
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        gateway, model = self.gateway, _request_model(request)
+        start = time.monotonic()
+        deadline = start + gateway.deadline
+        semaphore = self._semaphore(model)
+        gateway.metrics.started(model)
+        if not semaphore.acquire(timeout=gateway.deadline):
+            gateway.metrics.finished(model, time.monotonic() - start, ok=False, timed_out=True)
+            raise httpx.PoolTimeout(f"No free {model} slot within {gateway.deadline:.0f}s", request=request)
+
+        def finish(ok: bool, usage: Tuple[int, int] = (0, 0), timed_out: bool = False) -> None:
+            semaphore.release()
+            gateway.metrics.finished(model, time.monotonic() - start, ok, usage, timed_out)
+
+        try:
+            response = self._send(request, model, deadline)
+        except httpx.TimeoutException:
+            finish(ok=False, timed_out=True)
+            raise
+        except BaseException:
+            finish(ok=False)
+            raise
+        if _is_stream(response):
+            response.stream = _MeteredSyncStream(
+                response.stream, lambda usage: finish(response.status_code < 400, usage)
+            )
+            return response
+        try:
+            raw = b''.join(response.stream)
+        except BaseException:
+            finish(ok=False)
+            raise
+        finally:
+            response.close()
+        response, usage = _buffered(response, raw, request)
+        finish(response.status_code < 400, usage)
+        return response
+
+    def _send(self, request: httpx.Request, model: str, deadline: float) -> httpx.Response:
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise httpx.ReadTimeout(f"{model} call exceeded its {self.gateway.deadline:.0f}s deadline",
+                                        request=request)
+            timeout = dict(request.extensions.get('timeout') or {})
+            request.extensions['timeout'] = {
+                key: min(value, remaining) if value is not None else remaining
+                for key, value in {name: timeout.get(name) for name in ('connect', 'read', 'write', 'pool')}.items()
+            }
+            try:
+                response = self._transport.handle_request(request)
+            except Exception as e:
+                if not _retryable(e) or attempt >= self.gateway.max_retries:
+                    raise
+                delay = _retry_delay(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(f"{model} call failed ({e!r}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.gateway.max_retries:
+                    return response
+                delay = _retry_delay(attempt, response)
+                if time.monotonic() + delay >= deadline:
+                    return response
+                response.close()
+                logger.warning(f"{model} call returned {response.status_code}, retrying in {delay:.2f}s")
+            self.gateway.metrics.retried(model)
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class _LoopLocalAsyncClient(httpx.AsyncClient):
+    """
+    The AsyncClient handed to SDK clients: it builds requests itself but sends each one
+    through the calling event loop's own pooled client (LLMGateway.async_client()).
+    """
+
+    def __init__(self, gateway: 'LLMGateway', **kwargs):
+        super().__init__(**kwargs)
+        self._gateway = gateway
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await self._gateway.async_client().send(request, **kwargs)
+
+
+class LLMGateway:
+    """
+    Owns the pooled HTTP clients and hands out API clients built on them:
+    openai / openai_sync (OpenAI SDK), chat_model() and embeddings() (LangChain).
+    SDK clients are created on first use, so importing without an API key works.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, concurrency: int = LLM_CONCURRENCY,
+                 model_concurrency: Optional[Dict[str, int]] = None, deadline: float = LLM_DEADLINE_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 sync_transport: Optional[httpx.BaseTransport] = None):
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.model_concurrency = dict(LLM_MODEL_CONCURRENCY if model_concurrency is None else model_concurrency)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.metrics = LLMMetrics()
+        self._timeout = httpx.Timeout(deadline, connect=min(deadline, 10.0))
+        self._transport = transport
+        self._async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = \
+            weakref.WeakKeyDictionary()
+        self.http_async = _LoopLocalAsyncClient(self, timeout=self._timeout)
+        self.http_sync = httpx.Client(transport=SyncGatewayTransport(self, sync_transport), timeout=self._timeout)
+        self._clients: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        self._loop_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Whether an API key is configured."""
+        return bool(self._key())
+
+    def limit(self, model: str) -> int:
+        return max(self.model_concurrency.get(model, self.concurrency), 1)
+
+    def async_client(self) -> httpx.AsyncClient:
+        """The running event loop's pooled AsyncClient, created on first use."""
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                # Loops that have closed cannot be used again; drop their clients
+                for closed in [other for other in self._async_clients if other.is_closed()]:
+                    del self._async_clients[closed]
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    transport=AsyncGatewayTransport(self, self._transport), timeout=self._timeout
+                )
+            return client
+
+    def _key(self) -> Optional[str]:
+        return self.api_key or os.environ.get('OPENAI_API_KEY') or os.environ.get('OPEN_API_KEY')
+
+    def _client(self, key, factory):
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = factory()
+            return self._clients[key]
+
+    @property
+    def openai(self):
+        """Shared AsyncOpenAI client."""
+        from openai import AsyncOpenAI
+        return self._client('openai', lambda: AsyncOpenAI(
+            api_key=self._key(), http_client=self.http_async, max_retries=0, timeout=self.deadline
+        ))
+
+    @property
+    def openai_sync(self):
+        """Shared OpenAI client for code that cannot await."""
+        from openai import OpenAI
+        return self._client('openai_sync', lambda: OpenAI(
+            api_key=self._key(), http_client=self.http_sync, max_retries=0, timeout=self.deadline
+        ))
+
+    def chat_model(self, model: str = 'gpt-4o-mini', temperature: float = 0.0, **kwargs):
+        """A LangChain ChatOpenAI on the gateway's connections, shared per configuration."""
+        from langchain_openai import ChatOpenAI
+        key = ('chat', model, temperature, tuple(sorted(kwargs.items())))
+        return self._client(key, lambda: ChatOpenAI(
+            model=model, temperature=temperature, api_key=self._key(), max_retries=0, timeout=self.deadline,
+            http_client=self.http_sync, http_async_client=self.http_async, **kwargs
+        ))
+
+    def embeddings(self, model: str, **kwargs):
+        """A LangChain OpenAIEmbeddings on the gateway's connections."""
+        from langchain_openai import OpenAIEmbeddings
+        key = ('embeddings', model, tuple(sorted(kwargs.items())))
+        return self._client(key, lambda: OpenAIEmbeddings(
+            model=model, api_key=self._key(), max_retries=0, timeout=self.deadline,
+            http_client=self.http_sync, http_async_client=self.http_async, **kwargs
+        ))
+
+    async def aclose(self) -> None:
+        """
+        Close every loop's async client (the current loop's is awaited, other running loops
+        close theirs in the background) and the threaded client.
+        """
+        current = asyncio.get_running_loop()
+        with self._loop_lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        for loop, client in clients:
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        self.http_sync.close()
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Return the process-wide LLM gateway, creating it on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -1,59 +1,1000 @@
 import os
+import re
 import json
+import shutil
+import hashlib
+import asyncio
 import logging
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 
+from embedding_cache import CachedEmbeddings, normalize_question
+from llm_gateway import get_llm_gateway
+from resource_reranker import ResourceReranker, client_profile
+
 # --- Configuration ---
 load_dotenv()
 SCRIPT_DIR = Path(__file__).parent.absolute()
 RESOURCES_FILE = SCRIPT_DIR / 'structured_resources.json'
+EMBEDDING_MODEL = "text-embedding-3-large"
+# Shortened embeddings (e.g. 1024 or 256); 0 keeps the model's full 3072 dimensions
+EMBEDDING_DIMENSIONS = int(os.environ.get('RAG_EMBEDDING_DIMENSIONS', '0'))
+# Identifies the vectors stored in the index; changing the model or dimensions forces a rebuild
+EMBEDDING_SIGNATURE = f"{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL
+# Persistent vector index; reused across restarts and workers while the catalog and model match
+VECTOR_INDEX_DIR = Path(os.environ.get('RAG_INDEX_DIR', SCRIPT_DIR / 'vector_index'))
+VECTOR_COLLECTION = 'resources'
+# 'chroma' (default) or 'numpy' (exact in-process search, see NumpyVectorIndex)
+VECTOR_ENGINE = os.environ.get('RAG_VECTOR_ENGINE', 'chroma').strip().lower()
+# NumPy engine only: 'float32', 'float16' or 'int8' for the in-memory search matrix, and how
+# many candidates per result are re-scored at full precision when it is quantized
+VECTOR_DTYPE = os.environ.get('RAG_VECTOR_DTYPE', 'float32').strip().lower()
+RESCORE_FACTOR = int(os.environ.get('RAG_RESCORE_FACTOR', '4'))
+# 'hybrid' (vector + BM25 fused by reciprocal rank), 'vector' or 'lexical' (BM25 only, no network)
+RETRIEVAL_MODE = os.environ.get('RAG_RETRIEVAL_MODE', 'hybrid').strip().lower()
+# How chunk similarities add up to a resource score: 'max' (best chunk) or 'sum' (all retrieved chunks)
+CHUNK_AGGREGATION = os.environ.get('RAG_CHUNK_AGGREGATION', 'max').strip().lower()
+# Maximal marginal relevance trade-off for the final list: 1.0 ranks by relevance alone,
+# lower values give more weight to covering different programs
+MMR_LAMBDA = float(os.environ.get('RAG_MMR_LAMBDA', '0.7'))
+# Chunks embedded per request while building or syncing the index (progress is reported per batch)
+EMBED_BATCH_SIZE = int(os.environ.get('RAG_EMBED_BATCH_SIZE', '64'))
+# Threads for blocking retrieval work (query embedding, index search) behind the async API
+RETRIEVAL_WORKERS = int(os.environ.get('RAG_RETRIEVAL_WORKERS', '8'))
+# Finished recommendations (resources + LLM reason) kept per question/category/catalog version
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RAG_RECOMMENDATION_CACHE_SIZE', '1000'))
+RECOMMENDATION_CACHE_TTL = float(os.environ.get('RAG_RECOMMENDATION_CACHE_TTL', '3600'))
+# How often a request may stat structured_resources.json to pick up direct rewrites (e.g. by scripts)
+CATALOG_CHECK_SECONDS = float(os.environ.get('RAG_CATALOG_CHECK_SECONDS', '2'))
+# 'template' (default): answer with a reason built from the matched fields and have the LLM
+# rewrite it in the background; 'llm': wait for the LLM-written reason before responding
+REASON_MODE = os.environ.get('RAG_REASON_MODE', 'template').strip().lower()
+# Background LLM enrichments running at once, and finished results kept for clients to collect
+ENRICHMENT_CONCURRENCY = int(os.environ.get('RAG_ENRICHMENT_CONCURRENCY', '4'))
+ENRICHMENT_RESULTS = int(os.environ.get('RAG_ENRICHMENT_RESULTS', '1000'))
+# Seconds a vector index replaced by a rebuild is kept before it is deleted, so searches
+# that picked it up before the swap can finish; 0 deletes it right away
+INDEX_DISCARD_GRACE_SECONDS = float(os.environ.get('RAG_INDEX_DISCARD_GRACE_SECONDS', '60'))
+# Resource fields indexed for lexical (BM25) retrieval
+LEXICAL_FIELDS = ['resource_name', 'services', 'eligibility', 'target_population', 'key_features', 'location']
+CATEGORIES_FILE = SCRIPT_DIR / 'resource_categories.json'
+RECOMMENDATION_COUNT = 5
 # --- End Configuration ---
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# How each searchable category's need is phrased in queries and prompts; categories from
+# resource_categories.json without an entry here use their description
+CATEGORY_NEEDS = {
+    'food': "food assistance, meals, pantries, or nutrition programs",
+    'housing': "housing assistance, shelter, or accommodation",
+    'transportation': "transportation assistance, rides, or mobility services",
+}
+# Needs the LLM prompt and templated reasons word differently from the query sentence
+PROMPT_NEEDS = {
+    'housing': "housing assistance, shelter, or accommodation services",
+}
+
+
+def _load_category_needs() -> Dict[str, str]:
+    """Every searchable resource category mapped to a short description of the need."""
+    needs = dict(CATEGORY_NEEDS)
+    try:
+        with open(CATEGORIES_FILE, 'r') as f:
+            categories = json.load(f)
+        for key, category in categories.items():
+            needs.setdefault(key, (category.get('description') or category.get('name') or key).lower())
+    except Exception as e:
+        logging.warning(f"Could not load resource categories from {CATEGORIES_FILE}: {e}")
+    return needs
+
+# Hard eligibility constraints: what a resource requires, derived once from its structured fields
+AGE_RANGE = re.compile(r'(\d+)\s*(?:-|–|to)\s*(\d+)')
+AGE_MINIMUM = re.compile(r'(\d+)\s*(?:\+|or older|and older|on up)')
+DISABILITY_REQUIRED = re.compile(r'(?<!no )proof of disability required|documented disability|must meet ada')
+
+
+def resource_eligibility(resource: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized hard requirements of a resource: age range, veteran/disability only, ID required."""
+    age_group = str(resource.get('age_group') or '').lower()
+    min_age, max_age = 0, 200
+    # "18-25 or women with children" offers an alternative to the age limit; "18 or older" does not
+    alternatives = ' or ' in AGE_MINIMUM.sub('', age_group)
+    if not age_group.startswith(('all', 'any')) and not alternatives:
+        age_range = AGE_RANGE.search(age_group)
+        age_minimum = AGE_MINIMUM.search(age_group)
+        if age_range:
+            min_age, max_age = int(age_range.group(1)), int(age_range.group(2))
+        elif age_minimum:
+            min_age = int(age_minimum.group(1))
+        elif age_group.startswith('adult'):
+            min_age = 18
+
+    target = str(resource.get('target_population') or '').lower()
+    requirements = ' '.join(str(resource.get(field) or '') for field in ('eligibility', 'age_group')).lower()
+    id_policy = str(resource.get('accepts_clients_without_id') or '').lower()
+    immigration = str(resource.get('immigration_status') or '').lower()
+    return {
+        'age': (min_age, max_age),
+        'veteran_only': 'veteran' in target or age_group == 'veterans',
+        'disability_only': bool(DISABILITY_REQUIRED.search(requirements)),
+        'id_required': bool(re.match(r'no\b', id_policy)) or 'must have a valid state id' in immigration
+                       or 'requires photo id' in immigration,
+    }
+
+
+def client_constraints(client_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Hard constraints known about a client. Only explicit answers count: a missing
+    is_veteran, has_disability or has_id does not exclude anything.
+    """
+    def explicit_no(value) -> bool:
+        return value is False or str(value).strip().lower() in ('no', 'false')
+
+    constraints: Dict[str, Any] = {}
+    age = client_data.get('age')
+    if age in (None, '') and client_data.get('dateOfBirth'):
+        age = _calculate_age(client_data['dateOfBirth']) or None
+    try:
+        if age not in (None, ''):
+            constraints['age'] = int(age)
+    except (TypeError, ValueError):
+        pass
+    if explicit_no(client_data.get('is_veteran')):
+        constraints['veteran'] = False
+    if explicit_no(client_data.get('has_disability')):
+        constraints['disability'] = False
+    if explicit_no(client_data.get('has_id')):
+        constraints['has_id'] = False
+    return constraints
+
+
+class EligibilityIndex:
+    """
+    Precomputed eligibility bitsets (one boolean mask per field value) over a list of
+    resources or chunks. mask() intersects the sets a client's constraints allow.
+    """
+
+    def __init__(self, resources: List[Dict[str, Any]]):
+        self.size = len(resources)
+        self._bitsets: Dict[str, Dict[Any, np.ndarray]] = {}
+        for position, resource in enumerate(resources):
+            for field, value in resource_eligibility(resource).items():
+                bitset = self._bitsets.setdefault(field, {}).setdefault(value, np.zeros(self.size, dtype=bool))
+                bitset[position] = True
+
+    def _union(self, field: str, accept) -> np.ndarray:
+        allowed = np.zeros(self.size, dtype=bool)
+        for value, bitset in self._bitsets.get(field, {}).items():
+            if accept(value):
+                allowed |= bitset
+        return allowed
+
+    def mask(self, constraints: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Eligible positions for the constraints, or None when nothing is constrained."""
+        if not constraints:
+            return None
+        allowed = np.ones(self.size, dtype=bool)
+        if 'age' in constraints:
+            age = constraints['age']
+            allowed &= self._union('age', lambda bounds: bounds[0] <= age <= bounds[1])
+        if constraints.get('veteran') is False:
+            allowed &= self._union('veteran_only', lambda only: not only)
+        if constraints.get('disability') is False:
+            allowed &= self._union('disability_only', lambda only: not only)
+        if constraints.get('has_id') is False:
+            allowed &= self._union('id_required', lambda required: not required)
+        return allowed
+
+
+def constraints_key(constraints: Optional[Dict[str, Any]]) -> str:
+    """Canonical string form of a constraint set, for grouping and cache keys."""
+    return json.dumps(constraints or {}, sort_keys=True)
+
+
+# Prefix of the resource_eligibility fields stored as flat metadata in metadata-filtered indexes;
+# bump the version when resource_eligibility changes so stored fields are derived again
+ELIGIBILITY_PREFIX = 'eligibility_'
+ELIGIBILITY_VERSION = 1
+
+
+def eligibility_metadata(resource: Dict[str, Any]) -> Dict[str, Any]:
+    """resource_eligibility flattened into scalar metadata fields."""
+    eligibility = resource_eligibility(resource)
+    min_age, max_age = eligibility.pop('age')
+    eligibility.update(min_age=min_age, max_age=max_age)
+    return {ELIGIBILITY_PREFIX + field: value for field, value in eligibility.items()}
+
+
+def eligibility_where(category: Optional[str], constraints: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Chroma where clause for a category and client constraints over eligibility_metadata fields."""
+    clauses = [{'category': category}] if category else []
+    constraints = constraints or {}
+    if 'age' in constraints:
+        clauses.append({ELIGIBILITY_PREFIX + 'min_age': {'$lte': constraints['age']}})
+        clauses.append({ELIGIBILITY_PREFIX + 'max_age': {'$gte': constraints['age']}})
+    for constraint, field in (('veteran', 'veteran_only'), ('disability', 'disability_only'),
+                              ('has_id', 'id_required')):
+        if constraints.get(constraint) is False:
+            clauses.append({ELIGIBILITY_PREFIX + field: False})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+class VectorHit(NamedTuple):
+    document: Document
+    score: float              # cosine similarity to the query
+    vector: np.ndarray        # L2-normalized chunk embedding
+
+
+class VectorIndex:
+    """
+    Similarity index over resource chunks, addressed by stable chunk ids.
+
+    Implementations embed documents on upsert and answer top-k queries, optionally
+    restricted to one resource category.
+    """
+
+    name = 'base'
+
+    def __init__(self, embeddings, directory: Path):
+        self.embeddings = embeddings
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def ids(self) -> List[str]:
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], documents: List[Document]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Drop every stored vector (e.g. after an embedding model change)."""
+        raise NotImplementedError
+
+    def backfill_eligibility(self) -> None:
+        """Add eligibility metadata to entries stored before it existed (metadata-filtered engines only)."""
+        pass
+
+    def search(self, query: str, k: int, category: Optional[str] = None,
+               constraints: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.search_batch([query], k, category, constraints)[0]
+
+    def search_batch(self, queries: List[str], k: int, category: Optional[str] = None,
+                     constraints: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        return self.search_vectors(self.embeddings.embed_documents(queries), k, category, constraints)
+
+    def search_vectors(self, vectors, k: int, category: Optional[str] = None,
+                       constraints: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """
+        Top-k documents for each of a list of already computed query embeddings, among
+        documents in the category that satisfy the client constraints (see client_constraints).
+        """
+        return [[hit.document for hit in hits] for hits in self.search_hits(vectors, k, category, constraints)]
+
+    def search_hits(self, vectors, k: int, category: Optional[str] = None,
+                    constraints: Optional[Dict[str, Any]] = None) -> List[List[VectorHit]]:
+        """search_vectors with each chunk's similarity and vector, for aggregation and diversification."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class ChromaVectorIndex(VectorIndex):
+    """
+    Persistent Chroma collection. The category and the client's eligibility constraints
+    are a metadata filter evaluated before ranking, over eligibility_metadata fields
+    stored with every chunk.
+    """
+
+    name = 'chroma'
+
+    def __init__(self, embeddings, directory: Path):
+        super().__init__(embeddings, directory)
+        # Imported here so the NumPy engine never loads chromadb
+        from langchain_chroma import Chroma
+        self._chroma = Chroma
+        self.store = self._open()
+
+    def _open(self):
+        return self._chroma(
+            collection_name=VECTOR_COLLECTION,
+            embedding_function=self.embeddings,
+            persist_directory=str(self.directory)
+        )
+
+    def ids(self) -> List[str]:
+        return self.store.get(include=[])['ids']
+
+    def upsert(self, ids: List[str], documents: List[Document]) -> None:
+        documents = [Document(page_content=doc.page_content, metadata={**doc.metadata, **eligibility_metadata(doc.metadata)})
+                     for doc in documents]
+        self.store.add_documents(documents, ids=ids)
+
+    def delete(self, ids: List[str]) -> None:
+        if ids:
+            self.store.delete(ids=ids)
+
+    def reset(self) -> None:
+        self.store.delete_collection()
+        self.store = self._open()
+
+    def backfill_eligibility(self) -> None:
+        stored = self.store.get(include=['metadatas'])
+        if stored['ids']:
+            self.store._collection.update(
+                ids=stored['ids'],
+                metadatas=[{**(metadata or {}), **eligibility_metadata(metadata or {})} for metadata in stored['metadatas']]
+            )
+
+    @staticmethod
+    def _resource_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Stored metadata without the derived eligibility fields."""
+        return {key: value for key, value in (metadata or {}).items() if not key.startswith(ELIGIBILITY_PREFIX)}
+
+    def search(self, query: str, k: int, category: Optional[str] = None,
+               constraints: Optional[Dict[str, Any]] = None) -> List[Document]:
+        found = self.store.similarity_search(query, k=k, filter=eligibility_where(category, constraints))
+        return [Document(page_content=doc.page_content, metadata=self._resource_metadata(doc.metadata))
+                for doc in found]
+
+    def search_hits(self, vectors, k: int, category: Optional[str] = None,
+                    constraints: Optional[Dict[str, Any]] = None) -> List[List[VectorHit]]:
+        queries = self._normalize(vectors)
+        if not len(queries) or k <= 0:
+            return [[] for _ in queries]
+        found = self.store._collection.query(
+            query_embeddings=queries.tolist(), n_results=k,
+            where=eligibility_where(category, constraints),
+            include=['documents', 'metadatas', 'embeddings']
+        )
+        results = []
+        for query, texts, metadatas, embeddings in zip(queries, found['documents'], found['metadatas'],
+                                                       found['embeddings']):
+            if not len(texts):
+                results.append([])
+                continue
+            # Similarity is recomputed as a cosine so it does not depend on the collection's distance metric
+            rows = self._normalize(embeddings)
+            results.append([VectorHit(Document(page_content=text, metadata=self._resource_metadata(metadata)),
+                                      float(score), row)
+                            for text, metadata, score, row in zip(texts, metadatas, rows @ query, rows)])
+        return results
+
+
+class _IndexState(NamedTuple):
+    ids: List[str]
+    documents: List[Document]
+    matrix: np.ndarray        # full-precision float32 rows (memory-mapped when loaded from disk)
+    categories: np.ndarray
+    scan: np.ndarray          # matrix in the storage dtype, scanned for every query
+    scales: Optional[np.ndarray]  # per-row scale for int8 storage
+    eligibility: 'EligibilityIndex'
+
+
+def quantize_vectors(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Compact copy of a float32 matrix: float16, or int8 with a per-vector scale (max |v| / 127)."""
+    if dtype == 'float16':
+        return np.asarray(matrix, dtype=np.float16), None
+    if dtype == 'int8':
+        matrix = np.asarray(matrix, dtype=np.float32)
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return matrix, None
+
+
+class NumpyVectorIndex(VectorIndex):
+    """
+    Exact brute-force search over a contiguous, L2-normalized float32 matrix.
+
+    The matrix is persisted as embeddings.npy and memory-mapped on load, with chunk
+    ids, text and metadata in chunks.json. A query is one matrix-vector product (a
+    matrix-matrix product for a batch), a boolean category mask and an argpartition
+    top-k. Writes build new arrays and swap them in whole, so searches never see a
+    half-applied update.
+
+    With dtype 'float16' or 'int8' only the quantized copy is kept in memory and
+    scanned; the top k * rescore_factor candidates are then re-scored against their
+    full-precision rows, which are read from the memory-mapped file.
+    """
+
+    name = 'numpy'
+
+    def __init__(self, embeddings, directory: Path, dtype: str = 'float32', rescore_factor: int = 4):
+        super().__init__(embeddings, directory)
+        if dtype not in ('float32', 'float16', 'int8'):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.dtype = dtype
+        self.rescore_factor = max(rescore_factor, 1)
+        self._matrix_path = self.directory / 'embeddings.npy'
+        self._chunks_path = self.directory / 'chunks.json'
+        self._lock = threading.Lock()
+        self._state = self._build_state([], [], np.zeros((0, 0), dtype=np.float32))
+        self._load()
+
+    def _build_state(self, ids: List[str], documents: List[Document], matrix: np.ndarray) -> _IndexState:
+        categories = np.array([str(doc.metadata.get('category', '')) for doc in documents], dtype=str)
+        scan, scales = quantize_vectors(matrix, self.dtype)
+        eligibility = EligibilityIndex([doc.metadata for doc in documents])
+        return _IndexState(ids, documents, matrix, categories, scan, scales, eligibility)
+
+    def _load(self) -> None:
+        if not (self._matrix_path.exists() and self._chunks_path.exists()):
+            return
+        try:
+            with open(self._chunks_path, 'r') as f:
+                chunks = json.load(f)
+            matrix = np.load(self._matrix_path, mmap_mode='r')
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable NumPy vector index in {self.directory}: {e}")
+            return
+        if matrix.shape[0] != len(chunks):
+            logging.warning(f"NumPy vector index in {self.directory} is inconsistent, starting empty")
+            return
+        ids = [chunk['id'] for chunk in chunks]
+        documents = [Document(page_content=chunk['text'], metadata=chunk['metadata']) for chunk in chunks]
+        self._state = self._build_state(ids, documents, matrix)
+
+    def _persist_and_swap(self, ids: List[str], documents: List[Document], matrix: np.ndarray) -> None:
+        """Write the arrays via temp files + rename, then swap in a memory-mapped view."""
+        tmp_matrix = self.directory / 'embeddings.tmp.npy'
+        np.save(tmp_matrix, np.ascontiguousarray(matrix, dtype=np.float32))
+        tmp_chunks = self._chunks_path.with_name(self._chunks_path.name + '.tmp')
+        with open(tmp_chunks, 'w') as f:
+            json.dump([{'id': chunk_id, 'text': doc.page_content, 'metadata': doc.metadata}
+                       for chunk_id, doc in zip(ids, documents)], f)
+        os.replace(tmp_matrix, self._matrix_path)
+        os.replace(tmp_chunks, self._chunks_path)
+        self._state = self._build_state(ids, documents, np.load(self._matrix_path, mmap_mode='r'))
+
+    def ids(self) -> List[str]:
+        return list(self._state.ids)
+
+    def memory_bytes(self) -> int:
+        """Resident size of what every query scans (the quantized copy when one is used)."""
+        state = self._state
+        return state.scan.nbytes + (state.scales.nbytes if state.scales is not None else 0)
+
+    def upsert(self, ids: List[str], documents: List[Document]) -> None:
+        if not ids:
+            return
+        vectors = self._normalize(self.embeddings.embed_documents([doc.page_content for doc in documents]))
+        with self._lock:
+            state = self._state
+            new_ids, new_docs = list(state.ids), list(state.documents)
+            rows = np.array(state.matrix, dtype=np.float32) if len(new_ids) else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            position = {chunk_id: i for i, chunk_id in enumerate(new_ids)}
+            appended = []
+            for chunk_id, doc, vector in zip(ids, documents, vectors):
+                if chunk_id in position:
+                    rows[position[chunk_id]] = vector
+                    new_docs[position[chunk_id]] = doc
+                else:
+                    position[chunk_id] = len(new_ids)
+                    new_ids.append(chunk_id)
+                    new_docs.append(doc)
+                    appended.append(vector)
+            if appended:
+                rows = np.vstack([rows, np.stack(appended)])
+            self._persist_and_swap(new_ids, new_docs, rows)
+
+    def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            state = self._state
+            removed = set(ids)
+            keep = [i for i, chunk_id in enumerate(state.ids) if chunk_id not in removed]
+            if len(keep) == len(state.ids):
+                return
+            self._persist_and_swap([state.ids[i] for i in keep], [state.documents[i] for i in keep],
+                                   np.asarray(state.matrix[keep], dtype=np.float32))
+
+    def reset(self) -> None:
+        with self._lock:
+            for path in (self._matrix_path, self._chunks_path):
+                if path.exists():
+                    path.unlink()
+            self._state = self._build_state([], [], np.zeros((0, 0), dtype=np.float32))
+
+    def search(self, query: str, k: int, category: Optional[str] = None,
+               constraints: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.search_vectors([self.embeddings.embed_query(query)], k, category, constraints)[0]
+
+    def search_batch(self, queries: List[str], k: int, category: Optional[str] = None,
+                     constraints: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        if not queries:
+            return []
+        return self.search_vectors(self.embeddings.embed_documents(queries), k, category, constraints)
+
+    def search_vectors(self, vectors, k: int, category: Optional[str] = None,
+                       constraints: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """Top-k documents for each row of a (queries x dims) matrix, scored in one matrix product."""
+        state = self._state
+        top = self._top_k(state, self._normalize(vectors), k, category, constraints)
+        return [[state.documents[i] for i in row] for row in top]
+
+    def search_hits(self, vectors, k: int, category: Optional[str] = None,
+                    constraints: Optional[Dict[str, Any]] = None) -> List[List[VectorHit]]:
+        state = self._state
+        queries = self._normalize(vectors)
+        top = self._top_k(state, queries, k, category, constraints)
+        results = []
+        for query, row in zip(queries, top):
+            rows = np.asarray(state.matrix[row], dtype=np.float32)
+            results.append([VectorHit(state.documents[i], float(score), vector)
+                            for i, score, vector in zip(row, rows @ query, rows)])
+        return results
+
+    def _top_k(self, state: _IndexState, vectors: np.ndarray, k: int, category: Optional[str],
+               constraints: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        count = len(state.ids)
+        if count:
+            scores = vectors @ state.scan.T
+            if state.scales is not None:
+                scores = scores * state.scales
+        else:
+            scores = np.zeros((len(vectors), 0), dtype=np.float32)
+        # Category and eligibility bitsets are intersected before ranking
+        mask = state.eligibility.mask(constraints)
+        if category:
+            mask = state.categories == category if mask is None else mask & (state.categories == category)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            available = int(mask.sum())
+        else:
+            available = count
+        k = min(k, available)
+        if k <= 0:
+            return np.zeros((len(vectors), 0), dtype=np.int64)
+
+        quantized = state.scan is not state.matrix
+        candidates = min(k * self.rescore_factor, available) if quantized else k
+        top = _argtop(scores, candidates)
+        if quantized:
+            # Re-score the candidates against their full-precision rows
+            exact = np.einsum('qd,qcd->qc', vectors, np.asarray(state.matrix[top], dtype=np.float32))
+            top = np.take_along_axis(top, np.argsort(-exact, axis=1)[:, :k], axis=1)
+        return top
+
+
+def _argtop(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k best scores in each row, best first."""
+    count = scores.shape[1]
+    if k < count:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(count), (len(scores), 1))
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)[:, :k]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_memory_report(matrix: np.ndarray, dimensions=(3072, 1536, 1024, 512, 256),
+                         dtypes=('float32', 'float16', 'int8'), k: int = 5,
+                         sample: int = 200, rescore_factor: int = 4, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Recall@k and scanned-matrix memory for each (dimensions, dtype) setting.
+
+    Ground truth is exact float32 search at full dimension. A sample of the stored
+    vectors serves as queries (each query's own row is excluded). Truncation slices
+    the leading dimensions and renormalizes, which is how the embedding model's
+    shortened vectors are defined.
+    """
+    full = NumpyVectorIndex._normalize(np.asarray(matrix, dtype=np.float32))
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(full), size=min(sample, len(full)), replace=False)
+
+    def neighbours(scores):
+        scores[np.arange(len(picks)), picks] = -np.inf
+        return _argtop(scores, k)
+
+    truth = neighbours(full[picks] @ full.T)
+    report = []
+    for dims in dimensions:
+        if dims > full.shape[1]:
+            continue
+        truncated = NumpyVectorIndex._normalize(full[:, :dims])
+        for dtype in dtypes:
+            scan, scales = quantize_vectors(truncated, dtype)
+            queries = truncated[picks]
+            scores = queries @ scan.T
+            if scales is not None:
+                scores = scores * scales
+            if dtype == 'float32':
+                found = neighbours(scores)
+            else:
+                scores[np.arange(len(picks)), picks] = -np.inf
+                top = _argtop(scores, min(k * rescore_factor, len(full) - 1))
+                exact = np.einsum('qd,qcd->qc', queries, truncated[top])
+                found = np.take_along_axis(top, np.argsort(-exact, axis=1)[:, :k], axis=1)
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+            report.append({
+                'dimensions': dims,
+                'dtype': dtype,
+                'recall_at_k': round(float(recall), 4),
+                'scan_bytes': int(scan.nbytes + (scales.nbytes if scales is not None else 0)),
+            })
+    return report
+
+
+def vector_engine() -> str:
+    if VECTOR_ENGINE not in ('chroma', 'numpy'):
+        logging.warning(f"Unknown RAG_VECTOR_ENGINE '{VECTOR_ENGINE}', using Chroma")
+        return 'chroma'
+    return VECTOR_ENGINE
+
+
+def _active_pointer(engine: str) -> Path:
+    return VECTOR_INDEX_DIR / f'ACTIVE-{engine}'
+
+
+def active_index_directory(engine: str) -> Path:
+    """
+    Directory of the live index for an engine.
+
+    Background rebuilds write a new index into its own directory and then point
+    ACTIVE-<engine> at it; without a pointer the original fixed location is used.
+    """
+    pointer = _active_pointer(engine)
+    if pointer.exists():
+        directory = VECTOR_INDEX_DIR / pointer.read_text().strip()
+        if directory.is_dir():
+            return directory
+    return VECTOR_INDEX_DIR / 'numpy' if engine == 'numpy' else VECTOR_INDEX_DIR
+
+
+def create_vector_index(embeddings, directory: Optional[Path] = None) -> VectorIndex:
+    """Build the vector index selected by RAG_VECTOR_ENGINE, by default at its live location."""
+    engine = vector_engine()
+    directory = directory or active_index_directory(engine)
+    if engine == 'numpy':
+        return NumpyVectorIndex(embeddings, directory, VECTOR_DTYPE, RESCORE_FACTOR)
+    return ChromaVectorIndex(embeddings, directory)
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 index over selected resource fields, one entry per resource.
+
+    Postings hold each term's precomputed BM25 term-frequency weight, so a query
+    is a sum of idf-scaled postings into a score vector. Building it needs no
+    network access, which makes it the fallback when embeddings are unavailable.
+    """
+
+    STOPWORDS = {
+        'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is', 'it',
+        'no', 'not', 'of', 'on', 'or', 'the', 'to', 'with', 'yes', 'find', 'client', 'clients',
+        'resource', 'resources', 'unknown', 'specified',
+    }
+
+    def __init__(self, resources: List[Dict[str, Any]], fields: List[str] = LEXICAL_FIELDS,
+                 k1: float = 1.5, b: float = 0.75):
+        self.documents = [Document(page_content=RAGResourceMatcher._resource_content(resource), metadata=resource)
+                          for resource in resources]
+        self.categories = np.array([str(resource.get('category', '')) for resource in resources], dtype=str)
+        self.eligibility = EligibilityIndex(resources)
+        tokenized = [self.tokenize(' '.join(str(resource.get(field) or '') for field in fields))
+                     for resource in resources]
+        lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float32)
+        average = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, tokens in enumerate(tokenized):
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        count = len(resources)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        for token, counts in postings.items():
+            doc_ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            norm = k1 * (1 - b + b * lengths[doc_ids] / average)
+            self._postings[token] = (doc_ids, tf * (k1 + 1) / (tf + norm))
+            self._idf[token] = float(np.log(1 + (count - len(counts) + 0.5) / (len(counts) + 0.5)))
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return [token for token in re.findall(r'[a-z0-9]+', text.lower())
+                if token not in cls.STOPWORDS and len(token) > 1]
+
+    def search(self, query: str, k: int, category: Optional[str] = None,
+               constraints: Optional[Dict[str, Any]] = None) -> List[Document]:
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for token in set(self.tokenize(query)):
+            if token in self._postings:
+                doc_ids, weights = self._postings[token]
+                scores[doc_ids] += self._idf[token] * weights
+        candidates = np.flatnonzero(scores > 0)
+        if category:
+            candidates = candidates[self.categories[candidates] == category]
+        eligible = self.eligibility.mask(constraints)
+        if eligible is not None:
+            candidates = candidates[eligible[candidates]]
+        top = candidates[np.argsort(-scores[candidates], kind='stable')[:k]]
+        return [self.documents[i] for i in top]
+
+
+def reciprocal_rank_scores(rankings: List[List[Document]], key, constant: int = 60) -> List[Tuple[Document, float]]:
+    """Fused (document, score) pairs, best first, scoring each item by the sum of 1 / (constant + rank)."""
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            doc_key = key(doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (constant + rank + 1)
+            first_seen.setdefault(doc_key, doc)
+    ordered = sorted(scores, key=lambda doc_key: -scores[doc_key])
+    return [(first_seen[doc_key], scores[doc_key]) for doc_key in ordered]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, key, constant: int = 60) -> List[Document]:
+    """Merge ranked lists by summing 1 / (constant + rank); key(doc) identifies the same item across lists."""
+    return [doc for doc, _ in reciprocal_rank_scores(rankings, key, constant)[:k]]
+
+
+class ResourceCandidate(NamedTuple):
+    document: Document            # the resource's best-scoring chunk
+    score: float
+    vector: Optional[np.ndarray]  # normalized mean of its retrieved chunk vectors, if any
+
+
+def aggregate_hits(hits: List[VectorHit], key, how: str = 'max') -> List[ResourceCandidate]:
+    """
+    Collapse chunk hits into one candidate per resource (key(doc) identifies the resource),
+    scored by its best chunk ('max') or by all of its retrieved chunks ('sum'), best first.
+    """
+    groups: Dict[str, List[VectorHit]] = {}
+    for hit in hits:
+        groups.setdefault(key(hit.document), []).append(hit)
+    candidates = []
+    for group in groups.values():
+        scores = np.array([hit.score for hit in group], dtype=np.float32)
+        vector = np.mean([hit.vector for hit in group], axis=0)
+        norm = np.linalg.norm(vector)
+        candidates.append(ResourceCandidate(
+            group[int(scores.argmax())].document,
+            float(scores.sum() if how == 'sum' else scores.max()),
+            vector / norm if norm else vector
+        ))
+    candidates.sort(key=lambda candidate: -candidate.score)
+    return candidates
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, weight: float = MMR_LAMBDA) -> List[int]:
+    """
+    Greedy maximal marginal relevance: positions of k candidates, each maximizing
+    weight * relevance - (1 - weight) * (highest similarity to those already picked).
+
+    Relevance is rescaled to [0, 1] first so fused rank scores and cosine similarities
+    trade off the same way. Zero rows in `vectors` (no embedding) are similar to nothing.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    k = min(k, len(relevance))
+    if k <= 0:
+        return []
+    if weight >= 1.0:
+        return [int(i) for i in np.argsort(-relevance, kind='stable')[:k]]
+    span = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / span if span > 0 else np.ones_like(relevance)
+    similarity = vectors @ vectors.T if vectors.size else np.zeros((len(relevance), len(relevance)), dtype=np.float32)
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = similarity[picked[0]].copy()
+    while len(picked) < k:
+        gain = weight * relevance - (1.0 - weight) * redundancy
+        gain[picked] = -np.inf
+        best = int(np.argmax(gain))
+        picked.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+class RecommendationCache:
+    """
+    Thread-safe LRU of finished recommendations with a time-to-live.
+
+    Values are (resource keys, recommendation reason, retrieval mode); the caller
+    resolves the keys against the current catalog.
+    """
+
+    def __init__(self, max_entries: int = RECOMMENDATION_CACHE_SIZE, ttl_seconds: float = RECOMMENDATION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, ...], Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, ...]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, ...], value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
 class RAGResourceMatcher:
-    def __init__(self):
+    def __init__(self, background_warm_up: bool = False):
+        """
+        With background_warm_up the vector index is not touched here: call start_warm_up()
+        and the matcher serves BM25 results until the index is ready. Otherwise the index
+        is loaded (and embedded if needed) before the constructor returns.
+
+        Without an OpenAI key there is no LLM and no embeddings: the matcher serves BM25
+        results with templated reasons and reports the missing key in status_report().
+        The chat model is created on first use, and RAG_RETRIEVAL_MODE=lexical creates
+        no embedding client at all.
+        """
         # 1. Initialize OpenAI and Embedding Models
         openai_key = os.environ.get("OPENAI_API_KEY") or os.environ.get("OPEN_API_KEY")
-        if not openai_key:
-            raise ValueError("OPENAI_API_KEY or OPEN_API_KEY environment variable is required.")
-        
-        # Set the OpenAI API key for the session
-        os.environ["OPENAI_API_KEY"] = openai_key
-        
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+        self._llm = None
+        self.embeddings = None
+        self.error: Optional[str] = None
+        if openai_key:
+            # Set the OpenAI API key for the session
+            os.environ["OPENAI_API_KEY"] = openai_key
+            if RETRIEVAL_MODE != 'lexical':
+                # Repeated client questions are answered from the persistent query-embedding cache
+                self.embeddings = CachedEmbeddings(
+                    get_llm_gateway().embeddings(EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS or None),
+                    EMBEDDING_SIGNATURE
+                )
+        else:
+            self.error = "OPENAI_API_KEY or OPEN_API_KEY is not set"
+            logging.warning(f"{self.error}; serving keyword matches without LLM reasons")
+        self.index: Optional[VectorIndex] = None
+        self.lexical: Optional[LexicalIndex] = None
+        self._catalog_hash = None
+        self._catalog_stat = None
+        self._catalog_checked = 0.0
+        self._catalog_check_lock = threading.Lock()
+        self._resources_by_key: Dict[str, Dict[str, Any]] = {}
+        # Bumped whenever a sync changes the vector index; part of the catalog version
+        self._index_generation = 0
+        self.recommendation_cache = RecommendationCache()
+        self.reranker = ResourceReranker()
+        self.category_needs = _load_category_needs()
+        # starting -> warming -> ready, or degraded when the vector index could not be loaded
+        # (or there is no OpenAI key to embed with)
+        self.status = 'degraded' if self.error else 'starting'
+        self.progress: Dict[str, int] = {}
+        self._warm_up_thread = None
+        self._sync_lock = threading.RLock()
+        self._resync_lock = threading.Lock()
+        self._resync_requested = False
+        self._resync_thread = None
+        self._executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix='rag-retrieval')
+        # Background LLM reasons for templated responses, by enrichment id. Requests can arrive
+        # on several event loops, so each task is kept with its loop and each loop has its own limit
+        self._enrichments: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._enrichment_tasks: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self._enrichment_semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = \
+            weakref.WeakKeyDictionary()
+        self._enrichment_lock = threading.Lock()
+
+        # 2. Build the local BM25 index; it needs no network and backs up vector search
+        try:
+            self._refresh_catalog()
+        except Exception as e:
+            logging.error(f"Failed to build lexical resource index: {e}", exc_info=True)
+
+        # 3. Open (or incrementally update) the persistent vector store
+        if not background_warm_up:
+            self.warm_up()
+
+    @property
+    def llm(self):
+        """The chat model for recommendation reasons, or None without an OpenAI key."""
+        if self._llm is None and self.error is None:
+            self._llm = get_llm_gateway().chat_model("gpt-4o-mini", temperature=0)
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm) -> None:
+        self._llm = llm
+
+    def start_warm_up(self) -> threading.Thread:
+        """Run warm_up() on a daemon thread; requests are served lexically meanwhile."""
+        if self._warm_up_thread is None:
+            self._warm_up_thread = threading.Thread(target=self.warm_up, name='vector-index-warm-up', daemon=True)
+            self._warm_up_thread.start()
+        return self._warm_up_thread
 
-        # 2. Load data, create documents, and build the in-memory vector store
+    def warm_up(self) -> None:
+        """Load the vector index; failures leave the matcher degraded to BM25 instead of raising."""
+        if self.error:
+            logging.warning(f"{self.error}, skipping the vector index")
+            return
+        if RETRIEVAL_MODE == 'lexical':
+            logging.info("RAG_RETRIEVAL_MODE=lexical, skipping the vector index")
+            self.status = 'ready'
+            return
+        self.status = 'warming'
         try:
             self._load_resources_and_build_vector_store()
-            logging.info("RAG Resource Matcher initialized successfully")
         except Exception as e:
             logging.error(f"Failed to initialize RAG Resource Matcher: {e}", exc_info=True)
-            self.vector_store = None # Ensure it's None if initialization fails
+            self.status = 'degraded' if self.index is None else 'ready'
+        else:
+            self.status = 'ready'
+            logging.info("RAG Resource Matcher initialized successfully")
+        # Catalog edits made while warming up were not scheduled; sync them now
+        with self._resync_lock:
+            pending = self._resync_requested
+        if pending:
+            self._schedule_resync()
 
-    def _load_resources_and_build_vector_store(self):
-        """Loads resource data from JSON and builds an in-memory Chroma vector store."""
-        logging.info("Loading resources from JSON and building vector store...")
-        
-        # Load resources from JSON
-        with open(RESOURCES_FILE, 'r') as f:
-            resources = json.load(f)
-        
-        # Create documents from resources
-        documents = []
-        for resource in resources:
-            # Create searchable text content
-            content = f"""
+    def status_report(self) -> Dict[str, Any]:
+        """Readiness for /health: warm-up state, embedding progress and what is serving requests."""
+        return {
+            'status': self.status,
+            'progress': dict(self.progress),
+            'vector_index': self.index.name if self.index else None,
+            'index_directory': str(self.index.directory) if self.index else None,
+            'retrieval': RETRIEVAL_MODE if self.index else 'lexical',
+            'llm': self.error is None,
+            'error': self.error,
+        }
+
+    @staticmethod
+    def _resource_content(resource: Dict[str, Any]) -> str:
+        """Searchable text for one resource."""
+        return f"""
             Resource: {resource.get('resource_name', 'Unknown')}
             Organization: {resource.get('organization', 'Unknown')}
             Category: {resource.get('category', 'Unknown')}
@@ -70,35 +1011,354 @@ class RAGResourceMatcher:
             Advance Booking Required: {resource.get('advance_booking_required', 'Unknown')}
             ADA Accessible: {resource.get('ada_accessible', 'Unknown')}
             """.strip()
-            
-            doc = Document(
-                page_content=content,
-                metadata=resource
-            )
-            documents.append(doc)
-        
-        # Split documents into chunks
+
+    @staticmethod
+    def _resource_key(resource: Dict[str, Any]) -> str:
+        """Stable identity of a resource, used to derive its chunk ids."""
+        if resource.get('id'):
+            return str(resource['id'])
+        return hashlib.sha256(str(resource.get('resource_name', '')).encode('utf-8')).hexdigest()[:16]
+
+    def _build_chunks(self, resources: List[Dict[str, Any]]) -> List[Tuple[str, Document]]:
+        """Split every resource into chunks with stable ids ('<resource id>:<chunk number>')."""
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=100,
             separators=["\n\n", "\n", " ", ""]
         )
-        split_docs = text_splitter.split_documents(documents)
-        
-        # Create the in-memory vector store using Chroma
-        logging.info(f"Creating Chroma index from {len(split_docs)} document chunks...")
-        self.vector_store = Chroma.from_documents(split_docs, self.embeddings)
-        logging.info("In-memory vector store created successfully.")
+        chunks = []
+        seen: Dict[str, int] = {}
+        for resource in resources:
+            doc = Document(page_content=self._resource_content(resource), metadata=resource)
+            key = self._resource_key(resource)
+            # The catalog reuses some ids; later duplicates get an occurrence suffix
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > 1:
+                key = f"{key}~{seen[key]}"
+            for n, chunk in enumerate(text_splitter.split_documents([doc])):
+                chunks.append((f"{key}:{n}", chunk))
+        return chunks
+
+    @staticmethod
+    def _chunk_hash(doc: Document) -> str:
+        payload = json.dumps([doc.page_content, doc.metadata], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _read_manifest(path: Path) -> Dict[str, Any]:
+        try:
+            if path.exists():
+                with open(path, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable vector index manifest {path}: {e}")
+        return {}
+
+    @staticmethod
+    def _write_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _fusion_key(doc: Document) -> str:
+        """Identity of the resource a document (or chunk) belongs to, for merging result lists."""
+        return f"{RAGResourceMatcher._resource_key(doc.metadata)}|{doc.metadata.get('resource_name', '')}"
+
+    @staticmethod
+    def _catalog_file_stat() -> Tuple[int, int]:
+        stat = os.stat(RESOURCES_FILE)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh_catalog(self) -> bool:
+        """Rebuild the BM25 index and resource lookup when the catalog file has changed; True if it had."""
+        self._catalog_stat = self._catalog_file_stat()
+        with open(RESOURCES_FILE, 'rb') as f:
+            raw_catalog = f.read()
+        catalog_hash = hashlib.sha256(raw_catalog).hexdigest()
+        if catalog_hash == self._catalog_hash:
+            return False
+        self.lexical = LexicalIndex(json.loads(raw_catalog))
+        self._resources_by_key = {self._fusion_key(doc): doc.metadata for doc in self.lexical.documents}
+        self.reranker.index_catalog(list(self._resources_by_key.values()), list(self._resources_by_key))
+        self._catalog_hash = catalog_hash
+        self.recommendation_cache.clear()
+        logging.info(f"Lexical index built over {len(self.lexical.documents)} resources")
+        return True
+
+    def _check_catalog_file(self) -> None:
+        """
+        Pick up rewrites of structured_resources.json that bypass the resource API.
+        At most once per CATALOG_CHECK_SECONDS the file is stat'ed on the request path;
+        a new mtime or size re-reads it on a background thread, and a changed hash moves
+        the catalog version and re-syncs the index. Requests use the current catalog
+        until the refresh is done.
+        """
+        now = time.monotonic()
+        if now - self._catalog_checked < CATALOG_CHECK_SECONDS or not self._catalog_check_lock.acquire(blocking=False):
+            return
+        try:
+            self._catalog_checked = now
+            changed = self._catalog_file_stat() != self._catalog_stat
+        except Exception as e:
+            logging.error(f"Failed to check resource catalog for changes: {e}", exc_info=True)
+            changed = False
+        if not changed:
+            self._catalog_check_lock.release()
+            return
+        # The check lock stays held until the refresh finishes, so only one runs at a time
+        threading.Thread(target=self._refresh_changed_catalog, name='catalog-refresh', daemon=True).start()
+
+    def _refresh_changed_catalog(self) -> None:
+        try:
+            if self._refresh_catalog():
+                logging.info("structured_resources.json changed on disk, scheduling vector index sync")
+                self._schedule_resync()
+        except Exception as e:
+            logging.error(f"Failed to refresh resource catalog: {e}", exc_info=True)
+        finally:
+            self._catalog_check_lock.release()
+
+    @property
+    def catalog_version(self) -> str:
+        """Changes whenever structured_resources.json or the vector index changes."""
+        return f"{self._catalog_hash}:{self._index_generation}"
+
+    def _cache_key(self, match: Dict[str, Any]) -> Tuple[str, ...]:
+        return (normalize_question(match['question']), match['resource_type'],
+                constraints_key(match['constraints']), json.dumps(match['profile'], sort_keys=True),
+                self.catalog_version)
+
+    def _start_match(self, client_data: Dict[str, Any], resource_type: str) -> Dict[str, Any]:
+        """
+        The question, category and eligibility constraints for one request. When the
+        recommendation cache has an answer for the current catalog, the match also
+        carries its documents, retrieval mode and reason.
+
+        The cache key, catalog version included, is fixed here: a reason produced after
+        the catalog moved on is stored under the version its documents came from.
+        """
+        self._check_catalog_file()
+        constraints = client_constraints(client_data)
+        match = {
+            'question': self._build_client_question(client_data, resource_type),
+            'resource_type': resource_type,
+            # Known categories are filtered inside the index, so exactly k relevant hits come back
+            'category': resource_type if resource_type in self.category_needs else None,
+            'constraints': constraints,
+            # Client attributes the re-ranker scores candidates against
+            'profile': client_profile(client_data, constraints.get('age')),
+        }
+        match['cache_key'] = self._cache_key(match)
+        cached = self.recommendation_cache.get(match['cache_key'])
+        if cached is not None:
+            keys, reason, retrieval = cached
+            if all(key in self._resources_by_key for key in keys):
+                match['documents'] = [Document(page_content='', metadata=self._resources_by_key[key]) for key in keys]
+                match['retrieval'] = retrieval
+                match['reason'] = reason
+        return match
+
+    def _retrieve_match(self, match: Dict[str, Any]) -> Dict[str, Any]:
+        match['documents'], match['retrieval'] = self._retrieve(match['question'], match['category'],
+                                                                match['constraints'], match['profile'])
+        return match
+
+    def _remember(self, match: Dict[str, Any], reason: str) -> None:
+        keys = [self._fusion_key(doc) for doc in match['documents']]
+        self.recommendation_cache.put(match['cache_key'], (keys, reason, match['retrieval']))
+
+    def _load_resources_and_build_vector_store(self):
+        """
+        Open the persistent vector index and bring it in line with the resource catalog.
+
+        The manifest next to the index records the embedding model, a hash of
+        structured_resources.json and a content hash per chunk id. When the model
+        matches, the index starts serving right away and only chunks whose text or
+        metadata changed are re-embedded; chunks of removed resources are deleted.
+        A different embedding model (or no index yet) builds a fresh index beside
+        the live one, see _rebuild_index.
+        """
+        index = create_vector_index(self.embeddings)
+        manifest_path = index.directory / 'manifest.json'
+        manifest = self._read_manifest(manifest_path)
+
+        if manifest.get('model') != EMBEDDING_SIGNATURE or len(index.ids()) != len(manifest.get('chunks', {})):
+            if manifest.get('model') not in (None, EMBEDDING_SIGNATURE):
+                logging.info(f"Embedding model changed ({manifest.get('model')} -> {EMBEDDING_SIGNATURE}), rebuilding vector index")
+            elif manifest:
+                logging.info("Vector index does not match its manifest, rebuilding it")
+            self._rebuild_index(replaces=index)
+            return
+
+        if manifest.get('eligibility_metadata') != ELIGIBILITY_VERSION:
+            # Stored eligibility fields are (re)derived from the chunk metadata without re-embedding
+            index.backfill_eligibility()
+            manifest['eligibility_metadata'] = ELIGIBILITY_VERSION
+            self._write_manifest(manifest_path, manifest)
+        with self._sync_lock:
+            self.index, self._manifest_path, self._manifest = index, manifest_path, manifest
+        self._sync_index()
+
+    def _rebuild_index(self, replaces: Optional[VectorIndex] = None) -> None:
+        """
+        Embed the whole catalog into a new index directory and swap it in once complete.
+
+        Requests keep using the previous index (or BM25) until the swap, and a failed
+        run only discards the half-built directory. The replaced index (the live one,
+        or `replaces` when nothing is live yet) is deleted INDEX_DISCARD_GRACE_SECONDS
+        after the swap, since searches started before it may still be reading it.
+        """
+        engine = vector_engine()
+        staging = VECTOR_INDEX_DIR / f"{engine}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        index = create_vector_index(self.embeddings, staging)
+        try:
+            with open(RESOURCES_FILE, 'rb') as f:
+                raw_catalog = f.read()
+            manifest, _, _ = self._apply_catalog(index, {}, raw_catalog)
+            self._write_manifest(staging / 'manifest.json', manifest)
+        except Exception:
+            self._discard_index(index)
+            raise
+
+        with self._sync_lock:
+            previous = self.index or replaces
+            pointer = _active_pointer(engine)
+            tmp_pointer = pointer.with_name(pointer.name + '.tmp')
+            tmp_pointer.write_text(staging.name)
+            os.replace(tmp_pointer, pointer)
+            self.index, self._manifest_path, self._manifest = index, staging / 'manifest.json', manifest
+            self._index_generation += 1
+            self.recommendation_cache.clear()
+        logging.info(f"Swapped in rebuilt {index.name} vector index at {staging}")
+
+        if previous is not None and previous.directory != index.directory:
+            self._discard_index_later(previous)
+        # The catalog may have changed while the rebuild was embedding
+        self._sync_index()
+
+    def _discard_index_later(self, index: VectorIndex) -> None:
+        if INDEX_DISCARD_GRACE_SECONDS <= 0:
+            self._discard_index(index)
+            return
+        timer = threading.Timer(INDEX_DISCARD_GRACE_SECONDS, self._discard_index, args=(index,))
+        timer.name = 'vector-index-discard'
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _discard_index(index: VectorIndex) -> None:
+        try:
+            index.reset()
+            (index.directory / 'manifest.json').unlink(missing_ok=True)
+            if index.directory.parent == VECTOR_INDEX_DIR and index.directory.name.startswith(f"{index.name}-"):
+                shutil.rmtree(index.directory, ignore_errors=True)
+        except Exception as e:
+            logging.warning(f"Failed to remove old vector index {index.directory}: {e}")
+
+    def _apply_catalog(self, index: VectorIndex, indexed: Dict[str, str],
+                       raw_catalog: bytes) -> Tuple[Dict[str, Any], int, int]:
+        """
+        Bring an index from the chunk hashes in `indexed` to the catalog's chunks.
+
+        Embeds in batches of EMBED_BATCH_SIZE, updating self.progress. Returns the new
+        manifest and the number of chunks embedded and removed.
+        """
+        resources = json.loads(raw_catalog)
+        chunks = self._build_chunks(resources)
+        wanted = {chunk_id: self._chunk_hash(doc) for chunk_id, doc in chunks}
+
+        stale = [chunk_id for chunk_id in indexed if chunk_id not in wanted]
+        changed = [(chunk_id, doc) for chunk_id, doc in chunks if indexed.get(chunk_id) != wanted[chunk_id]]
+
+        index.delete(stale)
+        self.progress = {'embedded': 0, 'to_embed': len(changed), 'chunks': len(chunks)}
+        if changed:
+            logging.info(f"Embedding {len(changed)} new or changed chunks of {len(chunks)}...")
+        for start in range(0, len(changed), EMBED_BATCH_SIZE):
+            batch = changed[start:start + EMBED_BATCH_SIZE]
+            index.upsert([chunk_id for chunk_id, _ in batch], [doc for _, doc in batch])
+            self.progress['embedded'] += len(batch)
+
+        manifest = {
+            'model': EMBEDDING_SIGNATURE,
+            'catalog_hash': hashlib.sha256(raw_catalog).hexdigest(),
+            'eligibility_metadata': ELIGIBILITY_VERSION,
+            'chunks': wanted
+        }
+        return manifest, len(changed), len(stale)
+
+    def _sync_index(self) -> None:
+        """Diff the catalog file against the manifest and apply only the differences to the index."""
+        with self._sync_lock:
+            with open(RESOURCES_FILE, 'rb') as f:
+                raw_catalog = f.read()
+            catalog_hash = hashlib.sha256(raw_catalog).hexdigest()
+
+            indexed = self._manifest.get('chunks', {})
+            stored_ids = self.index.ids()
+            if self._manifest.get('catalog_hash') == catalog_hash and len(stored_ids) == len(indexed):
+                logging.info(f"{self.index.name} vector index is current ({len(stored_ids)} chunks in {self.index.directory})")
+                return
+
+            if len(stored_ids) != len(indexed):
+                # The index and manifest disagree (e.g. an interrupted sync): trust neither
+                self._rebuild_index()
+                return
+
+            self._manifest, changed, stale = self._apply_catalog(self.index, indexed, raw_catalog)
+            self._write_manifest(self._manifest_path, self._manifest)
+            if changed or stale:
+                self._index_generation += 1
+                self.recommendation_cache.clear()
+            logging.info(f"Vector index synced: {changed} embedded, {stale} removed, "
+                         f"{len(self._manifest['chunks']) - changed} reused")
+
+    def on_resource_change(self, event: Dict[str, Any]) -> None:
+        """
+        Resource catalog change listener.
+
+        Re-syncs the index on a background thread so the API request is not held up by
+        embedding calls; edits arriving while a sync runs are folded into one more pass.
+        """
+        try:
+            self._refresh_catalog()
+        except Exception as e:
+            logging.error(f"Failed to rebuild lexical index after resource change: {e}", exc_info=True)
+        logging.info(f"Resource {event.get('type')}: {event.get('resource_id')}, scheduling vector index sync")
+        self._schedule_resync()
+
+    def _schedule_resync(self) -> None:
+        with self._resync_lock:
+            self._resync_requested = True
+            # Before warm-up finishes the request is picked up by warm_up() itself
+            if not self.index or self._resync_thread is not None:
+                return
+            self._resync_thread = threading.Thread(target=self._run_resync, name='vector-index-sync', daemon=True)
+            self._resync_thread.start()
+
+    def _run_resync(self) -> None:
+        while True:
+            with self._resync_lock:
+                if not self._resync_requested:
+                    self._resync_thread = None
+                    return
+                self._resync_requested = False
+            try:
+                self._sync_index()
+            except Exception as e:
+                logging.error(f"Failed to sync vector index after resource change: {e}", exc_info=True)
 
     def get_recommendations(self, client_data: Dict[str, Any], resource_type: str) -> Dict[str, Any]:
         """
-        Enhanced RAG workflow with category filtering for housing, food, and transportation:
+        RAG workflow with category-filtered retrieval:
         1. Build a query from client data.
-        2. Retrieve relevant documents using vector similarity search.
-        3. Filter results by resource category (housing/food/transportation).
-        4. Use the LLM to generate a summary of the filtered documents.
+        2. Retrieve the top documents (see _retrieve), with the category predicate and the
+           client's hard eligibility constraints evaluated inside the index.
+        3. Use the LLM to generate a summary of the retrieved documents.
         """
-        if not self.vector_store:
+        if not self.index and not self.lexical:
             logging.error("RAG Resource Matcher not initialized. Cannot get recommendations.")
             return {
                 "llm_summary": "Error: The resource matching system is not available.",
@@ -106,57 +1366,320 @@ class RAGResourceMatcher:
                 "client_question": ""
             }
             
-        question = self._build_client_question(client_data, resource_type)
-
-        # Retrieve more documents initially to allow for filtering
-        retrieved_docs = self.vector_store.similarity_search(question, k=25)
-        
-        # Filter documents by category
-        filtered_docs = self._filter_by_category(retrieved_docs, resource_type)
-        
-        # Take top 5 after filtering
-        final_docs = filtered_docs[:5]
-        
-        # Prepare recommendations for the final output
-        final_recommendations = [doc.metadata for doc in final_docs]
+        match = self._start_match(client_data, resource_type)
+        if 'documents' not in match:
+            self._retrieve_match(match)
 
         # Generate the final summary using the LLM
-        recommendation_reason = self._generate_llm_summary(question, final_docs, resource_type)
-        
+        return self.summarize_match(match)
+
+    def _vector_depth(self) -> int:
+        """
+        Chunk hits per query. Several chunks can belong to one resource, and fusion and
+        diversification need spare candidates, so this is well beyond the count shown.
+        """
+        return RECOMMENDATION_COUNT * 8
+
+    def _retrieve(self, question: str, category: Optional[str], constraints: Optional[Dict[str, Any]] = None,
+                  profile: Optional[Dict[str, Any]] = None) -> Tuple[List[Document], str]:
+        """
+        Top resources for a question according to RAG_RETRIEVAL_MODE, and the mode actually used.
+
+        Only resources in the category that the client is eligible for (see client_constraints)
+        are ranked. Vector chunk hits are aggregated per resource; hybrid mode fuses those with
+        BM25 results by reciprocal rank. When vector search is unavailable or fails, BM25
+        results are used alone. With a client profile (see client_profile) the candidates are
+        re-ranked on structured features before the final diversified pick.
+        """
+        vector_hits = None
+        if self.index and RETRIEVAL_MODE != 'lexical':
+            try:
+                query_vector = self.embeddings.embed_query(question)
+                vector_hits = self.index.search_hits([query_vector], self._vector_depth(), category, constraints)[0]
+            except Exception as e:
+                logging.warning(f"Vector search failed, falling back to lexical retrieval: {e}")
+        return self._combine(question, category, constraints, vector_hits, profile)
+
+    def _combine(self, question: str, category: Optional[str], constraints: Optional[Dict[str, Any]],
+                 vector_hits: Optional[List[VectorHit]],
+                 profile: Optional[Dict[str, Any]] = None) -> Tuple[List[Document], str]:
+        """Final result list from vector chunk hits (None when unavailable) and the BM25 index."""
+        if vector_hits is None:
+            if not self.lexical:
+                return [], 'none'
+            lexical_docs = self.lexical.search(question, RECOMMENDATION_COUNT * 4, category, constraints)
+            candidates = [ResourceCandidate(doc, score, None)
+                          for doc, score in reciprocal_rank_scores([lexical_docs], self._fusion_key)]
+            return self._select(candidates, profile), 'lexical'
+        candidates = aggregate_hits(vector_hits, self._fusion_key, CHUNK_AGGREGATION)
+        if RETRIEVAL_MODE != 'hybrid' or self.lexical is None:
+            return self._select(candidates, profile), 'vector'
+        lexical_docs = self.lexical.search(question, RECOMMENDATION_COUNT * 4, category, constraints)
+        vectors = {self._fusion_key(candidate.document): candidate.vector for candidate in candidates}
+        fused = reciprocal_rank_scores([[candidate.document for candidate in candidates], lexical_docs],
+                                       self._fusion_key)
+        candidates = [ResourceCandidate(doc, score, vectors.get(self._fusion_key(doc))) for doc, score in fused]
+        return self._select(candidates, profile), 'hybrid'
+
+    def _select(self, candidates: List[ResourceCandidate], profile: Optional[Dict[str, Any]]) -> List[Document]:
+        """
+        The RECOMMENDATION_COUNT candidates to show: scores are re-ranked for the client's
+        profile, then picked by MMR over the resource vectors.
+        """
+        if not candidates:
+            return []
+        scores = np.array([c.score for c in candidates], dtype=np.float32)
+        if profile is not None:
+            scores = self.reranker.score(scores, [c.document.metadata for c in candidates],
+                                         [self._fusion_key(c.document) for c in candidates], profile)
+        dimensions = next((len(c.vector) for c in candidates if c.vector is not None), 0)
+        vectors = np.array([c.vector if c.vector is not None else np.zeros(dimensions, dtype=np.float32)
+                            for c in candidates], dtype=np.float32).reshape(len(candidates), dimensions)
+        picked = mmr_select(scores, vectors, RECOMMENDATION_COUNT, MMR_LAMBDA)
+        return [candidates[i].document for i in picked]
+
+    def retrieve_batch(self, requests: List[Tuple[Dict[str, Any], str]]) -> List[Dict[str, Any]]:
+        """
+        Retrieval for many (client_data, resource_type) pairs at once.
+
+        All uncached questions are embedded in a single request, and each group of
+        questions sharing a category and eligibility constraints is searched with one
+        index call (one matrix product on the NumPy engine). Each result holds the
+        question, documents and retrieval mode, ready for summarize_match / asummarize_match.
+        """
+        matches = [self._start_match(client_data, resource_type) for client_data, resource_type in requests]
+        pending = [match for match in matches if 'documents' not in match]
+        vector_hits: Dict[int, List[VectorHit]] = {}
+
+        if self.index and RETRIEVAL_MODE != 'lexical' and pending:
+            try:
+                questions = [match['question'] for match in pending]
+                if hasattr(self.embeddings, 'embed_queries'):
+                    vectors = self.embeddings.embed_queries(questions)
+                else:
+                    vectors = self.embeddings.embed_documents(questions)
+                groups: Dict[Tuple[Optional[str], str], List[int]] = {}
+                for position, match in enumerate(pending):
+                    groups.setdefault((match['category'], constraints_key(match['constraints'])), []).append(position)
+                for (category, _), positions in groups.items():
+                    found = self.index.search_hits([vectors[p] for p in positions], self._vector_depth(),
+                                                   category, pending[positions[0]]['constraints'])
+                    for position, hits in zip(positions, found):
+                        vector_hits[position] = hits
+            except Exception as e:
+                logging.warning(f"Batched vector search failed, falling back to lexical retrieval: {e}")
+                vector_hits = {}
+
+        for position, match in enumerate(pending):
+            match['documents'], match['retrieval'] = self._combine(
+                match['question'], match['category'], match['constraints'], vector_hits.get(position), match['profile']
+            )
+        return matches
+
+    @staticmethod
+    def _recommendation(match: Dict[str, Any], reason: Optional[str]) -> Dict[str, Any]:
         return {
-            "recommendation_reason": recommendation_reason,
-            "retrieved_recommendations": final_recommendations,
-            "client_question": question
+            "recommendation_reason": reason,
+            "retrieved_recommendations": [doc.metadata for doc in match['documents']],
+            "client_question": match['question'],
+            "retrieval": match['retrieval']
         }
 
-    def _filter_by_category(self, documents: List[Document], resource_type: str) -> List[Document]:
-        """Filter documents by resource category with enhanced keyword matching."""
-        if resource_type not in ['food', 'housing', 'transportation']:
-            return documents
-            
-        filtered = []
-        for doc in documents:
-            # Primary filter: check if the document has category metadata
-            if 'category' in doc.metadata:
-                if doc.metadata['category'] == resource_type:
-                    filtered.append(doc)
+    def _template_reason(self, match: Dict[str, Any]) -> str:
+        """Deterministic reason built from the matched fields: category, eligibility fit and location."""
+        documents, resource_type = match['documents'], match['resource_type']
+        if not documents:
+            return f"No matching {resource_type} resources were found for this client."
+        resources = [doc.metadata for doc in documents]
+        fit = self.reranker.fit_counts(resources, [self._fusion_key(doc) for doc in documents], match['profile'])
+
+        def counted(count: int, one: str, many: str) -> str:
+            return f"{count} {one if count == 1 else many}"
+
+        clauses = [counted(count, f"serves {label}", f"serve {label}") for label, count in fit['population'].items()]
+        if match['constraints'].get('has_id') is False:
+            clauses.append("all accept clients without ID")
+        if fit['near']:
+            clauses.append(counted(fit['near'], "is near the client's ZIP code", "are near the client's ZIP code"))
+        if fit['ada']:
+            clauses.append(counted(fit['ada'], "is wheelchair accessible", "are wheelchair accessible"))
+        if fit['language']:
+            clauses.append(counted(fit['language'], "offers", "offer") + f" services in {fit['language_name']}")
+
+        need = self._need_description(resource_type)
+        reason = f"These {len(documents)} {resource_type} resources match the client's need for {need}"
+        if clauses:
+            reason += f" ({'; '.join(clauses)})"
+        top = resources[0]
+        location = str(top.get('location') or '')
+        where = f" in {location}" if re.search(r'\d', location) or location.lower().startswith('houston') else ''
+        return f"{reason}. Start with {top.get('resource_name', 'the first resource')}{where}."
+
+    @staticmethod
+    def _fallback_reason(match: Dict[str, Any]) -> str:
+        return (f"These {len(match['documents'])} {match['resource_type']} resources best match the "
+                f"client's described needs and eligibility.")
+
+    def summarize_match(self, match: Dict[str, Any]) -> Dict[str, Any]:
+        """Recommendation response for one retrieved match, with the LLM-written (or cached) reason."""
+        if match.get('reason') is not None:
+            return self._recommendation(match, match['reason'])
+        try:
+            reason = self._generate_llm_summary(match['question'], match['documents'], match['resource_type'])
+            self._remember(match, reason)
+        except Exception as e:
+            logging.warning(f"LLM summary unavailable, using a plain recommendation reason: {e}")
+            reason = self._fallback_reason(match)
+        return self._recommendation(match, reason)
+
+    async def asummarize_match(self, match: Dict[str, Any]) -> Dict[str, Any]:
+        """Async summarize_match; the LLM call does not block the event loop."""
+        if match.get('reason') is not None:
+            return self._recommendation(match, match['reason'])
+        try:
+            reason = await self._agenerate_llm_summary(match['question'], match['documents'], match['resource_type'])
+            self._remember(match, reason)
+        except Exception as e:
+            logging.warning(f"LLM summary unavailable, using a plain recommendation reason: {e}")
+            reason = self._fallback_reason(match)
+        return self._recommendation(match, reason)
+
+    async def aget_recommendations(self, client_data: Dict[str, Any], resource_type: str) -> Dict[str, Any]:
+        """
+        Async get_recommendations for the API handlers. Retrieval runs on the bounded
+        retrieval executor, so the event loop is never blocked.
+
+        In the default 'template' RAG_REASON_MODE the result carries a templated reason
+        (reason_source 'template') and an enrichment_id; the LLM reason is generated in
+        the background, cached, and collected with await_enrichment. A reason already
+        in the recommendation cache is returned directly. Without an LLM the templated
+        reason is final and no enrichment_id is given.
+        """
+        if not self.index and not self.lexical:
+            return self.get_recommendations(client_data, resource_type)
+        match = self._start_match(client_data, resource_type)
+        if 'documents' not in match:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._retrieve_match, match)
+        if match.get('reason') is not None or (REASON_MODE == 'llm' and self.llm is not None) or not match['documents']:
+            return await self.asummarize_match(match)
+        result = self._recommendation(match, self._template_reason(match))
+        result['reason_source'] = 'template'
+        if self.llm is not None:
+            result['enrichment_id'] = self._start_enrichment(match)
+        return result
+
+    def _start_enrichment(self, match: Dict[str, Any]) -> str:
+        """
+        Queue the LLM reason for a match; identical matches share one job. Returns its id.
+        The job carries the match's cache key, so a reason finishing after a catalog
+        change is cached under the version it was retrieved from.
+        """
+        enrichment_id = hashlib.sha256(json.dumps(match['cache_key']).encode('utf-8')).hexdigest()[:16]
+        loop = asyncio.get_running_loop()
+        self._expire_orphaned_enrichments()
+        with self._enrichment_lock:
+            if enrichment_id in self._enrichment_tasks or self._enrichments.get(enrichment_id, {}).get('status') == 'done':
+                return enrichment_id
+            self._store_enrichment(enrichment_id, {'status': 'pending', 'reason': None})
+            self._enrichment_tasks[enrichment_id] = (loop, loop.create_task(self._enrich(enrichment_id, match)))
+        return enrichment_id
+
+    def _expire_orphaned_enrichments(self) -> None:
+        """
+        Fail pending enrichments that can no longer finish: their loop was closed, or the
+        task ended without recording a result (cancelled at loop shutdown). Clients polling
+        them get 'failed' and keep the templated reason.
+        """
+        with self._enrichment_lock:
+            for enrichment_id, (loop, task) in list(self._enrichment_tasks.items()):
+                if not (loop.is_closed() or task.done()):
+                    continue
+                del self._enrichment_tasks[enrichment_id]
+                if self._enrichments.get(enrichment_id, {}).get('status') == 'pending':
+                    self._store_enrichment(enrichment_id, {'status': 'failed', 'reason': None})
+
+    async def _enrich(self, enrichment_id: str, match: Dict[str, Any]) -> None:
+        loop = asyncio.get_running_loop()
+        with self._enrichment_lock:
+            semaphore = self._enrichment_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._enrichment_semaphores[loop] = asyncio.Semaphore(ENRICHMENT_CONCURRENCY)
+        try:
+            async with semaphore:
+                reason = await self._agenerate_llm_summary(match['question'], match['documents'], match['resource_type'])
+            self._remember(match, reason)
+            result = {'status': 'done', 'reason': reason}
+        except Exception as e:
+            logging.warning(f"LLM enrichment failed, keeping the templated reason: {e}")
+            result = {'status': 'failed', 'reason': None}
+        with self._enrichment_lock:
+            self._enrichment_tasks.pop(enrichment_id, None)
+            self._store_enrichment(enrichment_id, result)
+
+    def _store_enrichment(self, enrichment_id: str, result: Dict[str, Any]) -> None:
+        """Record an enrichment state; the caller holds _enrichment_lock."""
+        self._enrichments[enrichment_id] = result
+        self._enrichments.move_to_end(enrichment_id)
+        while len(self._enrichments) > ENRICHMENT_RESULTS:
+            self._enrichments.popitem(last=False)
+
+    async def await_enrichment(self, enrichment_id: str, timeout: float = 0) -> Optional[Dict[str, Any]]:
+        """
+        State of a background LLM reason: {'id', 'status': pending|done|failed, 'reason'},
+        or None for an unknown (or expired) id. Waits up to timeout seconds while pending.
+        """
+        entry = self._enrichment_tasks.get(enrichment_id)
+        if entry is not None and timeout > 0:
+            loop, task = entry
+            if loop is asyncio.get_running_loop():
+                try:
+                    await asyncio.wait_for(asyncio.shield(task), timeout)
+                except asyncio.TimeoutError:
+                    pass
             else:
-                # Fallback: check content for category indicators
-                content = doc.page_content.lower()
-                if resource_type == 'food':
-                    food_keywords = ['food', 'meal', 'pantry', 'nutrition', 'grocery', 'hunger', 'feeding', 'csfp', 'snap', 'tefap']
-                    if any(keyword in content for keyword in food_keywords):
-                        filtered.append(doc)
-                elif resource_type == 'housing':
-                    housing_keywords = ['housing', 'shelter', 'bed', 'room', 'apartment', 'home', 'residence', 'accommodation', 'lodging']
-                    if any(keyword in content for keyword in housing_keywords):
-                        filtered.append(doc)
-                elif resource_type == 'transportation':
-                    transport_keywords = ['transportation', 'transport', 'ride', 'bus', 'taxi', 'medical transport', 'mobility', 'travel', 'transit']
-                    if any(keyword in content for keyword in transport_keywords):
-                        filtered.append(doc)
-        
-        return filtered
+                # A task of another loop cannot be awaited here; poll until it settles
+                deadline = time.monotonic() + timeout
+                while not (task.done() or loop.is_closed()) and time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+        self._expire_orphaned_enrichments()
+        result = self._enrichments.get(enrichment_id)
+        return dict(result, id=enrichment_id) if result is not None else None
+
+    async def astream_recommendations(self, client_data: Dict[str, Any], resource_type: str):
+        """
+        Async generator of (event, data) pairs: 'recommendations' once retrieval is done,
+        'token' for each piece of the streamed LLM reason, and 'done' with the full result.
+        """
+        if not self.index and not self.lexical:
+            yield 'done', self.get_recommendations(client_data, resource_type)
+            return
+        match = self._start_match(client_data, resource_type)
+        if 'reason' in match:
+            yield 'recommendations', self._recommendation(match, None)
+            yield 'token', {"text": match['reason']}
+            yield 'done', self._recommendation(match, match['reason'])
+            return
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._retrieve_match, match)
+        question, final_docs = match['question'], match['documents']
+        yield 'recommendations', self._recommendation(match, None)
+
+        parts = []
+        try:
+            async for text in self._astream_llm_summary(question, final_docs, resource_type):
+                parts.append(text)
+                yield 'token', {"text": text}
+            reason = "".join(parts)
+            self._remember(match, reason)
+        except Exception as e:
+            logging.warning(f"LLM summary unavailable, using a plain recommendation reason: {e}")
+            reason = self._fallback_reason(match)
+            if not parts:
+                yield 'token', {"text": reason}
+        yield 'done', self._recommendation(match, reason)
+
+    async def aretrieve_batch(self, requests: List[Tuple[Dict[str, Any], str]]) -> List[Dict[str, Any]]:
+        """retrieve_batch on the retrieval executor."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.retrieve_batch, requests)
 
     def _build_client_question(self, client_data: Dict[str, Any], resource_type: str) -> str:
         """Builds a detailed question string from client data for vector search."""
@@ -188,12 +1711,8 @@ class RAGResourceMatcher:
             parts.append(f"Has disability: {'Yes' if client_data['has_disability'] else 'No'}.")
         
         # Add specific needs based on resource type
-        if resource_type == 'food':
-            parts.append("Looking for food assistance, meals, pantries, or nutrition programs.")
-        elif resource_type == 'housing':
-            parts.append("Looking for housing assistance, shelter, or accommodation.")
-        elif resource_type == 'transportation':
-            parts.append("Looking for transportation assistance, rides, or mobility services.")
+        if resource_type in self.category_needs:
+            parts.append(f"Looking for {self.category_needs[resource_type]}.")
         
         # Use the detailed notes for context
         if client_data.get('notes'):
@@ -205,11 +1724,14 @@ class RAGResourceMatcher:
             
         return " ".join(parts)
 
-    def _generate_llm_summary(self, question: str, documents: List[Document], resource_type: str) -> str:
-        """Uses the LLM to generate a helpful summary of the top recommended resources."""
-        if not documents:
-            return f"No matching {resource_type} resources were found for this client."
+    def _need_description(self, resource_type: str) -> str:
+        """How the prompt and templated reasons describe the client's need for a resource type."""
+        return PROMPT_NEEDS.get(resource_type) or self.category_needs.get(resource_type, f"{resource_type} services")
 
+    def _summary_chain(self, question: str, documents: List[Document], resource_type: str):
+        """The summary prompt chain and its inputs."""
+        if self.llm is None:
+            raise RuntimeError(f"No LLM available: {self.error}")
         # Extract metadata and page content for the prompt
         context = "\n\n---\n\n".join([
             f"Resource: {doc.metadata.get('resource_name', 'N/A')}\n"
@@ -220,12 +1742,6 @@ class RAGResourceMatcher:
             for doc in documents
         ])
 
-        resource_type_context = {
-            'food': "food assistance, meals, pantries, or nutrition programs",
-            'housing': "housing assistance, shelter, or accommodation services",
-            'transportation': "transportation assistance, rides, or mobility services"
-        }
-
         prompt = PromptTemplate.from_template(
             "You are a helpful case manager assistant. Based on the client's need for {resource_type_desc} "
             "and the provided resources, write a single, personalized sentence explaining why these resources "
@@ -237,14 +1753,40 @@ class RAGResourceMatcher:
         )
         
         chain = prompt | self.llm
-        response = chain.invoke({
+        return chain, {
             "question": question, 
             "context": context,
             "resource_type": resource_type,
-            "resource_type_desc": resource_type_context.get(resource_type, f"{resource_type} services")
-        })
+            "resource_type_desc": self._need_description(resource_type)
+        }
+
+    def _generate_llm_summary(self, question: str, documents: List[Document], resource_type: str) -> str:
+        """Uses the LLM to generate a helpful summary of the top recommended resources."""
+        if not documents:
+            return f"No matching {resource_type} resources were found for this client."
+        chain, inputs = self._summary_chain(question, documents, resource_type)
+        response = chain.invoke(inputs)
         return response.content if hasattr(response, 'content') else str(response)
 
+    async def _agenerate_llm_summary(self, question: str, documents: List[Document], resource_type: str) -> str:
+        """Async _generate_llm_summary."""
+        if not documents:
+            return f"No matching {resource_type} resources were found for this client."
+        chain, inputs = self._summary_chain(question, documents, resource_type)
+        response = await chain.ainvoke(inputs)
+        return response.content if hasattr(response, 'content') else str(response)
+
+    async def _astream_llm_summary(self, question: str, documents: List[Document], resource_type: str):
+        """_generate_llm_summary streamed as text pieces while the LLM produces them."""
+        if not documents:
+            yield f"No matching {resource_type} resources were found for this client."
+            return
+        chain, inputs = self._summary_chain(question, documents, resource_type)
+        async for chunk in chain.astream(inputs):
+            text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if text:
+                yield text
+
 # Helper to calculate age, in case it's needed elsewhere
 from datetime import datetime
 
@@ -256,4 +1798,21 @@ def _calculate_age(birth_date_str: str) -> int:
         birth_date = datetime.strptime(birth_date_str, '%Y-%m-%d')
         return (datetime.now() - birth_date).days // 365
     except (ValueError, TypeError):
-        return 0 
\ No newline at end of file
+        return 0 
+
+if __name__ == "__main__":
+    # Recall vs. memory for truncated / quantized variants of the persisted NumPy index
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recall@k vs. memory for compact embedding storage")
+    parser.add_argument('--index', type=Path, default=active_index_directory('numpy') / 'embeddings.npy')
+    parser.add_argument('--k', type=int, default=RECOMMENDATION_COUNT)
+    parser.add_argument('--sample', type=int, default=200)
+    parser.add_argument('--rescore-factor', type=int, default=RESCORE_FACTOR)
+    args = parser.parse_args()
+
+    vectors = np.load(args.index, mmap_mode='r')
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims from {args.index}")
+    print(f"{'dims':>6} {'dtype':>8} {'recall@' + str(args.k):>10} {'scan MB':>9}")
+    for row in recall_memory_report(vectors, k=args.k, sample=args.sample, rescore_factor=args.rescore_factor):
+        print(f"{row['dimensions']:>6} {row['dtype']:>8} {row['recall_at_k']:>10.3f} {row['scan_bytes'] / 1e6:>9.2f}")
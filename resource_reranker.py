@@ -0,0 +1,298 @@
+"""
+Feature-based re-ranking of retrieved resources.
+
+Retrieval ranks resources by text similarity alone. ResourceReranker adds structured
+signals about how well each candidate suits the client: targeted population,
+days open, ZIP-code proximity, wheelchair access, language, and how often past
+referrals to the resource were completed. Features are precomputed per catalog
+resource, so scoring a candidate set is a handful of NumPy array operations.
+
+Every feature lies in [0, 1] with 0.5 meaning "unknown" or "not relevant to this
+client", so missing data never moves a candidate.
+"""
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ['eligibility', 'hours', 'distance', 'ada', 'language', 'outcome']
+DEFAULT_WEIGHTS = {'eligibility': 0.3, 'hours': 0.1, 'distance': 0.2, 'ada': 0.3, 'language': 0.3, 'outcome': 0.2}
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    """'ada=0.5,outcome=0' -> DEFAULT_WEIGHTS with those entries replaced."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        if name.strip() not in weights:
+            logger.warning(f"Ignoring unknown re-ranker feature '{name.strip()}'")
+            continue
+        try:
+            weights[name.strip()] = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid re-ranker weight '{item}'")
+    return weights
+
+
+# Set to 'false' to rank by retrieval relevance alone
+RERANK_ENABLED = os.environ.get('RAG_RERANK', 'true').strip().lower() not in ('0', 'false', 'no')
+# Per-feature weights, e.g. "distance=0.5,outcome=0"; unlisted features keep their defaults
+RERANK_WEIGHTS = _parse_weights(os.environ.get('RAG_RERANK_WEIGHTS', ''))
+
+# Population tags, matched in a resource's target population / eligibility / age group text
+TAGS = {
+    'veteran': re.compile(r'\bveteran', re.I),
+    'women': re.compile(r'\b(women|woman|female|mothers?)\b', re.I),
+    'men': re.compile(r'\b(men|man|male|fathers?)\b', re.I),
+    'family': re.compile(r'\b(famil(y|ies)|children|parents?|kids)\b', re.I),
+    'youth': re.compile(r'\b(youth|young adults?|teens?|adolescents?)\b', re.I),
+    'senior': re.compile(r'\b(seniors?|elderly|older adults?|aged? 6\d\+?)\b', re.I),
+    # Not "no disability requirements" / "no proof of disability" / a "Disability Requirements:" label
+    'disability': re.compile(r'(?<!no )(?<!proof of )\b(disabilit(y|ies)|disabled)\b(?! requirement)', re.I),
+}
+TAG_BITS = {tag: 1 << position for position, tag in enumerate(TAGS)}
+TAG_LABELS = {'veteran': 'veterans', 'women': 'women', 'men': 'men', 'family': 'families',
+              'youth': 'young people', 'senior': 'seniors', 'disability': 'people with disabilities'}
+# A resource for only one of these groups does not suit a client in the other
+EXCLUSIVE_TAGS = [(TAG_BITS['women'], TAG_BITS['men']), (TAG_BITS['men'], TAG_BITS['women'])]
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.float32)
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+_DAY = r'(mon|tue|wed|thu|fri|sat|sun)[a-z]*'
+DAY_RANGE = re.compile(_DAY + r'\s*(?:-|–|—|to|through|thru)\s*' + _DAY, re.I)
+DAY_NAME = re.compile(r'\b' + _DAY + r'\b', re.I)
+EVERY_DAY = re.compile(r'\b(every ?day|daily|7 days|24/7|24 hours)\b', re.I)
+
+ZIP_CODE = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+
+# Bit 0 marks "languages known"; aliases map onto the same bit
+LANGUAGES = {
+    'english': 1, 'spanish': 2, 'vietnamese': 3, 'chinese': 4, 'mandarin': 4, 'cantonese': 4,
+    'arabic': 5, 'french': 6, 'urdu': 7, 'hindi': 8, 'korean': 9, 'tagalog': 10,
+    'farsi': 11, 'persian': 11, 'portuguese': 12, 'swahili': 13,
+}
+LANGUAGE_NAMES = re.compile(r'\b(' + '|'.join(LANGUAGES) + r')\b', re.I)
+ADA_NEEDS = re.compile(r'\b(wheelchair|mobility|ada|walker|accessible)\b', re.I)
+
+# Referral statuses that count as a completed or a failed outcome; others are still open
+SUCCESS_STATUSES = {'completed'}
+FAILURE_STATUSES = {'declined', 'not_eligible'}
+# Pseudo-referrals pulling each resource's success rate towards 0.5 until it has real history
+OUTCOME_PRIOR = 2.0
+
+
+def population_tags(text: str) -> int:
+    return sum(bit for tag, bit in TAG_BITS.items() if TAGS[tag].search(text))
+
+
+def open_days(text: str) -> Optional[float]:
+    """Fraction of the week a schedule text mentions, or None when it names no days."""
+    if EVERY_DAY.search(text):
+        return 1.0
+    days = set()
+    for start, end in DAY_RANGE.findall(text):
+        first, last = [next(i for i, day in enumerate(WEEKDAYS) if day.startswith(name.lower()))
+                       for name in (start, end)]
+        days.update(WEEKDAYS[(first + offset) % 7] for offset in range((last - first) % 7 + 1))
+    for name in DAY_NAME.findall(text):
+        days.add(next(day for day in WEEKDAYS if day.startswith(name.lower())))
+    return len(days) / 7 if days else None
+
+
+def language_bits(text: str) -> int:
+    bits = 0
+    for name in LANGUAGE_NAMES.findall(text):
+        bits |= 1 << LANGUAGES[name.lower()]
+    return bits | 1 if bits else 0
+
+
+def _zip_code(text: str) -> int:
+    found = ZIP_CODE.findall(text or '')
+    return int(found[-1]) if found else -1
+
+
+def resource_features(resource: Dict[str, Any]) -> Tuple[int, float, int, float, int]:
+    """(population tags, days open, ZIP code, wheelchair access, languages) for one resource."""
+    population = ' '.join(str(resource.get(field, '')) for field in ('target_population', 'eligibility', 'age_group'))
+    schedule = ' '.join(str(resource.get(field, '')) for field in ('available_days', 'intake_hours', 'hours'))
+    days = open_days(schedule)
+    ada = str(resource.get('ada_accessible', '')).strip().lower()
+    ada_score = 1.0 if ada.startswith('yes') else 0.0 if ada.startswith('no') else 0.5
+    return (population_tags(population), 0.5 if days is None else days,
+            _zip_code(str(resource.get('location', ''))), ada_score,
+            language_bits(str(resource.get('languages') or '')))
+
+
+def client_profile(client_data: Dict[str, Any], age: Optional[int] = None) -> Dict[str, Any]:
+    """
+    The client attributes the re-ranker scores against, as plain JSON values so the
+    profile can be part of a cache key. age overrides client_data['age'] (e.g. when
+    it was derived from a date of birth).
+    """
+    personal = client_data.get('personalCharacteristics') or {}
+    address = client_data.get('address') or (client_data.get('familyAndHousing') or {}).get('address') or {}
+
+    tags = 0
+    if client_data.get('is_veteran') is True or str(client_data.get('is_veteran')).lower() in ('yes', 'true'):
+        tags |= TAG_BITS['veteran']
+    if client_data.get('has_disability') is True or str(client_data.get('has_disability')).lower() in ('yes', 'true'):
+        tags |= TAG_BITS['disability']
+    gender = str(client_data.get('gender', '')).strip().lower()
+    if gender in ('female', 'woman', 'f'):
+        tags |= TAG_BITS['women']
+    elif gender in ('male', 'man', 'm'):
+        tags |= TAG_BITS['men']
+    if re.search(r'child|famil|kids|parent|pregnan', str(client_data.get('family_status', '')), re.I):
+        tags |= TAG_BITS['family']
+    try:
+        age = int(age if age is not None else client_data.get('age'))
+        tags |= TAG_BITS['youth'] if age < 25 else TAG_BITS['senior'] if age >= 60 else 0
+    except (TypeError, ValueError):
+        pass
+
+    language = str(client_data.get('language') or personal.get('language') or '')
+    needs = ' '.join([str(client_data.get('notes', ''))] + [str(need) for need in client_data.get('needs') or []])
+    return {
+        'tags': tags,
+        'zip': _zip_code(str(client_data.get('zipCode') or client_data.get('zip_code') or address.get('zipCode') or '')),
+        'language': language_bits(language) & ~(1 | 1 << LANGUAGES['english']),
+        'ada': bool(tags & TAG_BITS['disability'] or ADA_NEEDS.search(needs)),
+    }
+
+
+class ResourceReranker:
+    """
+    Scores candidate resources as normalized retrieval relevance plus a weighted sum
+    of feature deviations from neutral (feature - 0.5).
+
+    index_catalog() builds the per-resource feature table; outcome counts come from
+    client referral statuses via load_outcomes() and record_status().
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, enabled: bool = RERANK_ENABLED):
+        self.weights = np.array([(weights or RERANK_WEIGHTS)[name] for name in FEATURES], dtype=np.float32)
+        self.enabled = enabled
+        self._rows: Dict[str, int] = {}
+        self._tags = np.zeros(0, dtype=np.uint8)
+        self._hours = np.zeros(0, dtype=np.float32)
+        self._zips = np.zeros(0, dtype=np.int64)
+        self._ada = np.zeros(0, dtype=np.float32)
+        self._languages = np.zeros(0, dtype=np.int64)
+        self._outcomes: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def index_catalog(self, resources: List[Dict[str, Any]], keys: List[str]) -> None:
+        """Precompute the feature table; keys identify the resources the same way score() is given them."""
+        features = [resource_features(resource) for resource in resources]
+        self._rows = {key: row for row, key in enumerate(keys)}
+        columns = list(zip(*features)) or [(), (), (), (), ()]
+        self._tags = np.array(columns[0], dtype=np.uint8)
+        self._hours = np.array(columns[1], dtype=np.float32)
+        self._zips = np.array(columns[2], dtype=np.int64)
+        self._ada = np.array(columns[3], dtype=np.float32)
+        self._languages = np.array(columns[4], dtype=np.int64)
+
+    def load_outcomes(self, clients: Iterable[Dict[str, Any]]) -> None:
+        """Rebuild completed/failed referral counts per resource id from every client's resources."""
+        outcomes: Dict[str, List[int]] = {}
+        for client in clients:
+            for referral in client.get('resources') or []:
+                counts = outcomes.setdefault(str(referral.get('resource_id')), [0, 0])
+                status = referral.get('status')
+                counts[0] += status in SUCCESS_STATUSES
+                counts[1] += status in FAILURE_STATUSES
+        with self._lock:
+            self._outcomes = outcomes
+        logger.info(f"Loaded referral outcomes for {len(outcomes)} resources")
+
+    def record_status(self, resource_id: Any, old_status: Optional[str], new_status: Optional[str]) -> None:
+        """Apply one referral status change to the outcome counts."""
+        with self._lock:
+            counts = self._outcomes.setdefault(str(resource_id), [0, 0])
+            counts[0] += (new_status in SUCCESS_STATUSES) - (old_status in SUCCESS_STATUSES)
+            counts[1] += (new_status in FAILURE_STATUSES) - (old_status in FAILURE_STATUSES)
+
+    def outcome_rates(self, resource_ids: List[str]) -> np.ndarray:
+        with self._lock:
+            counts = np.array([self._outcomes.get(resource_id, (0, 0)) for resource_id in resource_ids],
+                              dtype=np.float32).reshape(-1, 2)
+        return (counts[:, 0] + OUTCOME_PRIOR * 0.5) / (counts.sum(axis=1) + OUTCOME_PRIOR)
+
+    def _columns(self, resources: List[Dict[str, Any]], keys: List[str]) -> Tuple[np.ndarray, ...]:
+        """Raw feature columns (see resource_features) for the given resources."""
+        rows = [self._rows.get(key) for key in keys]
+        if all(row is not None for row in rows):
+            index = np.array(rows, dtype=np.int64)
+            return (self._tags[index], self._hours[index], self._zips[index],
+                    self._ada[index], self._languages[index])
+        # A candidate missing from the table (the catalog changed since): compute the rows directly
+        columns = list(zip(*[resource_features(resource) for resource in resources]))
+        return tuple(np.array(column, dtype=dtype) for column, dtype in
+                     zip(columns, (np.uint8, np.float32, np.int64, np.float32, np.int64)))
+
+    def features(self, resources: List[Dict[str, Any]], keys: List[str], profile: Dict[str, Any]) -> np.ndarray:
+        """(candidates x FEATURES) matrix for a client profile."""
+        tags, hours, zips, ada, languages = self._columns(resources, keys)
+        resource_ids = [str(resource.get('id', '')) for resource in resources]
+
+        # Eligibility: shared population tags raise it, a resource for the other gender lowers it
+        client_tags = profile['tags']
+        shared = _POPCOUNT[tags & client_tags]
+        conflict = np.zeros(len(tags), dtype=bool)
+        for only, other in EXCLUSIVE_TAGS:
+            if client_tags & other:
+                conflict |= ((tags & only) > 0) & ((tags & other) == 0)
+        eligibility = np.clip(0.5 + 0.25 * shared - 0.5 * conflict, 0.0, 1.0)
+
+        client_zip = profile['zip']
+        if client_zip < 0:
+            distance = np.full(len(zips), 0.5, dtype=np.float32)
+        else:
+            distance = np.select(
+                [zips < 0, zips == client_zip, zips // 10 == client_zip // 10, zips // 100 == client_zip // 100],
+                [0.5, 1.0, 0.8, 0.6], default=0.3
+            )
+
+        ada = ada if profile['ada'] else np.full(len(ada), 0.5, dtype=np.float32)
+
+        client_language = profile['language']
+        if client_language:
+            known = (languages & 1) > 0
+            language = np.where(known, np.where(languages & client_language, 1.0, 0.0), 0.5)
+        else:
+            language = np.full(len(languages), 0.5, dtype=np.float32)
+
+        return np.column_stack([eligibility, hours, distance, ada, language,
+                                self.outcome_rates(resource_ids)]).astype(np.float32)
+
+    def fit_counts(self, resources: List[Dict[str, Any]], keys: List[str], profile: Dict[str, Any]) -> Dict[str, Any]:
+        """How many of the resources fit the client on each feature, for plain-language reasons."""
+        if not resources:
+            return {'population': {}, 'near': 0, 'ada': 0, 'language': 0, 'language_name': None}
+        tags = self._columns(resources, keys)[0]
+        features = self.features(resources, keys, profile)
+        population = {TAG_LABELS[tag]: int(((tags & bit) > 0).sum())
+                      for tag, bit in TAG_BITS.items() if profile['tags'] & bit}
+        language_name = next((name for name, bit in LANGUAGES.items() if profile['language'] & (1 << bit)), None)
+        return {
+            'population': {label: count for label, count in population.items() if count},
+            'near': int((features[:, FEATURES.index('distance')] >= 0.8).sum()),
+            'ada': int((features[:, FEATURES.index('ada')] == 1.0).sum()) if profile['ada'] else 0,
+            'language': int((features[:, FEATURES.index('language')] == 1.0).sum()),
+            'language_name': language_name.capitalize() if language_name else None,
+        }
+
+    def score(self, relevance: np.ndarray, resources: List[Dict[str, Any]], keys: List[str],
+              profile: Dict[str, Any]) -> np.ndarray:
+        """Re-ranked scores: relevance rescaled to [0, 1] plus the weighted feature terms."""
+        relevance = np.asarray(relevance, dtype=np.float32)
+        if not self.enabled or not len(relevance):
+            return relevance
+        span = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / span if span > 0 else np.ones_like(relevance)
+        return relevance + (self.features(resources, keys, profile) - 0.5) @ self.weights
@@ -1,10 +1,10 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import logging
 from pathlib import Path
 from datetime import datetime
@@ -12,17 +12,20 @@ from rag_resource_matcher import RAGResourceMatcher
 from google_sheets_integration import GoogleSheetsIntegration
 from email_service import EmailService
 from analytics_engine import AnalyticsEngine
+from client_repository import get_client_repository
 import asyncio
+import base64
 from threading import Thread
 import time
-import openai
 import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Configure OpenAI
-client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+from llm_gateway import get_llm_gateway
+
+# Every OpenAI call goes through the shared gateway (pooled connections, limits, retries, metrics)
+llm_gateway = get_llm_gateway()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -64,15 +67,33 @@ app.add_middleware(
 
 # Get the directory where the script is located
 SCRIPT_DIR = Path(__file__).parent.absolute()
-CLIENTS_FILE = SCRIPT_DIR / 'clients.json'
+# Concurrent LLM summaries per /api/match-resources/batch request
+MATCH_BATCH_CONCURRENCY = int(os.environ.get('MATCH_BATCH_CONCURRENCY', '8'))
+
+# Process-wide client store: clients.json is parsed once and indexed by id and email
+client_repository = get_client_repository()
 
-# Initialize RAG Resource Matcher
+# Initialize RAG Resource Matcher; the vector index warms up in the background after startup
+# and BM25 matching serves requests until it is ready (see /health). A missing OpenAI key
+# leaves it on BM25 with templated reasons rather than stopping the server
 try:
-    rag_matcher = RAGResourceMatcher()
-    logger.info("RAG Resource Matcher initialized successfully")
+    rag_matcher = RAGResourceMatcher(background_warm_up=True)
+    logger.info("RAG Resource Matcher created, vector index will warm up in the background")
 except Exception as e:
-    logger.error(f"FATAL: Failed to initialize RAG Resource Matcher: {e}")
-    raise  # Re-raise the exception to stop the server from starting
+    logger.error(f"Failed to initialize RAG Resource Matcher: {e}")
+    rag_matcher = None
+
+# Called with a change event after structured_resources.json is rewritten by the API
+resource_change_listeners = [rag_matcher.on_resource_change] if rag_matcher else []
+
+def emit_resource_change(change_type: str, resource_id: Any, resource: Optional[Dict[str, Any]] = None):
+    """Notify listeners (e.g. the vector index) that a catalog resource was updated or deleted."""
+    event = {'type': change_type, 'resource_id': resource_id, 'resource': resource}
+    for listener in resource_change_listeners:
+        try:
+            listener(event)
+        except Exception as e:
+            logger.error(f"Resource change listener failed: {e}")
 
 # Initialize Google Sheets Integration and Email Service
 try:
@@ -86,25 +107,41 @@ except Exception as e:
 
 # Initialize Analytics Engine
 try:
-    analytics_engine = AnalyticsEngine()
+    analytics_engine = AnalyticsEngine(client_repository)
     logger.info("Analytics Engine initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize Analytics Engine: {e}")
     analytics_engine = None
 
-# Initialize OpenAI client
-from openai import OpenAI
-try:
-    openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    logger.info("OpenAI client initialized successfully")
-except Exception as e:
-    logger.warning(f"OpenAI client initialization failed: {e}")
-    openai_client = None
-
 # Global variables for background tasks
 background_task_running = False
 polling_interval = 30  # Check every 30 seconds
 
+def record_needs_assessment_response(client_id: int, response: Dict[str, Any]):
+    """Store a needs assessment form response and refresh the client's current needs from it."""
+    assessment = response.get('needs_assessment', {})
+    current_needs = {}
+    
+    for category, details in assessment.items():
+        if isinstance(details, dict) and details.get('needed'):
+            current_needs[category] = {
+                'needed': True,
+                'priority': details.get('priority', 'medium'),
+                'details': details.get('details', ''),
+                'updated': datetime.now().isoformat()
+            }
+    
+    return client_repository.update_needs_assessment(
+        client_id,
+        {
+            'status': 'completed',
+            'lastCompleted': datetime.now().isoformat(),
+            'currentNeeds': current_needs
+        },
+        response=response,
+        fields={'lastUpdated': datetime.now().isoformat()}
+    )
+
 async def background_form_processor():
     """Background task to automatically process form responses."""
     global background_task_running
@@ -131,51 +168,17 @@ async def background_form_processor():
                 
                 if new_responses:
                     processed_count = 0
-                    clients_data = load_clients()
-                    
                     for response in new_responses:
                         client_email = response.get('client_email', '').strip().lower()
                         if not client_email:
                             continue
                         
                         # Find matching client by email
-                        matching_client = None
-                        for client in clients_data['clients']:
-                            if client.get('email', '').strip().lower() == client_email:
-                                matching_client = client
-                                break
+                        matching_client = client_repository.get_by_email(client_email)
                         
                         if matching_client:
                             # Update client's needs assessment
-                            if 'needsAssessment' not in matching_client:
-                                matching_client['needsAssessment'] = {
-                                    'status': 'completed',
-                                    'lastSent': None,
-                                    'lastCompleted': datetime.now().isoformat(),
-                                    'responses': [],
-                                    'currentNeeds': {}
-                                }
-                            
-                            # Add the new response
-                            matching_client['needsAssessment']['responses'].append(response)
-                            matching_client['needsAssessment']['status'] = 'completed'
-                            matching_client['needsAssessment']['lastCompleted'] = datetime.now().isoformat()
-                            
-                            # Update current needs based on the response
-                            assessment = response.get('needs_assessment', {})
-                            current_needs = {}
-                            
-                            for category, details in assessment.items():
-                                if isinstance(details, dict) and details.get('needed'):
-                                    current_needs[category] = {
-                                        'needed': True,
-                                        'priority': details.get('priority', 'medium'),
-                                        'details': details.get('details', ''),
-                                        'updated': datetime.now().isoformat()
-                                    }
-                            
-                            matching_client['needsAssessment']['currentNeeds'] = current_needs
-                            matching_client['lastUpdated'] = datetime.now().isoformat()
+                            record_needs_assessment_response(matching_client['id'], response)
                             
                             processed_count += 1
                             
@@ -184,9 +187,7 @@ async def background_form_processor():
                                 client_name = f"{matching_client.get('firstName', '')} {matching_client.get('lastName', '')}"
                                 await email_service.send_notification_to_staff(client_name, response)
                     
-                    # Save updated clients data
                     if processed_count > 0:
-                        save_clients(clients_data)
                         logger.info(f"🔄 REAL-TIME: Processed {processed_count} new form responses automatically")
                     
                     # Update last check time
@@ -211,27 +212,6 @@ def start_background_tasks():
     background_thread.start()
     logger.info("✅ Background form processing started!")
 
-def load_clients():
-    """Load clients from JSON file."""
-    try:
-        if CLIENTS_FILE.exists():
-            with open(CLIENTS_FILE, 'r') as f:
-                return json.load(f)
-        return {'clients': [], 'next_id': 1}
-    except Exception as e:
-        logger.error(f"Error loading clients: {e}")
-        return {'clients': [], 'next_id': 1}
-
-def save_clients(clients_data):
-    """Save clients to JSON file."""
-    try:
-        with open(CLIENTS_FILE, 'w') as f:
-            json.dump(clients_data, f, indent=2)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving clients: {e}")
-        return False
-
 def ensure_structure_exists(data: Dict[str, Any], path: str) -> None:
     """Ensure all intermediate dictionaries exist in the path."""
     parts = path.split('.')
@@ -346,21 +326,11 @@ async def add_client(client_data: Dict[str, Any]):
         # Validate and clean the client data
         client_data = validate_client_data(client_data)
         
-        # Load existing clients
-        clients_data = load_clients()
-        
-        # Assign an ID to the new client
-        client_data['id'] = clients_data['next_id']
-        clients_data['next_id'] += 1
+        # Assign an ID and store the new client
+        client_data = client_repository.add_client(client_data)
+        await client_repository.aflush()
         
-        # Add the new client to the list
-        clients_data['clients'].append(client_data)
-        
-        # Save the updated clients data
-        if save_clients(clients_data):
-            return {"message": "Client added successfully", "client": client_data}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save client data")
+        return {"message": "Client added successfully", "client": client_data}
             
     except HTTPException as e:
         raise e
@@ -372,22 +342,20 @@ async def add_client(client_data: Dict[str, Any]):
 async def get_client_profile(email: str):
     """Get client profile by email for patient app sync."""
     try:
-        clients_data = load_clients()
-        
         # Find client by email
-        for client in clients_data['clients']:
-            if client.get('email', '').strip().lower() == email.strip().lower():
-                return {
-                    'id': client.get('id'),
-                    'email': client.get('email'),
-                    'firstName': client.get('firstName'),
-                    'lastName': client.get('lastName'),
-                    'registrationStatus': client.get('registrationStatus', 'registered'),
-                    'lastDailySurvey': client.get('lastDailySurvey'),
-                    'dailySurveyCount': client.get('dailySurveyCount', 0),
-                    'lastSurveyDate': client.get('lastSurveyDate'),
-                    'surveyHistory': client.get('surveyHistory', [])
-                }
+        client = client_repository.get_by_email(email)
+        if client:
+            return {
+                'id': client.get('id'),
+                'email': client.get('email'),
+                'firstName': client.get('firstName'),
+                'lastName': client.get('lastName'),
+                'registrationStatus': client.get('registrationStatus', 'registered'),
+                'lastDailySurvey': client.get('lastDailySurvey'),
+                'dailySurveyCount': client.get('dailySurveyCount', 0),
+                'lastSurveyDate': client.get('lastSurveyDate'),
+                'surveyHistory': client.get('surveyHistory', [])
+            }
         
         raise HTTPException(status_code=404, detail="Client not found")
         
@@ -399,14 +367,8 @@ async def get_client_profile(email: str):
 async def get_client_resources_by_email(email: str):
     """Get all resources for a specific client by email (for patient app)."""
     try:
-        clients_data = load_clients()
-        
         # Find client by email
-        client = None
-        for c in clients_data['clients']:
-            if c.get('email', '').strip().lower() == email.strip().lower():
-                client = c
-                break
+        client = client_repository.get_by_email(email)
         
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -427,67 +389,142 @@ async def get_client_resources_by_email(email: str):
         logger.error(f"Error getting client resources by email: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def format_client_summary(client: Dict[str, Any]) -> Dict[str, Any]:
+    """Key client information shown in the frontend client lists."""
+    assessment_info = client.get('needsAssessment', {})
+    
+    # Extract current needs that are marked as 'needed'
+    current_needs = assessment_info.get('currentNeeds', {})
+    needs_list = [
+        need for need, details in current_needs.items()
+        if isinstance(details, dict) and details.get('needed')
+    ]
+    
+    return {
+        'id': client.get('id'),
+        'firstName': client.get('firstName'),
+        'lastName': client.get('lastName'),
+        'email': client.get('email'),
+        'phoneNumber': client.get('phoneNumber'),
+        'status': assessment_info.get('status', 'pending'),
+        'lastSent': assessment_info.get('lastSent'),
+        'lastCompleted': assessment_info.get('lastCompleted'),
+        'needs': needs_list, # Add the list of current needs
+        'createdAt': client.get('createdAt'),
+    }
+
 @app.get('/api/recent-clients')
 async def get_recent_clients():
     """Get a list of all clients with key information."""
-    clients_data = load_clients()
-    
     # Sort clients by creation date (newest first)
     sorted_clients = sorted(
-        clients_data.get('clients', []), 
+        client_repository.all(), 
         key=lambda c: c.get('createdAt', '1970-01-01T00:00:00'),
         reverse=True
     )
     
     # Format the data for the frontend
-    formatted_clients = []
-    for client in sorted_clients:
-        assessment_info = client.get('needsAssessment', {})
-        
-        # Extract current needs that are marked as 'needed'
-        current_needs = assessment_info.get('currentNeeds', {})
-        needs_list = [
-            need for need, details in current_needs.items()
-            if isinstance(details, dict) and details.get('needed')
-        ]
-        
-        formatted_clients.append({
-            'id': client.get('id'),
-            'firstName': client.get('firstName'),
-            'lastName': client.get('lastName'),
-            'email': client.get('email'),
-            'phoneNumber': client.get('phoneNumber'),
-            'status': assessment_info.get('status', 'pending'),
-            'lastSent': assessment_info.get('lastSent'),
-            'lastCompleted': assessment_info.get('lastCompleted'),
-            'needs': needs_list, # Add the list of current needs
-            'createdAt': client.get('createdAt'),
-        })
+    formatted_clients = [format_client_summary(client) for client in sorted_clients]
         
     return JSONResponse(content={"clients": formatted_clients})
 
+def format_client_listing(client: Dict[str, Any]) -> Dict[str, Any]:
+    """Client summary plus the triage fields used by the query and caseload views."""
+    return dict(
+        format_client_summary(client),
+        riskLevel=client.get('riskLevel'),
+        priorityScore=client.get('priorityScore'),
+        source=client.get('source'),
+        registrationStatus=client.get('registrationStatus'),
+        lastDailySurvey=client.get('lastDailySurvey')
+    )
+
+def encode_client_cursor(cursor) -> Optional[str]:
+    """Opaque pagination token for a repository query cursor."""
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+def decode_client_cursor(token: Optional[str]):
+    if not token:
+        return None
+    return json.loads(base64.urlsafe_b64decode(token.encode()))
+
+@app.get('/api/clients')
+async def query_clients(riskLevel: Optional[str] = None, source: Optional[str] = None,
+                        registrationStatus: Optional[str] = None, needsAssessmentStatus: Optional[str] = None,
+                        need: Optional[str] = None, sort: str = 'createdAt', order: str = 'desc',
+                        limit: int = 50, cursor: Optional[str] = None):
+    """
+    Filter, sort and page through clients using the repository's secondary indexes.
+    Filters take comma-separated values (e.g. riskLevel=HIGH,CRITICAL&sort=priorityScore);
+    pass nextCursor back as cursor to fetch the following page.
+    """
+    filter_params = {
+        'riskLevel': riskLevel,
+        'source': source,
+        'registrationStatus': registrationStatus,
+        'needsAssessment.status': needsAssessmentStatus,
+        'need': need
+    }
+    filters = {
+        name: [value.strip() for value in param.split(',') if value.strip()]
+        for name, param in filter_params.items() if param
+    }
+    
+    if order not in ('asc', 'desc'):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    
+    try:
+        clients, next_cursor, total = client_repository.query(
+            filters,
+            sort=sort,
+            descending=order == 'desc',
+            limit=max(1, min(limit, 200)),
+            cursor=decode_client_cursor(cursor)
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid query: {e}")
+    except Exception as e:
+        logger.error(f"Error querying clients: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        'clients': [format_client_listing(client) for client in clients],
+        'total': total,
+        'nextCursor': encode_client_cursor(next_cursor)
+    }
+
+@app.get('/api/caseload/top')
+async def get_caseload_top(n: int = 10):
+    """
+    The n most urgent clients, ordered by risk level, then priority score, then most
+    recent daily survey. Served from the repository's maintained caseload queue, so
+    nothing is rescored at read time.
+    """
+    try:
+        clients = client_repository.top_priority(max(1, min(n, 200)))
+        return {
+            'clients': [format_client_listing(client) for client in clients],
+            'count': len(clients),
+            'totalClients': client_repository.count()
+        }
+    except Exception as e:
+        logger.error(f"Error getting caseload priorities: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete('/api/clients/{client_id}')
 async def delete_client(client_id: int):
     """Delete a client by ID."""
     try:
-        # Load existing clients
-        clients_data = load_clients()
-        
-        # Find the client to delete
-        client_to_delete = None
-        for i, client in enumerate(clients_data['clients']):
-            if client['id'] == client_id:
-                client_to_delete = clients_data['clients'].pop(i)
-                break
+        # Remove the client
+        client_to_delete = client_repository.delete_client(client_id)
+        await client_repository.aflush()
         
         if not client_to_delete:
             raise HTTPException(status_code=404, detail="Client not found")
         
-        # Save the updated clients data
-        if save_clients(clients_data):
-            return {"message": "Client deleted successfully", "deleted_client": client_to_delete}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save client data")
+        return {"message": "Client deleted successfully", "deleted_client": client_to_delete}
             
     except HTTPException as e:
         raise e
@@ -521,8 +558,11 @@ def save_resources(resources_data):
         else:
             resources_array = resources_data
         
-        with open(resources_file, 'w') as f:
+        # Write to a temp file and rename so readers (e.g. the vector index sync) never see a partial catalog
+        tmp_file = resources_file.with_name(resources_file.name + '.tmp')
+        with open(tmp_file, 'w') as f:
             json.dump(resources_array, f, indent=2)
+        os.replace(tmp_file, resources_file)
         return True
     except Exception as e:
         logger.error(f"Error saving resources: {e}")
@@ -544,27 +584,35 @@ async def get_resources():
         logger.error(f"Error getting resources: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def find_resource_index(resources, resource_name: str):
+    """Position of a catalog resource matched by id or resource_name, or None."""
+    for i, resource in enumerate(resources):
+        if resource.get('id') == resource_name or resource.get('resource_name') == resource_name:
+            return i
+    return None
+
 @app.put('/api/resources/{resource_name}')
 async def update_resource(resource_name: str, resource_data: Dict[str, Any]):
-    """Update a resource by name."""
+    """Update a resource by id or name."""
     try:
         # Load existing resources
         resources_data = load_resources()
         
         # Find the resource to update
-        resource_updated = False
-        for i, resource in enumerate(resources_data['resources']):
-            if resource['name'] == resource_name:
-                # Update the resource with new data
-                resources_data['resources'][i] = resource_data
-                resource_updated = True
-                break
-        
-        if not resource_updated:
+        index = find_resource_index(resources_data['resources'], resource_name)
+        
+        if index is None:
             raise HTTPException(status_code=404, detail="Resource not found")
         
+        # Update the resource with new data, keeping its id so references and the vector index stay stable
+        previous = resources_data['resources'][index]
+        if previous.get('id') and not resource_data.get('id'):
+            resource_data['id'] = previous['id']
+        resources_data['resources'][index] = resource_data
+        
         # Save the updated resources data
         if save_resources(resources_data):
+            emit_resource_change('updated', resource_data.get('id', resource_name), resource_data)
             return {"message": "Resource updated successfully", "resource": resource_data}
         else:
             raise HTTPException(status_code=500, detail="Failed to save resource data")
@@ -575,6 +623,31 @@ async def update_resource(resource_name: str, resource_data: Dict[str, Any]):
         logger.error(f"Error updating resource: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.delete('/api/resources/{resource_name}')
+async def delete_resource(resource_name: str):
+    """Remove a resource from the catalog by id or name."""
+    try:
+        resources_data = load_resources()
+        
+        index = find_resource_index(resources_data['resources'], resource_name)
+        
+        if index is None:
+            raise HTTPException(status_code=404, detail="Resource not found")
+        
+        removed = resources_data['resources'].pop(index)
+        
+        if save_resources(resources_data):
+            emit_resource_change('deleted', removed.get('id', resource_name), removed)
+            return {"message": "Resource deleted successfully", "resource": removed}
+        else:
+            raise HTTPException(status_code=500, detail="Failed to save resource data")
+            
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error deleting resource: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post('/api/send-referral')
 async def send_referral(referral_data: Dict[str, Any]):
     """Send a referral email (mock implementation)."""
@@ -598,9 +671,37 @@ async def send_referral(referral_data: Dict[str, Any]):
         logger.error(f"Error sending referral: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: Any) -> str:
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events) -> StreamingResponse:
+    # X-Accel-Buffering stops reverse proxies from holding back partial output
+    return StreamingResponse(events, media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+async def stream_sentences(chunks):
+    """Regroup streamed LLM message chunks into whole sentences."""
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk.content if hasattr(chunk, 'content') else str(chunk)
+        *sentences, buffer = SENTENCE_END.split(buffer)
+        for sentence in sentences:
+            if sentence.strip():
+                yield sentence.strip()
+    if buffer.strip():
+        yield buffer.strip()
+
 @app.post('/api/match-resources')
 async def match_resources(request_data: Dict[str, Any]):
-    """Match resources to client using RAG pipeline."""
+    """
+    Match resources to client using RAG pipeline.
+
+    Responds as soon as retrieval is done with a templated recommendation_reason; the
+    LLM-written reason follows via /api/match-resources/reasons/{enrichment_id}.
+    """
     try:
         if not rag_matcher:
             raise HTTPException(status_code=500, detail="RAG Resource Matcher not initialized")
@@ -612,7 +713,7 @@ async def match_resources(request_data: Dict[str, Any]):
             raise HTTPException(status_code=400, detail="Client data is required")
         
         # Get RAG recommendations
-        recommendations = rag_matcher.get_recommendations(client_data, resource_type)
+        recommendations = await rag_matcher.aget_recommendations(client_data, resource_type)
         
         return {
             "message": "Resources matched successfully",
@@ -627,6 +728,176 @@ async def match_resources(request_data: Dict[str, Any]):
         logger.error(f"Error matching resources: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post('/api/match-resources/stream')
+async def match_resources_stream(request_data: Dict[str, Any]):
+    """
+    Streaming /api/match-resources over SSE: a 'recommendations' event as soon as
+    retrieval finishes, 'token' events for the LLM recommendation reason, then 'done'
+    with the complete result.
+    """
+    if not rag_matcher:
+        raise HTTPException(status_code=500, detail="RAG Resource Matcher not initialized")
+    client_data = request_data.get('client_data', {})
+    resource_type = request_data.get('resource_type', 'housing')
+    if not client_data:
+        raise HTTPException(status_code=400, detail="Client data is required")
+
+    async def events():
+        try:
+            async for event, data in rag_matcher.astream_recommendations(client_data, resource_type):
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Error streaming resource matches: {e}")
+            yield sse_event('error', {"detail": str(e)})
+
+    return sse_response(events())
+
+# Longest a reason request waits for its background LLM enrichment
+ENRICHMENT_WAIT_SECONDS = 30
+
+@app.get('/api/match-resources/reasons/{enrichment_id}')
+async def get_recommendation_reason(enrichment_id: str, wait: float = 0):
+    """
+    The LLM-written reason for a templated /api/match-resources result:
+    {"id", "status": "pending" | "done" | "failed", "reason"}. With ?wait=N the
+    request long-polls for up to N seconds while the reason is pending.
+    """
+    if not rag_matcher:
+        raise HTTPException(status_code=500, detail="RAG Resource Matcher not initialized")
+    result = await rag_matcher.await_enrichment(enrichment_id, min(max(wait, 0), ENRICHMENT_WAIT_SECONDS))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired enrichment id")
+    return result
+
+@app.get('/api/match-resources/reasons/{enrichment_id}/stream')
+async def stream_recommendation_reason(enrichment_id: str):
+    """Push the LLM-written reason over SSE: one 'reason' event when it is ready, or 'error'."""
+    if not rag_matcher:
+        raise HTTPException(status_code=500, detail="RAG Resource Matcher not initialized")
+
+    async def events():
+        result = await rag_matcher.await_enrichment(enrichment_id, ENRICHMENT_WAIT_SECONDS)
+        if result is None:
+            yield sse_event('error', {"detail": "Unknown or expired enrichment id"})
+        elif result['status'] == 'done':
+            yield sse_event('reason', result)
+        else:
+            yield sse_event('error', {"detail": f"Reason {result['status']}", "id": enrichment_id})
+
+    return sse_response(events())
+
+@app.post('/api/match-resources/batch')
+async def match_resources_batch(request_data: Dict[str, Any]):
+    """
+    Match resources for many clients and categories in one call.
+
+    Body: {"items": [{"client_data": {...}, "resource_types": ["housing", "food"]}, ...]}.
+    All questions are embedded and searched together, LLM summaries run concurrently
+    (at most MATCH_BATCH_CONCURRENCY at a time), and each client's results are streamed
+    back as one NDJSON line as soon as all of its categories are summarized.
+    """
+    try:
+        if not rag_matcher:
+            raise HTTPException(status_code=500, detail="RAG Resource Matcher not initialized")
+
+        items = request_data.get('items')
+        if not isinstance(items, list) or not items:
+            raise HTTPException(status_code=400, detail="items must be a non-empty list")
+        pairs = []
+        for position, item in enumerate(items):
+            client_data = item.get('client_data') if isinstance(item, dict) else None
+            if not client_data:
+                raise HTTPException(status_code=400, detail=f"items[{position}]: client data is required")
+            resource_types = item.get('resource_types') or [item.get('resource_type', 'housing')]
+            pairs.extend((position, client_data, resource_type) for resource_type in resource_types)
+
+        matches = await rag_matcher.aretrieve_batch(
+            [(client_data, resource_type) for _, client_data, resource_type in pairs]
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error matching resources in batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    semaphore = asyncio.Semaphore(MATCH_BATCH_CONCURRENCY)
+    by_item: Dict[int, List[Dict[str, Any]]] = {}
+    for (position, _, _), match in zip(pairs, matches):
+        by_item.setdefault(position, []).append(match)
+
+    async def summarize(match: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await rag_matcher.asummarize_match(match)
+
+    async def match_item(position: int) -> Dict[str, Any]:
+        client_data = items[position]['client_data']
+        results = await asyncio.gather(*(summarize(match) for match in by_item[position]))
+        return {
+            "index": position,
+            "client_id": client_data.get('id'),
+            "recommendations": {match['resource_type']: result for match, result in zip(by_item[position], results)}
+        }
+
+    async def stream():
+        tasks = [asyncio.create_task(match_item(position)) for position in sorted(by_item)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
+
+def build_chat_followup_chain(request_data: Dict[str, Any]):
+    """Prompt chain and inputs for a follow-up question about resource recommendations."""
+    message = request_data.get('message', '')
+    client_data = request_data.get('client_data', {})
+    resource_type = request_data.get('resource_type', 'housing')
+    current_recommendations = request_data.get('current_recommendations', [])
+    chat_history = request_data.get('chat_history', [])
+    
+    if not message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    
+    # Build context for the AI response
+    context_parts = []
+    context_parts.append(f"Client: {client_data.get('firstName', 'Unknown')} {client_data.get('lastName', 'Unknown')}")
+    context_parts.append(f"Resource Type: {resource_type}")
+    
+    if current_recommendations:
+        context_parts.append("Current Recommendations:")
+        for i, rec in enumerate(current_recommendations[:3], 1):  # Limit to top 3
+            context_parts.append(f"{i}. {rec.get('organization', 'Unknown')} - {rec.get('resource_name', 'Unknown')}")
+    
+    # Add recent chat history for context
+    if chat_history:
+        context_parts.append("Recent conversation:")
+        for msg in chat_history[-4:]:  # Last 4 messages
+            if msg.get('type') == 'user':
+                context_parts.append(f"Social Worker: {msg.get('content', '')}")
+            elif msg.get('type') == 'ai':
+                context_parts.append(f"AI: {msg.get('content', '')}")
+    
+    context = "\n".join(context_parts)
+    
+    # Use the LLM to generate a response
+    from langchain_core.prompts import PromptTemplate
+    
+    prompt = PromptTemplate.from_template(
+        "You are a helpful AI assistant for social workers. You have access to information about "
+        "housing and food resources, and you're helping a social worker with follow-up questions "
+        "about resource recommendations.\n\n"
+        "Context:\n{context}\n\n"
+        "Social Worker's Question: {question}\n\n"
+        "Provide a helpful, specific response based on the context. If you need more information "
+        "that isn't available in the context, say so clearly. Keep your response concise but informative."
+    )
+    
+    if rag_matcher.llm is None:
+        raise HTTPException(status_code=503, detail=f"Chat is unavailable: {rag_matcher.error}")
+    return prompt | rag_matcher.llm, {"context": context, "question": message}
+
 @app.post('/api/chat-followup')
 async def chat_followup(request_data: Dict[str, Any]):
     """Handle follow-up chat questions about resource recommendations."""
@@ -634,51 +905,8 @@ async def chat_followup(request_data: Dict[str, Any]):
         if not rag_matcher:
             raise HTTPException(status_code=500, detail="RAG Resource Matcher not initialized")
         
-        message = request_data.get('message', '')
-        client_data = request_data.get('client_data', {})
-        resource_type = request_data.get('resource_type', 'housing')
-        current_recommendations = request_data.get('current_recommendations', [])
-        chat_history = request_data.get('chat_history', [])
-        
-        if not message:
-            raise HTTPException(status_code=400, detail="Message is required")
-        
-        # Build context for the AI response
-        context_parts = []
-        context_parts.append(f"Client: {client_data.get('firstName', 'Unknown')} {client_data.get('lastName', 'Unknown')}")
-        context_parts.append(f"Resource Type: {resource_type}")
-        
-        if current_recommendations:
-            context_parts.append("Current Recommendations:")
-            for i, rec in enumerate(current_recommendations[:3], 1):  # Limit to top 3
-                context_parts.append(f"{i}. {rec.get('organization', 'Unknown')} - {rec.get('resource_name', 'Unknown')}")
-        
-        # Add recent chat history for context
-        if chat_history:
-            context_parts.append("Recent conversation:")
-            for msg in chat_history[-4:]:  # Last 4 messages
-                if msg.get('type') == 'user':
-                    context_parts.append(f"Social Worker: {msg.get('content', '')}")
-                elif msg.get('type') == 'ai':
-                    context_parts.append(f"AI: {msg.get('content', '')}")
-        
-        context = "\n".join(context_parts)
-        
-        # Use the LLM to generate a response
-        from langchain_core.prompts import PromptTemplate
-        
-        prompt = PromptTemplate.from_template(
-            "You are a helpful AI assistant for social workers. You have access to information about "
-            "housing and food resources, and you're helping a social worker with follow-up questions "
-            "about resource recommendations.\n\n"
-            "Context:\n{context}\n\n"
-            "Social Worker's Question: {question}\n\n"
-            "Provide a helpful, specific response based on the context. If you need more information "
-            "that isn't available in the context, say so clearly. Keep your response concise but informative."
-        )
-        
-        chain = prompt | rag_matcher.llm
-        response = chain.invoke({"context": context, "question": message})
+        chain, inputs = build_chat_followup_chain(request_data)
+        response = await chain.ainvoke(inputs)
         
         ai_response = response.content if hasattr(response, 'content') else str(response)
         
@@ -693,36 +921,43 @@ async def chat_followup(request_data: Dict[str, Any]):
         logger.error(f"Error in chat followup: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post('/api/chat-followup/stream')
+async def chat_followup_stream(request_data: Dict[str, Any]):
+    """Streaming /api/chat-followup: SSE 'token' events, then 'done' with the full response."""
+    if not rag_matcher:
+        raise HTTPException(status_code=500, detail="RAG Resource Matcher not initialized")
+    chain, inputs = build_chat_followup_chain(request_data)
+
+    async def events():
+        parts = []
+        try:
+            async for chunk in chain.astream(inputs):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if text:
+                    parts.append(text)
+                    yield sse_event('token', {"text": text})
+            yield sse_event('done', {"response": "".join(parts)})
+        except Exception as e:
+            logger.error(f"Error in streaming chat followup: {e}")
+            yield sse_event('error', {"detail": str(e)})
+
+    return sse_response(events())
+
 @app.post('/api/clients/{client_id}/add-resource')
 async def add_resource_to_client(client_id: int, resource_data: Dict[str, Any]):
     """Add a resource to a client's portfolio."""
     try:
         logger.info(f"🎯 Adding resource to client {client_id}: {resource_data.get('resource_name')}")
         
-        # Load existing clients
-        clients_data = load_clients()
-        logger.info(f"📊 Loaded {len(clients_data.get('clients', []))} total clients")
-        
         # Find the client
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
+        client = client_repository.get(client_id)
         
         if not client:
-            logger.error(f"❌ Client {client_id} not found in {len(clients_data['clients'])} clients")
-            # Debug: show some client IDs
-            client_ids = [c.get('id') for c in clients_data['clients'][:5]]
-            logger.error(f"📋 Sample client IDs: {client_ids}")
+            logger.error(f"❌ Client {client_id} not found in {client_repository.count()} clients")
             raise HTTPException(status_code=404, detail="Client not found")
         
         logger.info(f"✅ Found client: {client.get('firstName', '')} {client.get('lastName', '')}")
         
-        # Initialize resources array if it doesn't exist
-        if 'resources' not in client:
-            client['resources'] = []
-        
         # Create resource entry with status tracking
         resource_entry = {
             'resource_id': resource_data.get('id'),
@@ -739,33 +974,25 @@ async def add_resource_to_client(client_id: int, resource_data: Dict[str, Any]):
             'ai_reasoning': resource_data.get('ai_reasoning', '')
         }
         
-        # Check if resource already exists for this client
-        existing_resource = None
-        for r in client['resources']:
-            if r['resource_id'] == resource_entry['resource_id']:
-                existing_resource = r
-                break
+        # Add the resource to client's portfolio unless it already exists for this client
+        resource, added = client_repository.add_resource(
+            client_id, resource_entry, fields={'lastUpdated': datetime.now().isoformat()}
+        )
+        
+        if resource is None:
+            raise HTTPException(status_code=404, detail="Client not found")
         
-        if existing_resource:
+        if not added:
             return {
                 "message": "Resource already exists for this client",
-                "resource": existing_resource
+                "resource": resource
             }
         
-        # Add the resource to client's portfolio
-        client['resources'].append(resource_entry)
-        client['lastUpdated'] = datetime.now().isoformat()
-        
-        # Save the updated clients data
-        if save_clients(clients_data):
-            logger.info(f"💾 Successfully saved resource to client {client_id}")
-            return {
-                "message": "Resource added to client successfully",
-                "resource": resource_entry
-            }
-        else:
-            logger.error(f"❌ Failed to save client data for client {client_id}")
-            raise HTTPException(status_code=500, detail="Failed to save client data")
+        logger.info(f"💾 Successfully saved resource to client {client_id}")
+        return {
+            "message": "Resource added to client successfully",
+            "resource": resource
+        }
             
     except HTTPException as e:
         raise e
@@ -777,56 +1004,50 @@ async def add_resource_to_client(client_id: int, resource_data: Dict[str, Any]):
 async def update_resource_status(client_id: int, resource_id: str, status_data: Dict[str, Any]):
     """Update the status of a resource for a client."""
     try:
-        # Load existing clients
-        clients_data = load_clients()
-        
-        # Find the client
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
+        # Validate and update under the client lock so concurrent edits are linearized
+        async with client_repository.client_lock(client_id):
+            client = client_repository.get(client_id)
         
-        if not client:
-            raise HTTPException(status_code=404, detail="Client not found")
+            if not client:
+                raise HTTPException(status_code=404, detail="Client not found")
         
-        if 'resources' not in client:
-            raise HTTPException(status_code=404, detail="Client has no resources")
+            if 'resources' not in client:
+                raise HTTPException(status_code=404, detail="Client has no resources")
         
-        # Find the resource
-        resource = None
-        for r in client['resources']:
-            if r['resource_id'] == resource_id:
-                resource = r
-                break
+            # Find the resource
+            resource = client_repository.find_resource(client, resource_id)
         
-        if not resource:
-            raise HTTPException(status_code=404, detail="Resource not found for this client")
+            if not resource:
+                raise HTTPException(status_code=404, detail="Resource not found for this client")
         
-        # Update the resource status
-        new_status = status_data.get('status')
-        valid_statuses = ['pending', 'contacted', 'in_progress', 'completed', 'declined', 'not_eligible']
+            # Update the resource status
+            old_status = resource.get('status')
+            new_status = status_data.get('status')
+            valid_statuses = ['pending', 'contacted', 'in_progress', 'completed', 'declined', 'not_eligible']
         
-        if new_status not in valid_statuses:
-            raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
+            if new_status not in valid_statuses:
+                raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
         
-        resource['status'] = new_status
-        resource['last_updated'] = datetime.now().isoformat()
+            changes = {
+                'status': new_status,
+                'last_updated': datetime.now().isoformat()
+            }
         
-        # Add notes if provided
-        if status_data.get('notes'):
-            resource['notes'] = status_data.get('notes')
+            # Add notes if provided
+            if status_data.get('notes'):
+                changes['notes'] = status_data.get('notes')
         
-        client['lastUpdated'] = datetime.now().isoformat()
+            resource = client_repository.update_resource(
+                client_id, resource_id, changes, fields={'lastUpdated': datetime.now().isoformat()}
+            )
+            # Completed / declined referrals feed the matcher's outcome-rate ranking signal
+            if rag_matcher:
+                rag_matcher.reranker.record_status(resource_id, old_status, new_status)
         
-        # Save the updated clients data
-        if save_clients(clients_data):
-            return {
-                "message": "Resource status updated successfully",
-                "resource": resource
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save client data")
+        return {
+            "message": "Resource status updated successfully",
+            "resource": resource
+        }
             
     except HTTPException as e:
         raise e
@@ -838,15 +1059,8 @@ async def update_resource_status(client_id: int, resource_id: str, status_data:
 async def get_client_resources(client_id: int):
     """Get all resources for a specific client."""
     try:
-        # Load existing clients
-        clients_data = load_clients()
-        
         # Find the client
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
+        client = client_repository.get(client_id)
         
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -869,12 +1083,9 @@ async def get_client_resources(client_id: int):
 async def get_dashboard_resource_status():
     """Get recent resource status updates for dashboard."""
     try:
-        # Load existing clients
-        clients_data = load_clients()
-        
         # Collect all client resources with their statuses
         client_resources = []
-        for client in clients_data['clients']:
+        for client in client_repository.all():
             if 'resources' in client and client['resources']:
                 for resource in client['resources']:
                     client_resources.append({
@@ -938,18 +1149,16 @@ COMMON TASKS:
 
 Answer questions clearly and concisely. If you don't know something specific about the platform, acknowledge it and suggest alternative ways to get help. Be friendly and professional."""
 
-        # Use the existing LLM from the RAG matcher
-        from langchain_openai import ChatOpenAI
         from langchain_core.messages import HumanMessage, SystemMessage
         
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.7)
+        llm = llm_gateway.chat_model("gpt-4o-mini", temperature=0.7)
         
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=message)
         ]
         
-        response = llm.invoke(messages)
+        response = await llm.ainvoke(messages)
         
         return {
             "response": response.content,
@@ -962,27 +1171,23 @@ Answer questions clearly and concisely. If you don't know something specific abo
         logger.error(f"Error in help chatbot: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post('/api/voice-assistant')
-async def voice_assistant(request_data: Dict[str, Any]):
-    """Advanced voice assistant endpoint with comprehensive platform knowledge."""
-    try:
-        message = request_data.get('message', '')
-        context = request_data.get('context', 'voice_assistant')
-        conversation_history = request_data.get('conversation_history', [])
-        
-        if not message:
-            raise HTTPException(status_code=400, detail="Message is required")
-        
-        # Load current resources for context
-        resources_data = load_resources()
-        total_resources = len(resources_data.get('resources', []))
-        
-        # Load clients for context
-        clients_data = load_clients()
-        total_clients = len(clients_data.get('clients', []))
-        
-        # Enhanced system prompt with current platform data
-        system_prompt = f"""You are Sarah, the NextStep AI assistant. You're a helpful, friendly female voice assistant for social workers. You have complete knowledge of the NextStep platform and can help with everything.
+def build_voice_assistant_messages(request_data: Dict[str, Any]):
+    """Chat model and message list for a voice assistant turn."""
+    message = request_data.get('message', '')
+    conversation_history = request_data.get('conversation_history', [])
+    
+    if not message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    
+    # Load current resources for context
+    resources_data = load_resources()
+    total_resources = len(resources_data.get('resources', []))
+    
+    # Client count for context
+    total_clients = client_repository.count()
+    
+    # Enhanced system prompt with current platform data
+    system_prompt = f"""You are Sarah, the NextStep AI assistant. You're a helpful, friendly female voice assistant for social workers. You have complete knowledge of the NextStep platform and can help with everything.
 
 PLATFORM STATUS: {total_resources} resources, {total_clients} clients
 
@@ -1017,27 +1222,34 @@ PLATFORM FEATURES YOU KNOW:
 
 Always be concise, helpful, and sound like a real person having a conversation."""
 
-        # Use the existing LLM from the RAG matcher
-        from langchain_openai import ChatOpenAI
-        from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-        
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.8)
-        
-        # Build conversation context
-        messages = [SystemMessage(content=system_prompt)]
-        
-        # Add recent conversation history
-        for msg in conversation_history[-5:]:  # Last 5 messages for context
-            if msg.get('type') == 'user':
-                messages.append(HumanMessage(content=msg.get('text', '')))
-            elif msg.get('type') == 'assistant':
-                messages.append(AIMessage(content=msg.get('text', '')))
-        
-        # Add current message
-        messages.append(HumanMessage(content=message))
+    from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+    
+    llm = llm_gateway.chat_model("gpt-4o-mini", temperature=0.8)
+    
+    # Build conversation context
+    messages = [SystemMessage(content=system_prompt)]
+    
+    # Add recent conversation history
+    for msg in conversation_history[-5:]:  # Last 5 messages for context
+        if msg.get('type') == 'user':
+            messages.append(HumanMessage(content=msg.get('text', '')))
+        elif msg.get('type') == 'assistant':
+            messages.append(AIMessage(content=msg.get('text', '')))
+    
+    # Add current message
+    messages.append(HumanMessage(content=message))
+    
+    return llm, messages
+
+@app.post('/api/voice-assistant')
+async def voice_assistant(request_data: Dict[str, Any]):
+    """Advanced voice assistant endpoint with comprehensive platform knowledge."""
+    try:
+        context = request_data.get('context', 'voice_assistant')
+        llm, messages = build_voice_assistant_messages(request_data)
         
         # Create the chat completion
-        response = llm.invoke(messages)
+        response = await llm.ainvoke(messages)
         
         return {
             "response": response.content,
@@ -1050,6 +1262,27 @@ Always be concise, helpful, and sound like a real person having a conversation."
         logger.error(f"Error in voice assistant: {e}")
         raise HTTPException(status_code=500, detail="I'm having trouble processing your request right now. Please try again or contact support if the issue persists.")
 
+@app.post('/api/voice-assistant/stream')
+async def voice_assistant_stream(request_data: Dict[str, Any]):
+    """
+    Streaming /api/voice-assistant: one SSE 'sentence' event per completed sentence, so
+    text-to-speech can start on the first sentence, then 'done' with the full response.
+    """
+    llm, messages = build_voice_assistant_messages(request_data)
+
+    async def events():
+        parts = []
+        try:
+            async for sentence in stream_sentences(llm.astream(messages)):
+                parts.append(sentence)
+                yield sse_event('sentence', {"text": sentence})
+            yield sse_event('done', {"response": " ".join(parts), "context": request_data.get('context', 'voice_assistant')})
+        except Exception as e:
+            logger.error(f"Error in streaming voice assistant: {e}")
+            yield sse_event('error', {"detail": "I'm having trouble processing your request right now. Please try again."})
+
+    return sse_response(events())
+
 @app.post('/api/translate')
 async def translate_text(request_data: Dict[str, Any]):
     """Translate text to the specified language."""
@@ -1061,11 +1294,7 @@ async def translate_text(request_data: Dict[str, Any]):
             raise HTTPException(status_code=400, detail="Text is required")
         
         # Use OpenAI for translation
-        from openai import OpenAI
-        openai_key = os.environ.get("OPENAI_API_KEY") or os.environ.get("OPEN_API_KEY")
-        client = OpenAI(api_key=openai_key)
-        
-        response = client.chat.completions.create(
+        response = await llm_gateway.openai.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {
@@ -1094,13 +1323,9 @@ async def translate_text(request_data: Dict[str, Any]):
 async def text_to_speech(request_data: Dict[str, Any]):
     """Convert text to speech using OpenAI's advanced TTS API."""
     try:
-        from openai import OpenAI
         import base64
         import io
         
-        # Initialize OpenAI client
-        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        
         text = request_data.get('text', '')
         voice = request_data.get('voice', 'nova')  # nova is a great female voice
         
@@ -1108,7 +1333,7 @@ async def text_to_speech(request_data: Dict[str, Any]):
             raise HTTPException(status_code=400, detail="Text is required")
         
         # Generate speech using OpenAI TTS
-        response = client.audio.speech.create(
+        response = await llm_gateway.openai.audio.speech.create(
             model="tts-1",  # Use tts-1 for faster response, tts-1-hd for higher quality
             voice=voice,    # Options: alloy, echo, fable, onyx, nova, shimmer
             input=text,
@@ -1179,11 +1404,24 @@ async def health_check():
             "timestamp": datetime.now().isoformat(),
             "rag_matcher_initialized": rag_matcher is not None
         }
+        if rag_matcher is not None and hasattr(rag_matcher.embeddings, 'stats'):
+            health_status["embedding_cache"] = rag_matcher.embeddings.stats()
+        if rag_matcher is not None:
+            health_status["recommendation_cache"] = rag_matcher.recommendation_cache.stats()
+            health_status["rag_matcher"] = rag_matcher.status_report()
+        health_status["llm"] = llm_gateway.metrics.snapshot()
         
         # If RAG matcher is not initialized, still return healthy but with warning
         if rag_matcher is None:
             health_status["status"] = "starting"
             health_status["warning"] = "RAG matcher still initializing"
+        elif rag_matcher.error:
+            health_status["warning"] = f"{rag_matcher.error}, serving keyword matches without LLM reasons"
+        elif rag_matcher.status in ('starting', 'warming'):
+            health_status["status"] = rag_matcher.status
+            health_status["warning"] = "Vector index warming up, serving keyword matches"
+        elif rag_matcher.status == 'degraded':
+            health_status["warning"] = "Vector index unavailable, serving keyword matches"
             
         return health_status
         
@@ -1204,15 +1442,8 @@ async def send_needs_assessment_to_client(client_id: int):
         if not email_service:
             raise HTTPException(status_code=503, detail="Email service not available")
         
-        # Load existing clients
-        clients_data = load_clients()
-        
         # Find the client
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
+        client = client_repository.get(client_id)
         
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -1231,33 +1462,23 @@ async def send_needs_assessment_to_client(client_id: int):
         
         if success:
             # Update client record
-            if 'needsAssessment' not in client:
-                client['needsAssessment'] = {
+            client_repository.update_needs_assessment(
+                client_id,
+                {
                     'status': 'sent',
                     'lastSent': datetime.now().isoformat(),
-                    'lastCompleted': None,
-                    'formUrl': form_url,
-                    'responses': [],
-                    'currentNeeds': {}
-                }
-            else:
-                client['needsAssessment']['status'] = 'sent'
-                client['needsAssessment']['lastSent'] = datetime.now().isoformat()
-                client['needsAssessment']['formUrl'] = form_url
-            
-            client['lastUpdated'] = datetime.now().isoformat()
+                    'formUrl': form_url
+                },
+                fields={'lastUpdated': datetime.now().isoformat()}
+            )
             
-            # Save updated client data
-            if save_clients(clients_data):
-                logger.info(f"Needs assessment sent to client {client_id}")
-                return {
-                    "message": "Needs assessment sent successfully",
-                    "client_id": client_id,
-                    "email": client_email,
-                    "form_url": form_url
-                }
-            else:
-                raise HTTPException(status_code=500, detail="Failed to update client record")
+            logger.info(f"Needs assessment sent to client {client_id}")
+            return {
+                "message": "Needs assessment sent successfully",
+                "client_id": client_id,
+                "email": client_email,
+                "form_url": form_url
+            }
         else:
             raise HTTPException(status_code=500, detail="Failed to send email")
             
@@ -1271,15 +1492,8 @@ async def send_needs_assessment_to_client(client_id: int):
 async def get_client_needs_assessment_status(client_id: int):
     """Get the needs assessment status for a client."""
     try:
-        # Load existing clients
-        clients_data = load_clients()
-        
         # Find the client
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
+        client = client_repository.get(client_id)
         
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -1355,13 +1569,13 @@ async def analyze_survey(request: dict):
         """
 
         try:
-            # Check if OpenAI client is available
-            if not openai_client:
+            # Check if OpenAI is available
+            if not llm_gateway.available:
                 logger.warning("OpenAI client not available, using fallback analysis")
                 return generate_fallback_analysis(survey_data)
                 
             # Use OpenAI for analysis
-            response = openai_client.chat.completions.create(
+            response = await llm_gateway.openai.chat.completions.create(
                 model="gpt-4",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
@@ -1512,7 +1726,6 @@ async def process_form_responses():
         new_responses = await sheets_integration.get_new_responses_since(last_check)
         
         processed_count = 0
-        clients_data = load_clients()
         
         for response in new_responses:
             client_email = response.get('client_email', '').strip().lower()
@@ -1520,43 +1733,11 @@ async def process_form_responses():
                 continue
             
             # Find matching client by email
-            matching_client = None
-            for client in clients_data['clients']:
-                if client.get('email', '').strip().lower() == client_email:
-                    matching_client = client
-                    break
+            matching_client = client_repository.get_by_email(client_email)
             
             if matching_client:
                 # Update client's needs assessment
-                if 'needsAssessment' not in matching_client:
-                    matching_client['needsAssessment'] = {
-                        'status': 'completed',
-                        'lastSent': None,
-                        'lastCompleted': datetime.now().isoformat(),
-                        'responses': [],
-                        'currentNeeds': {}
-                    }
-                
-                # Add the new response
-                matching_client['needsAssessment']['responses'].append(response)
-                matching_client['needsAssessment']['status'] = 'completed'
-                matching_client['needsAssessment']['lastCompleted'] = datetime.now().isoformat()
-                
-                # Update current needs based on the response
-                assessment = response.get('needs_assessment', {})
-                current_needs = {}
-                
-                for category, details in assessment.items():
-                    if isinstance(details, dict) and details.get('needed'):
-                        current_needs[category] = {
-                            'needed': True,
-                            'priority': details.get('priority', 'medium'),
-                            'details': details.get('details', ''),
-                            'updated': datetime.now().isoformat()
-                        }
-                
-                matching_client['needsAssessment']['currentNeeds'] = current_needs
-                matching_client['lastUpdated'] = datetime.now().isoformat()
+                record_needs_assessment_response(matching_client['id'], response)
                 
                 processed_count += 1
                 
@@ -1565,10 +1746,6 @@ async def process_form_responses():
                     client_name = f"{matching_client.get('firstName', '')} {matching_client.get('lastName', '')}"
                     await email_service.send_notification_to_staff(client_name, response)
         
-        # Save updated clients data
-        if processed_count > 0:
-            save_clients(clients_data)
-        
         # Update last check time
         with open(last_check_file, 'w') as f:
             json.dump({'timestamp': datetime.now().isoformat()}, f)
@@ -1591,10 +1768,10 @@ async def process_form_responses():
 async def get_needs_assessment_dashboard():
     """Get needs assessment summary for dashboard."""
     try:
-        clients_data = load_clients()
+        clients = client_repository.all()
         
         summary = {
-            'total_clients': len(clients_data['clients']),
+            'total_clients': len(clients),
             'assessment_status': {
                 'pending': 0,
                 'sent': 0,
@@ -1609,7 +1786,7 @@ async def get_needs_assessment_dashboard():
             }
         }
         
-        for client in clients_data['clients']:
+        for client in clients:
             needs_assessment = client.get('needsAssessment', {})
             status = needs_assessment.get('status', 'pending')
             
@@ -1657,10 +1834,22 @@ async def get_needs_assessment_dashboard():
 @app.on_event("startup")
 async def startup_event():
     """Initialize background tasks when the server starts."""
+    if rag_matcher:
+        rag_matcher.start_warm_up()
+        # Referral outcome rates for re-ranking are read from every client once, off the event loop
+        asyncio.get_running_loop().run_in_executor(
+            None, lambda: rag_matcher.reranker.load_outcomes(client_repository.all())
+        )
     if sheets_integration and email_service:
         start_background_tasks()
         logger.info("🚀 Real-time form processing enabled!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending client writes and release the storage backend and LLM connections."""
+    client_repository.close()
+    await llm_gateway.aclose()
+
 @app.get('/api/realtime-status')
 async def get_realtime_status():
     """Get the status of real-time form processing."""
@@ -1767,10 +1956,7 @@ async def generate_ai_survey_analysis(survey_data: Dict, user_profile: Dict):
     """
 
     try:
-        # Initialize OpenAI client
-        client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        
-        response = client.chat.completions.create(
+        response = await llm_gateway.openai.chat.completions.create(
             model="gpt-4",
             messages=[
                 {
@@ -1812,11 +1998,11 @@ async def generate_ai_survey_analysis(survey_data: Dict, user_profile: Dict):
             
         except json.JSONDecodeError:
             logger.warning("Failed to parse AI response as JSON, using fallback")
-            return generate_fallback_analysis(survey_data)
+            return generate_fallback_analysis(survey_data, user_profile)
             
     except Exception as e:
         logger.error(f"OpenAI API error: {str(e)}")
-        return generate_fallback_analysis(survey_data)
+        return generate_fallback_analysis(survey_data, user_profile)
 
 def get_default_value(field: str):
     """Get default values for missing fields"""
@@ -1847,7 +2033,7 @@ def parse_priority_score(score_str):
         pass
     return 50  # Default to medium priority
 
-def generate_fallback_analysis(survey_data: Dict):
+def generate_fallback_analysis(survey_data: Dict, user_profile: Optional[Dict] = None):
     """Generate basic analysis if AI fails"""
     # Basic risk assessment
     risk_score = 0
@@ -1964,7 +2150,7 @@ def generate_fallback_analysis(survey_data: Dict):
         priority_score = 25
     
     # Generate summary
-    name = user_profile.get('name', 'Patient')
+    name = (user_profile or {}).get('name', 'Patient')
     family_size = survey_data.get('familyMembers', 1)
     
     summary = f"{name} has completed an intake assessment revealing a {risk_level.lower()} risk situation. "
@@ -2111,32 +2297,22 @@ async def create_client_from_submission(submission_data: Dict[str, Any]):
         # Validate and create the client using existing function
         client_data = validate_client_data(client_data)
         
-        # Load existing clients
-        clients_data = load_clients()
-        
         # For intake submissions, always create a new entry
         # Add source and submission timestamp to distinguish intake submissions
         client_data['source'] = 'patient_intake_app'
         client_data['submittedAt'] = submission_data.get('submittedAt', datetime.now().isoformat())
         client_data['createdAt'] = datetime.now().isoformat()
         
-        # Assign an ID to the new client
-        client_data['id'] = clients_data['next_id']
-        clients_data['next_id'] += 1
-        
-        # Add the new client to the list
-        clients_data['clients'].append(client_data)
+        # Assign an ID and store the new client
+        client_data = client_repository.add_client(client_data)
+        await client_repository.aflush()
         
-        # Save the updated clients data
-        if save_clients(clients_data):
-            logger.info(f"Created new client from intake submission: {client_data['firstName']} {client_data['lastName']}")
-            return {
-                "message": "Client created successfully from intake submission", 
-                "client_id": client_data['id'],
-                "client": client_data
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save client data")
+        logger.info(f"Created new client from intake submission: {client_data['firstName']} {client_data['lastName']}")
+        return {
+            "message": "Client created successfully from intake submission", 
+            "client_id": client_data['id'],
+            "client": client_data
+        }
             
     except HTTPException as e:
         raise e
@@ -2148,10 +2324,9 @@ async def create_client_from_submission(submission_data: Dict[str, Any]):
 async def get_intake_submissions():
     """Get all intake submissions formatted for the social worker dashboard."""
     try:
-        clients_data = load_clients()
         submissions = []
         
-        for client in clients_data['clients']:
+        for client in client_repository.all():
             # Only include clients from patient intake app
             if client.get('source') == 'patient_intake_app':
                 # Format client data as submission for IntakeSubmissions component
@@ -2306,12 +2481,8 @@ async def get_client_risk_assessment(client_id: int):
         if not analytics_engine:
             raise HTTPException(status_code=503, detail="Analytics engine not available")
         
-        clients_data = load_clients()
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
+        # Find the client
+        client = client_repository.get(client_id)
         
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -2332,10 +2503,9 @@ async def get_all_risk_assessments():
         if not analytics_engine:
             raise HTTPException(status_code=503, detail="Analytics engine not available")
         
-        clients_data = load_clients()
         risk_assessments = []
         
-        for client in clients_data['clients']:
+        for client in client_repository.all():
             try:
                 risk_assessment = analytics_engine.calculate_risk_assessment_percentage(client)
                 risk_assessments.append(risk_assessment)
@@ -2481,7 +2651,7 @@ Write a professional, empathetic message that:
 Keep the message concise but warm. Sign it as "[Your Name], Social Worker" at the end."""
 
         # Call OpenAI API with new format
-        response = client.chat.completions.create(
+        response = await llm_gateway.openai.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -2505,7 +2675,7 @@ Keep the message concise but warm. Sign it as "[Your Name], Social Worker" at th
 @app.post('/test-openai')
 async def test_openai():
     try:
-        response = client.chat.completions.create(
+        response = await llm_gateway.openai.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "user", "content": "Say hello!"}
@@ -2637,42 +2807,28 @@ async def register_patient(patient_data: Dict[str, Any]):
                 }
             }
         
-        # Load existing clients
-        clients_data = load_clients()
-        
         # Check if patient already exists
-        existing_client = None
-        for client in clients_data['clients']:
-            if client.get('email', '').lower() == email.lower():
-                existing_client = client
-                break
+        existing_client = client_repository.get_by_email(email)
         
         if existing_client:
             # Update existing client if they're re-registering - CLEAR ALL RESOURCES FOR CLEAN SLATE
-            existing_client.update(client_data)
-            existing_client['updatedAt'] = datetime.now().isoformat()
+            client_data['updatedAt'] = datetime.now().isoformat()
             
             # Explicitly ensure clean slate for resources
-            existing_client['resources'] = []
-            existing_client['matchedResources'] = []
-            existing_client['dailySurveys'] = []
-            existing_client['dailySurveyCount'] = 0
-            existing_client['lastDailySurvey'] = None
+            client_data['resources'] = []
+            client_data['matchedResources'] = []
+            client_data['dailySurveys'] = []
+            client_data['dailySurveyCount'] = 0
+            client_data['lastDailySurvey'] = None
             
             client_id = existing_client['id']
+            client_repository.update_client(client_id, client_data)
             logger.info(f"🔄 Re-registering existing patient with clean slate: {first_name} {last_name}")
         else:
-            # Assign an ID to the new client
-            client_data['id'] = clients_data['next_id']
-            clients_data['next_id'] += 1
-            client_id = client_data['id']
-            
-            # Add the new client to the list
-            clients_data['clients'].append(client_data)
+            # Assign an ID and store the new client
+            client_id = client_repository.add_client(client_data)['id']
             logger.info(f"✨ Creating new patient: {first_name} {last_name}")
-        
-        # Save the updated clients data
-        save_clients(clients_data)
+        await client_repository.aflush()
         
         logger.info(f"Patient registered successfully: {first_name} {last_name} (ID: {client_id})")
         
@@ -2700,21 +2856,14 @@ async def submit_intake_survey(survey_data: Dict[str, Any]):
         if not client_id:
             raise HTTPException(status_code=400, detail="Client ID is required")
         
-        # Load existing clients
-        clients_data = load_clients()
-        
         # Find the client
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
+        client = client_repository.get(client_id)
         
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
         
         # Update client with survey data
-        client.update({
+        client = client_repository.update_client(client_id, fields={
             # Personal characteristics from survey
             'personalCharacteristics': {
                 'hispanicLatino': form_data.get('isHispanic', ''),
@@ -2765,9 +2914,7 @@ async def submit_intake_survey(survey_data: Dict[str, Any]):
                 'data': form_data
             }]
         })
-        
-        # Save updated clients data
-        save_clients(clients_data)
+        await client_repository.aflush()
         
         logger.info(f"Intake survey completed for client {client_id}")
         
@@ -2939,58 +3086,48 @@ async def submit_daily_survey(survey_data: Dict[str, Any]):
         if not client_id:
             raise HTTPException(status_code=400, detail="Client ID is required")
         
-        # Load existing clients
-        clients_data = load_clients()
-        
-        # Find the client
-        client = None
-        for c in clients_data['clients']:
-            if c['id'] == client_id:
-                client = c
-                break
-        
-        if not client:
-            raise HTTPException(status_code=404, detail="Client not found")
+        # Trends are derived from the stored surveys, so read-modify-write under the client lock
+        async with client_repository.client_lock(client_id):
+            client = client_repository.get(client_id)
         
-        # Calculate new risk score based on daily data
-        new_risk_level = calculate_daily_risk_level(daily_data)
-        new_priority_score = calculate_daily_priority_score(daily_data)
+            if not client:
+                raise HTTPException(status_code=404, detail="Client not found")
         
-        # Update client data with latest survey response
-        if 'dailySurveys' not in client:
-            client['dailySurveys'] = []
+            # Calculate new risk score based on daily data
+            new_risk_level = calculate_daily_risk_level(daily_data)
+            new_priority_score = calculate_daily_priority_score(daily_data)
         
-        # Add new daily survey entry
-        client['dailySurveys'].append({
-            'date': submitted_at,
-            'data': daily_data,
-            'riskLevel': new_risk_level,
-            'priorityScore': new_priority_score
-        })
+            # New daily survey entry
+            survey_entry = {
+                'date': submitted_at,
+                'data': daily_data,
+                'riskLevel': new_risk_level,
+                'priorityScore': new_priority_score
+            }
         
-        # Update client's current status based on latest survey
-        client.update({
-            'currentMood': daily_data.get('currentMood', ''),
-            'currentStressLevel': daily_data.get('stressLevel', ''),
-            'currentEnergyLevel': daily_data.get('energyLevel', ''),
-            'currentPhysicalHealth': daily_data.get('physicalHealth', ''),
-            'currentMentalHealth': daily_data.get('mentalHealth', ''),
-            'currentSafety': daily_data.get('safetyToday', ''),
-            'currentFinancialStress': daily_data.get('financialStress', ''),
-            'currentSocialSupport': daily_data.get('socialSupport', ''),
-            'recentNeeds': daily_data.get('needsToday', {}),
-            'lastDailySurvey': submitted_at,
-            'riskLevel': new_risk_level,
-            'priorityScore': new_priority_score,
-            'aiSummary': generate_daily_ai_summary(daily_data, client.get('firstName', 'Client')),
-            'dailySurveyCount': len(client['dailySurveys'])
-        })
+            # Update client's current status based on latest survey
+            current_status = {
+                'currentMood': daily_data.get('currentMood', ''),
+                'currentStressLevel': daily_data.get('stressLevel', ''),
+                'currentEnergyLevel': daily_data.get('energyLevel', ''),
+                'currentPhysicalHealth': daily_data.get('physicalHealth', ''),
+                'currentMentalHealth': daily_data.get('mentalHealth', ''),
+                'currentSafety': daily_data.get('safetyToday', ''),
+                'currentFinancialStress': daily_data.get('financialStress', ''),
+                'currentSocialSupport': daily_data.get('socialSupport', ''),
+                'recentNeeds': daily_data.get('needsToday', {}),
+                'lastDailySurvey': submitted_at,
+                'riskLevel': new_risk_level,
+                'priorityScore': new_priority_score,
+                'aiSummary': generate_daily_ai_summary(daily_data, client.get('firstName', 'Client'))
+            }
         
-        # Generate trend data for analytics
-        update_client_trends(client)
+            # Generate trend data for analytics
+            trends = calculate_client_trends(client.get('dailySurveys', []) + [survey_entry])
+            if trends is not None:
+                current_status['trends'] = trends
         
-        # Save updated clients data
-        save_clients(clients_data)
+            client = client_repository.append_daily_survey(client_id, survey_entry, current_status)
         
         logger.info(f"Daily survey completed for client {client_id}")
         
@@ -3217,11 +3354,10 @@ def generate_daily_ai_summary(daily_data, client_name):
     
     return summary
 
-def update_client_trends(client):
-    """Update client trends data for analytics."""
-    daily_surveys = client.get('dailySurveys', [])
+def calculate_client_trends(daily_surveys):
+    """Calculate mood and risk trends from a client's daily surveys (None if fewer than 2)."""
     if len(daily_surveys) < 2:
-        return  # Need at least 2 data points for trends
+        return None  # Need at least 2 data points for trends
     
     # Get last 7 days of data
     recent_surveys = daily_surveys[-7:]
@@ -3273,7 +3409,7 @@ def update_client_trends(client):
             'trend': 'improving' if risk_scores[-1] < risk_scores[0] else 'worsening' if risk_scores[-1] > risk_scores[0] else 'stable'
         }
     
-    client['trends'] = trends
+    return trends
 
 def generate_trend_charts(daily_surveys):
     """Generate chart-friendly data from daily surveys."""
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Regression test for the non-blocking LLM path: concurrent requests to the matcher
+and chat endpoints must overlap their (slow) LLM calls instead of queueing behind
+one another on the event loop.
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')  # server creates its OpenAI clients at import
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import rag_resource_matcher
+
+LLM_SECONDS = 0.5
+CONCURRENT_CALLS = 6
+
+
+def _slow_llm():
+    """Fake chat model: blocks the calling thread when invoked synchronously, yields when awaited."""
+    def invoke(_):
+        time.sleep(LLM_SECONDS)
+        return AIMessage(content='ok')
+
+    async def ainvoke(_):
+        await asyncio.sleep(LLM_SECONDS)
+        return AIMessage(content='ok')
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def _offline_matcher():
+    """A matcher on the local BM25 index only, so no embedding calls are made."""
+    mode = rag_resource_matcher.RETRIEVAL_MODE
+    rag_resource_matcher.RETRIEVAL_MODE = 'lexical'
+    try:
+        matcher = rag_resource_matcher.RAGResourceMatcher()
+    finally:
+        rag_resource_matcher.RETRIEVAL_MODE = mode
+    matcher.llm = _slow_llm()
+    return matcher
+
+
+async def _elapsed(calls):
+    start = time.monotonic()
+    results = await asyncio.gather(*calls)
+    return time.monotonic() - start, results
+
+
+def test_concurrent_llm_calls_overlap():
+    """N concurrent slow LLM calls take about one call's time, not N of them."""
+    import server
+
+    original_matcher, original_mode = server.rag_matcher, rag_resource_matcher.REASON_MODE
+    server.rag_matcher = _offline_matcher()
+    server.llm_gateway.chat_model = lambda *args, **kwargs: _slow_llm()
+    # Wait for the LLM reason in the response, so match_resources exercises the LLM path
+    rag_resource_matcher.REASON_MODE = 'llm'
+    try:
+        client = {'id': 'c1', 'gender': 'female', 'is_veteran': True}
+        endpoints = {
+            'match_resources': lambda: server.match_resources({'client_data': client, 'resource_type': 'housing'}),
+            'chat_followup': lambda: server.chat_followup({'message': 'Which is closest?', 'client_data': client}),
+            'help_chatbot': lambda: server.help_chatbot({'message': 'How do I add a client?'}),
+            'voice_assistant': lambda: server.voice_assistant({'message': 'Find food resources'}),
+        }
+        for name, call in endpoints.items():
+            elapsed, results = asyncio.run(_elapsed([call() for _ in range(CONCURRENT_CALLS)]))
+            assert len(results) == CONCURRENT_CALLS
+            assert elapsed < LLM_SECONDS * 2, f"{name}: {CONCURRENT_CALLS} calls took {elapsed:.2f}s"
+
+        recommendations = asyncio.run(endpoints['match_resources']())['recommendations']
+        assert recommendations['recommendation_reason'] == 'ok'
+        assert recommendations['retrieved_recommendations']
+    finally:
+        server.rag_matcher = original_matcher
+        del server.llm_gateway.chat_model  # back to the class method
+        rag_resource_matcher.REASON_MODE = original_mode
+
+
+def test_templated_reason_is_enriched_in_background():
+    """The matcher answers with a templated reason at once; the LLM reason follows and is cached."""
+    import server
+
+    original_matcher, original_mode = server.rag_matcher, rag_resource_matcher.REASON_MODE
+    server.rag_matcher = _offline_matcher()
+    rag_resource_matcher.REASON_MODE = 'template'
+    request = {'client_data': {'id': 'c2', 'gender': 'male', 'has_id': 'no'}, 'resource_type': 'food'}
+
+    async def scenario():
+        start = time.monotonic()
+        first = (await server.match_resources(request))['recommendations']
+        elapsed = time.monotonic() - start
+        assert elapsed < LLM_SECONDS, f"templated response took {elapsed:.2f}s"
+        assert first['reason_source'] == 'template'
+        assert 'food' in first['recommendation_reason'] and 'without ID' in first['recommendation_reason']
+
+        enriched = await server.get_recommendation_reason(first['enrichment_id'], wait=5)
+        assert enriched == {'id': first['enrichment_id'], 'status': 'done', 'reason': 'ok'}
+
+        again = (await server.match_resources(request))['recommendations']
+        assert again['recommendation_reason'] == 'ok' and 'enrichment_id' not in again
+        assert again['retrieved_recommendations'] == first['retrieved_recommendations']
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        server.rag_matcher = original_matcher
+        rag_resource_matcher.REASON_MODE = original_mode
+
+
+def test_enrichment_orphaned_by_a_closed_loop_fails():
+    """An enrichment whose event loop shut down before it finished is reported as failed, not pending."""
+    matcher = _offline_matcher()
+    original_mode = rag_resource_matcher.REASON_MODE
+    rag_resource_matcher.REASON_MODE = 'template'
+    client = {'id': 'c3', 'gender': 'female'}
+    try:
+        # asyncio.run cancels the still-running enrichment when its loop closes
+        first = asyncio.run(matcher.aget_recommendations(client, 'housing'))
+        enrichment_id = first['enrichment_id']
+
+        async def poll():
+            return await matcher.await_enrichment(enrichment_id, timeout=1)
+
+        result = asyncio.run(poll())
+        assert result == {'id': enrichment_id, 'status': 'failed', 'reason': None}, result
+
+        # A new loop can enrich the same match again
+        async def retry():
+            again = await matcher.aget_recommendations(client, 'housing')
+            return await matcher.await_enrichment(again['enrichment_id'], timeout=5)
+
+        assert asyncio.run(retry())['status'] == 'done'
+    finally:
+        rag_resource_matcher.REASON_MODE = original_mode
+
+
+def test_category_wording_in_query_and_prompt():
+    """The client question and the reason prompt describe each category's need in their original words."""
+    matcher = _offline_matcher()
+    documents = [rag_resource_matcher.Document(page_content='details', metadata={'resource_name': 'R'})]
+    for resource_type, query_need, prompt_need in [
+        ('food', 'food assistance, meals, pantries, or nutrition programs',
+         'food assistance, meals, pantries, or nutrition programs'),
+        ('housing', 'housing assistance, shelter, or accommodation',
+         'housing assistance, shelter, or accommodation services'),
+        ('transportation', 'transportation assistance, rides, or mobility services',
+         'transportation assistance, rides, or mobility services'),
+    ]:
+        question = matcher._build_client_question({}, resource_type)
+        assert f"Looking for {query_need}." in question
+        chain, inputs = matcher._summary_chain(question, documents, resource_type)
+        assert f"client's need for {prompt_need} and the provided" in chain.first.invoke(inputs).to_string()
+
+
+if __name__ == "__main__":
+    test_concurrent_llm_calls_overlap()
+    test_templated_reason_is_enriched_in_background()
+    test_enrichment_orphaned_by_a_closed_loop_fails()
+    test_category_wording_in_query_and_prompt()
+    print("✅ Async LLM tests passed")
+    sys.exit(0)
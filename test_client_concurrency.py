@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Stress test for the client repository's per-client locking: concurrent daily
+surveys and resource status updates, fired from several threads each running
+its own event loop (like the background form processor), must not lose updates.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')  # server creates its OpenAI clients at import
+
+from client_repository import ClientRepository
+from client_storage import JsonFileStorage
+
+CLIENTS = 6
+RESOURCES_PER_CLIENT = 8
+SURVEYS_PER_CLIENT = 40
+THREADS = 4
+
+
+def _make_repository(clients_file: Path) -> ClientRepository:
+    repository = ClientRepository(JsonFileStorage(clients_file, flush_interval_ms=20))
+    for n in range(CLIENTS):
+        client = repository.add_client({'firstName': f'Client{n}', 'email': f'client{n}@example.com'})
+        for r in range(RESOURCES_PER_CLIENT):
+            repository.add_resource(client['id'], {'resource_id': f'res-{r}', 'status': 'pending'})
+    return repository
+
+
+def _run_in_thread_loops(jobs):
+    """Split coroutine factories across THREADS threads, each with its own event loop."""
+    errors = []
+
+    def worker(chunk):
+        async def run():
+            await asyncio.gather(*(job() for job in chunk))
+        try:
+            asyncio.run(run())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(jobs[i::THREADS],)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_concurrent_writes_do_not_lose_updates():
+    """Every survey and every resource status change must survive concurrent submission."""
+    import server
+
+    clients_file = Path(tempfile.mkdtemp()) / 'clients.json'
+    repository = _make_repository(clients_file)
+    original = server.client_repository
+    server.client_repository = repository
+    try:
+        jobs = []
+        for client in repository.all():
+            client_id = client['id']
+            for i in range(SURVEYS_PER_CLIENT):
+                jobs.append(lambda client_id=client_id, i=i: server.submit_daily_survey({
+                    'clientId': client_id,
+                    'dailyData': {'currentMood': 'good', 'stressLevel': 'low'},
+                    'submittedAt': f'2026-01-01T00:00:{i:02d}'
+                }))
+            for r in range(RESOURCES_PER_CLIENT):
+                jobs.append(lambda client_id=client_id, r=r: server.update_resource_status(
+                    client_id, f'res-{r}', {'status': 'contacted', 'notes': f'note-{client_id}-{r}'}
+                ))
+
+        errors = _run_in_thread_loops(jobs)
+        assert not errors, errors
+
+        for client in repository.all():
+            assert len(client['dailySurveys']) == SURVEYS_PER_CLIENT
+            assert client['dailySurveyCount'] == SURVEYS_PER_CLIENT
+            for r in range(RESOURCES_PER_CLIENT):
+                resource = repository.find_resource(client, f'res-{r}')
+                assert resource['status'] == 'contacted'
+                assert resource['notes'] == f"note-{client['id']}-{r}"
+
+        # The coalesced flush must persist exactly what is in memory
+        repository.close()
+        with open(clients_file) as f:
+            stored = json.load(f)
+        assert stored == json.loads(json.dumps(repository.snapshot()))
+    finally:
+        server.client_repository = original
+
+
+def test_client_locks_are_independent():
+    """A held lock blocks writes to that client only."""
+    repository = _make_repository(Path(tempfile.mkdtemp()) / 'clients.json')
+    first, second = repository.all()[:2]
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_first():
+        with repository.client_lock(first['id']):
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_first)
+    holder.start()
+    held.wait(5)
+    try:
+        start = time.monotonic()
+        repository.update_client(second['id'], {'note': 'parallel'})
+        assert time.monotonic() - start < 0.5
+
+        blocked = threading.Thread(target=repository.update_client, args=(first['id'], {'note': 'serialized'}))
+        blocked.start()
+        blocked.join(0.2)
+        assert blocked.is_alive()
+    finally:
+        release.set()
+        holder.join()
+    blocked.join(5)
+    assert repository.get(first['id'])['note'] == 'serialized'
+    repository.close()
+
+
+def test_write_through_store_does_not_deadlock():
+    """With flush_interval_ms=0, concurrent writers to different clients must all finish."""
+    clients_file = Path(tempfile.mkdtemp()) / 'clients.json'
+    repository = ClientRepository(JsonFileStorage(clients_file, flush_interval_ms=0))
+    clients = [repository.add_client({'firstName': f'Client{n}'}) for n in range(8)]
+
+    def write(client_id):
+        for i in range(25):
+            repository.update_client(client_id, {'note': f'note-{i}'})
+
+    threads = [threading.Thread(target=write, args=(client['id'],), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads), "writers deadlocked"
+
+    repository.close()
+    with open(clients_file) as f:
+        stored = json.load(f)
+    assert [client['note'] for client in stored['clients']] == ['note-24'] * len(clients)
+
+
+def test_durable_writes_do_not_block_the_event_loop():
+    """/api/add-client waits for its flush without stalling other requests on the same loop."""
+    import server
+
+    class SlowFlushStorage(JsonFileStorage):
+        def flush(self):
+            time.sleep(0.5)
+            super().flush()
+
+    clients_file = Path(tempfile.mkdtemp()) / 'clients.json'
+    repository = ClientRepository(SlowFlushStorage(clients_file, flush_interval_ms=20))
+    original = server.client_repository
+    server.client_repository = repository
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        response = await server.add_client({'firstName': 'Durable', 'lastName': 'Client', 'dateOfBirth': '1980-01-01',
+                                            'phoneNumber': '555-0100'})
+        task.cancel()
+        return response, ticks
+
+    try:
+        response, ticks = asyncio.run(scenario())
+        assert ticks > 10, f"event loop stalled during the flush ({ticks} ticks)"
+        with open(clients_file) as f:
+            stored = json.load(f)
+        assert [client['id'] for client in stored['clients']] == [response['client']['id']]
+    finally:
+        server.client_repository = original
+        repository.close()
+
+
+if __name__ == "__main__":
+    test_concurrent_writes_do_not_lose_updates()
+    test_client_locks_are_independent()
+    test_write_through_store_does_not_deadlock()
+    test_durable_writes_do_not_block_the_event_loop()
+    print("✅ Client concurrency tests passed")
+    sys.exit(0)
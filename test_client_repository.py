@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Tests for the client repository's read paths: filtered, sorted and cursor-paged
+queries over the secondary indexes, and the caseload priority queue.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')  # server creates its OpenAI clients at import
+
+from client_repository import ClientRepository
+from client_storage import JsonFileStorage
+
+RISK_LEVELS = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+
+
+def _make_repository(count: int = 23) -> ClientRepository:
+    """Clients with varied risk, source, needs and scores; every seventh has no priorityScore."""
+    repository = ClientRepository(JsonFileStorage(Path(tempfile.mkdtemp()) / 'clients.json'))
+    for n in range(count):
+        client = {
+            'firstName': f'Client{n}',
+            'riskLevel': RISK_LEVELS[n % 4],
+            'source': 'patient_intake_app' if n % 3 == 0 else 'manual',
+            'createdAt': f'2026-01-{n + 1:02d}T00:00:00',
+            'needsAssessment': {'status': 'completed' if n % 2 else 'pending',
+                                'currentNeeds': {'food': {'needed': n % 5 == 0}, 'housing': {'needed': n % 2 == 0}}},
+        }
+        if n % 7:
+            client['priorityScore'] = n % 6
+        repository.add_client(client)
+    return repository
+
+
+def _names(clients):
+    return [client['firstName'] for client in clients]
+
+
+def _expected(repository, predicate):
+    return [client for client in repository.all() if predicate(client)]
+
+
+def test_filters_and_total():
+    """Filters intersect across fields, match any listed value within one, and ignore case."""
+    repository = _make_repository()
+    page, _, total = repository.query({'riskLevel': ['high']}, limit=100)
+    assert total == len(page) == len(_expected(repository, lambda c: c['riskLevel'] == 'HIGH'))
+
+    page, _, total = repository.query({'riskLevel': ['HIGH', 'critical'], 'source': ['patient_intake_app']}, limit=100)
+    expected = _expected(repository, lambda c: c['riskLevel'] in ('HIGH', 'CRITICAL')
+                         and c['source'] == 'patient_intake_app')
+    assert total == len(expected) and sorted(_names(page)) == sorted(_names(expected))
+
+    page, _, total = repository.query({'need': ['food'], 'needsAssessment.status': ['pending']}, limit=100)
+    expected = _expected(repository, lambda c: c['needsAssessment']['currentNeeds']['food']['needed']
+                         and c['needsAssessment']['status'] == 'pending')
+    assert total == len(expected) and sorted(_names(page)) == sorted(_names(expected))
+
+    # Index entries follow updates
+    repository.update_client(1, {'riskLevel': 'CRITICAL'})
+    assert 'Client0' in _names(repository.query({'riskLevel': ['critical']}, limit=100)[0])
+    assert repository.query({'riskLevel': ['nonexistent']}) == ([], None, 0)
+
+
+def _all_pages(repository, **kwargs):
+    clients, cursor, pages = [], None, 0
+    while True:
+        page, cursor, total = repository.query(cursor=cursor, **kwargs)
+        clients += page
+        pages += 1
+        if cursor is None:
+            return clients, total, pages
+
+
+def test_cursor_paging():
+    """Pages in either direction cover every match once, in order, with missing values last."""
+    repository = _make_repository()
+    for descending in (True, False):
+        clients, total, pages = _all_pages(repository, sort='priorityScore', descending=descending, limit=4)
+        assert total == repository.count() and pages == 6
+        assert sorted(_names(clients)) == sorted(_names(repository.all()))
+        scored = [client['priorityScore'] for client in clients if 'priorityScore' in client]
+        assert scored == sorted(scored, reverse=descending)
+        missing = [i for i, client in enumerate(clients) if 'priorityScore' not in client]
+        assert missing == list(range(len(clients) - len(missing), len(clients)))
+
+    # Filtered paging keeps the filtered total
+    clients, total, _ = _all_pages(repository, filters={'source': ['manual']}, sort='createdAt', limit=5)
+    assert total == len(clients) == len(_expected(repository, lambda c: c['source'] == 'manual'))
+    assert [client['createdAt'] for client in clients] == sorted((c['createdAt'] for c in clients), reverse=True)
+
+    # A client changed between pages is not repeated on the next one
+    first, cursor, _ = repository.query(sort='createdAt', limit=3)
+    repository.update_client(first[0]['id'], {'note': 'seen'})
+    second, _, _ = repository.query(sort='createdAt', limit=3, cursor=cursor)
+    assert not set(_names(first)) & set(_names(second))
+
+
+def test_query_endpoint_round_trips_the_cursor():
+    """GET /api/clients hands out an opaque nextCursor that continues where the page ended."""
+    import server
+
+    repository = _make_repository()
+    original = server.client_repository
+    server.client_repository = repository
+    try:
+        async def pages():
+            first = await server.query_clients(riskLevel='LOW,MEDIUM', limit=3)
+            second = await server.query_clients(riskLevel='LOW,MEDIUM', limit=3, cursor=first['nextCursor'])
+            return first, second
+
+        first, second = asyncio.run(pages())
+        assert first['total'] == second['total'] == len(_expected(repository, lambda c: c['riskLevel'] in ('LOW', 'MEDIUM')))
+        expected = _names(repository.query({'riskLevel': ['low', 'medium']}, limit=6)[0])
+        assert _names(first['clients'] + second['clients']) == expected
+    finally:
+        server.client_repository = original
+
+
+def test_caseload_priority_order():
+    """Risk level first, then priority score, then the most recent daily survey; the queue follows every write."""
+    repository = ClientRepository(JsonFileStorage(Path(tempfile.mkdtemp()) / 'clients.json'))
+    for name, risk, score, survey in [
+        ('low-high-score', 'LOW', 9, '2026-01-05'),
+        ('critical', 'critical', 1, None),
+        ('high-older', 'HIGH', 5, '2026-01-01'),
+        ('high-newer', 'HIGH', 5, '2026-01-03'),
+        ('high-top-score', 'HIGH', 8, None),
+        ('unscored', None, None, None),
+    ]:
+        repository.add_client({'firstName': name, 'riskLevel': risk, 'priorityScore': score, 'lastDailySurvey': survey})
+    assert _names(repository.top_priority(10)) == ['critical', 'high-top-score', 'high-newer', 'high-older',
+                                                    'low-high-score', 'unscored']
+    assert _names(repository.top_priority(2)) == ['critical', 'high-top-score']
+
+    by_name = {client['firstName']: client['id'] for client in repository.all()}
+    repository.update_client(by_name['low-high-score'], {'riskLevel': 'CRITICAL'})
+    repository.append_daily_survey(by_name['high-older'], {'currentMood': 'bad'}, fields={'lastDailySurvey': '2026-01-09'})
+    repository.delete_client(by_name['critical'])
+    assert _names(repository.top_priority(4)) == ['low-high-score', 'high-top-score', 'high-older', 'high-newer']
+
+
+def test_caseload_endpoint():
+    """GET /api/caseload/top serves the queue's head and the total caseload size."""
+    import server
+
+    repository = _make_repository()
+    original = server.client_repository
+    server.client_repository = repository
+    try:
+        top = asyncio.run(server.get_caseload_top(n=3))
+        assert top['count'] == 3 and top['totalClients'] == repository.count()
+        assert [client['riskLevel'] for client in top['clients']] == ['CRITICAL'] * 3
+        scores = [client['priorityScore'] for client in top['clients']]
+        assert scores == sorted(scores, reverse=True)
+
+        repository.update_client(top['clients'][0]['id'], {'riskLevel': 'LOW'})
+        after = asyncio.run(server.get_caseload_top(n=3))
+        assert top['clients'][0]['id'] not in [client['id'] for client in after['clients']]
+    finally:
+        server.client_repository = original
+
+
+if __name__ == "__main__":
+    test_filters_and_total()
+    test_cursor_paging()
+    test_query_endpoint_round_trips_the_cursor()
+    test_caseload_priority_order()
+    test_caseload_endpoint()
+    print("✅ Client repository tests passed")
+    sys.exit(0)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Round-trip tests for the client storage backends: every kind of mutation written
+through a ClientRepository must come back identically when the store is reopened.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from client_repository import ClientRepository
+from client_storage import JournaledJsonStorage, JsonFileStorage, JsonLinesClientStorage, SQLiteClientStorage
+
+BACKENDS = {
+    'json': lambda directory: JsonFileStorage(directory / 'clients.json', flush_interval_ms=0),
+    'journal': lambda directory: JournaledJsonStorage(directory / 'clients.json', directory / 'clients.journal.jsonl'),
+    'jsonl': lambda directory: JsonLinesClientStorage(directory / 'clients.jsonl'),
+    'sqlite': lambda directory: SQLiteClientStorage(directory / 'clients.db'),
+}
+
+
+def _exercise(repository: ClientRepository) -> None:
+    """One of every op the repository persists."""
+    first = repository.add_client({'firstName': 'Ada', 'email': 'ada@example.com', 'riskLevel': 'high'})
+    second = repository.add_client({'firstName': 'Ben', 'email': 'ben@example.com'})
+    third = repository.add_client({'firstName': 'Cy', 'email': 'cy@example.com'})
+    for n in range(3):
+        repository.add_resource(first['id'], {'resource_id': f'res-{n}', 'status': 'pending'},
+                                fields={'lastUpdated': f'2026-01-0{n + 1}'})
+    repository.update_resource(first['id'], 'res-1', {'status': 'contacted', 'notes': 'called'})
+    for n in range(2):
+        repository.append_daily_survey(second['id'], {'currentMood': 'good', 'day': n},
+                                       fields={'lastDailySurvey': f'2026-01-0{n + 1}'})
+    repository.update_needs_assessment(second['id'], {'status': 'completed'}, response={'food': True})
+    repository.update_client(first['id'], {'email': 'ada@new.example.com', 'riskLevel': 'low'})
+    # Replacing a whole child collection through update_client
+    repository.update_client(second['id'], {'resources': [{'resource_id': 'res-9', 'status': 'pending'}]})
+    repository.add_resource(third['id'], {'resource_id': 'res-0', 'status': 'pending'})
+    repository.delete_client(third['id'])
+
+
+def _stored(repository: ClientRepository):
+    return json.loads(json.dumps(repository.snapshot()))
+
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_round_trip(backend):
+    """Everything written comes back after a clean close and reopen, and deleted ids are not reused."""
+    directory = Path(tempfile.mkdtemp())
+    repository = ClientRepository(BACKENDS[backend](directory))
+    _exercise(repository)
+    expected = _stored(repository)
+    repository.close()
+
+    reopened = ClientRepository(BACKENDS[backend](directory))
+    try:
+        assert _stored(reopened) == expected
+        assert reopened.get_by_email('ada@new.example.com')['firstName'] == 'Ada'
+        assert reopened.get_by_email('ada@example.com') is None
+        assert reopened.add_client({'firstName': 'Dee'})['id'] == 4
+    finally:
+        reopened.close()
+
+
+def test_sqlite_child_tables():
+    """Resources, surveys and assessment responses are rows of their own tables, updated in place."""
+    directory = Path(tempfile.mkdtemp())
+    repository = ClientRepository(BACKENDS['sqlite'](directory))
+    _exercise(repository)
+    repository.close()
+
+    conn = sqlite3.connect(str(directory / 'clients.db'))
+    try:
+        resources = conn.execute('SELECT client_id, position, resource_id, data FROM client_resources '
+                                 'ORDER BY client_id, position').fetchall()
+        assert [(client_id, position, resource_id) for client_id, position, resource_id, _ in resources] == \
+            [(1, 0, 'res-0'), (1, 1, 'res-1'), (1, 2, 'res-2'), (2, 0, 'res-9')]
+        assert json.loads(resources[1][3]) == {'resource_id': 'res-1', 'status': 'contacted', 'notes': 'called'}
+        assert conn.execute('SELECT COUNT(*) FROM daily_surveys WHERE client_id = 2').fetchone() == (2,)
+        assert conn.execute('SELECT data FROM needs_assessment_responses').fetchall() == [('{"food": true}',)]
+        # The client row keeps empty placeholders, not copies of its children
+        row = json.loads(conn.execute('SELECT data FROM clients WHERE id = 1').fetchone()[0])
+        assert row['resources'] == [] and row['riskLevel'] == 'low'
+        # Deleting a client cascades to its child rows
+        assert conn.execute('SELECT COUNT(*) FROM client_resources WHERE client_id = 3').fetchone() == (0,)
+    finally:
+        conn.close()
+
+
+def _journal_files(directory: Path):
+    return directory / 'clients.json', directory / 'clients.journal.jsonl'
+
+
+def test_journal_replay_after_a_crash():
+    """Without a close or compaction, reopening replays the journal; a torn last line is dropped."""
+    directory = Path(tempfile.mkdtemp())
+    repository = ClientRepository(BACKENDS['journal'](directory))
+    _exercise(repository)
+    expected = _stored(repository)
+    repository.storage.flush()
+    _, journal = _journal_files(directory)
+    with open(journal, 'a') as f:
+        f.write('{"op": "add_client", "client": {"id": 9')
+
+    reopened = ClientRepository(BACKENDS['journal'](directory))
+    try:
+        assert _stored(reopened) == expected
+        assert journal.read_text().endswith('\n')
+        # New entries after the torn line are replayed too
+        reopened.update_client(1, {'note': 'after the crash'})
+        reopened.storage.flush()
+        assert ClientRepository(BACKENDS['journal'](directory)).get(1)['note'] == 'after the crash'
+    finally:
+        reopened.close()
+
+
+def test_journal_compaction_and_interrupted_rotation():
+    """Compaction folds the journal into the snapshot; a crash either side of it neither loses nor repeats ops."""
+    directory = Path(tempfile.mkdtemp())
+    snapshot_file, journal = _journal_files(directory)
+    repository = ClientRepository(JournaledJsonStorage(snapshot_file, journal, compact_bytes=1000))
+    _exercise(repository)
+    # The journal outgrew compact_bytes, so a background compaction has run
+    repository.storage._compactor.join()
+    assert json.loads(snapshot_file.read_text())['journal_seq'] > 0
+    assert not repository.storage.rotated_file.exists()
+    repository.storage.compact()
+    assert journal.read_text() == ''
+    assert _stored(ClientRepository(BACKENDS['journal'](directory))) == _stored(repository)
+
+    # Crash after the snapshot was written but before the rotated journal was removed:
+    # its entries are already in the snapshot and must not be applied again
+    repository.append_daily_survey(2, {'currentMood': 'ok'})
+    expected = _stored(repository)
+    repository.storage.flush()
+    rotated = repository.storage.rotated_file
+    rotated.write_text(json.dumps({'op': 'append_daily_survey', 'client_id': 2, 'survey': {'currentMood': 'repeated'},
+                                   'fields': {}, 'seq': 1}) + '\n')
+    assert _stored(ClientRepository(BACKENDS['journal'](directory))) == expected
+
+    # Crash after rotating the journal but before the new snapshot: the rotated journal is replayed
+    rotated.unlink()
+    os.replace(journal, rotated)
+    journal.touch()
+    assert _stored(ClientRepository(BACKENDS['journal'](directory))) == expected
+    repository.close()
+
+
+def test_jsonl_recovery_without_the_sidecar_index():
+    """Lines past the sidecar index, or a missing sidecar, are recovered by scanning; tombstones hide deletes."""
+    directory = Path(tempfile.mkdtemp())
+    jsonl_file = directory / 'clients.jsonl'
+    repository = ClientRepository(BACKENDS['jsonl'](directory))
+    _exercise(repository)
+    expected = _stored(repository)
+    repository.close()
+    index_file = repository.storage.index_file
+    assert json.loads(index_file.read_text())['size'] == jsonl_file.stat().st_size
+
+    # Unclosed store: its writes are past what the sidecar covers, and the last line is torn
+    repository = ClientRepository(BACKENDS['jsonl'](directory))
+    repository.update_client(1, {'note': 'unindexed'})
+    repository.storage.flush()
+    expected['clients'][0]['note'] = 'unindexed'
+    with open(jsonl_file, 'ab') as f:
+        f.write(b'{"id": 7, "firstName": "Torn')
+    reopened = ClientRepository(BACKENDS['jsonl'](directory))
+    assert _stored(reopened) == expected
+    assert reopened.get(3) is None and reopened.get(7) is None
+    reopened.close()
+
+    index_file.unlink()
+    rebuilt = ClientRepository(BACKENDS['jsonl'](directory))
+    try:
+        assert _stored(rebuilt) == expected
+        assert index_file.exists() is False
+        assert rebuilt.add_client({'firstName': 'Dee'})['id'] == 4
+    finally:
+        rebuilt.close()
+    assert index_file.exists()
+
+
+def test_jsonl_compaction():
+    """Once superseded lines outweigh live ones the file is rewritten with one line per client."""
+    directory = Path(tempfile.mkdtemp())
+    jsonl_file = directory / 'clients.jsonl'
+    repository = ClientRepository(JsonLinesClientStorage(jsonl_file, compact_bytes=2000))
+    _exercise(repository)
+    for n in range(20):
+        repository.update_client(1, {'note': f'revision {n}'})
+    repository.storage._compactor.join()
+    repository.storage.compact()
+    expected = _stored(repository)
+    assert len(jsonl_file.read_text().splitlines()) == len(expected['clients'])
+    repository.update_client(2, {'note': 'after compaction'})
+    expected = _stored(repository)
+    repository.close()
+
+    reopened = ClientRepository(JsonLinesClientStorage(jsonl_file))
+    try:
+        assert _stored(reopened) == expected
+    finally:
+        reopened.close()
+
+
+if __name__ == "__main__":
+    for name in BACKENDS:
+        test_round_trip(name)
+    test_sqlite_child_tables()
+    test_journal_replay_after_a_crash()
+    test_journal_compaction_and_interrupted_rotation()
+    test_jsonl_recovery_without_the_sidecar_index()
+    test_jsonl_compaction()
+    print("✅ Client storage tests passed")
+    sys.exit(0)
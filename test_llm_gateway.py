@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM gateway transport: retries of transient failures, per-model
+concurrency limits, the overall deadline and token metrics, against a fake API.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import openai
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')  # server creates its OpenAI clients at import
+
+from llm_gateway import LLMGateway
+
+COMPLETION = {
+    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'ok'}, 'finish_reason': 'stop'}],
+    'usage': {'prompt_tokens': 12, 'completion_tokens': 3, 'total_tokens': 15},
+    'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4o-mini',
+}
+
+
+def _gateway(handler, **kwargs) -> LLMGateway:
+    """A gateway whose async and sync transports answer with handler instead of the network."""
+    return LLMGateway(api_key='sk-test', transport=httpx.MockTransport(handler),
+                      sync_transport=httpx.MockTransport(handler), **kwargs)
+
+
+async def _chat(gateway: LLMGateway, model: str = 'gpt-4o-mini') -> str:
+    response = await gateway.openai.chat.completions.create(
+        model=model, messages=[{'role': 'user', 'content': 'hi'}]
+    )
+    return response.choices[0].message.content
+
+
+def test_transient_errors_are_retried():
+    """429 and 503 responses are retried (honoring Retry-After) and counted per model."""
+    statuses = [429, 503]
+
+    def handler(request):
+        if statuses:
+            return httpx.Response(statuses.pop(0), headers={'retry-after': '0'}, json={'error': {}})
+        return httpx.Response(200, json=COMPLETION)
+
+    gateway = _gateway(handler)
+    assert asyncio.run(_chat(gateway)) == 'ok'
+    stats = gateway.metrics.snapshot()['gpt-4o-mini']
+    assert stats['calls'] == 1 and stats['retries'] == 2 and stats['errors'] == 0
+    assert (stats['prompt_tokens'], stats['completion_tokens']) == (12, 3)
+
+    # Client errors are not retried, on the threaded client either
+    statuses.append(400)
+    try:
+        gateway.openai_sync.chat.completions.create(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'hi'}])
+        raise AssertionError('400 should have been raised')
+    except openai.BadRequestError:
+        pass
+    stats = gateway.metrics.snapshot()['gpt-4o-mini']
+    assert stats['calls'] == 2 and stats['retries'] == 2 and stats['errors'] == 1
+
+
+def test_concurrency_is_limited_per_model():
+    """No more than the model's limit is in flight; other models are not held back."""
+    active = {'gpt-4': 0, 'gpt-4o-mini': 0}
+    peak = dict(active)
+
+    async def handler(request):
+        model = json.loads(request.content)['model']
+        active[model] += 1
+        peak[model] = max(peak[model], active[model])
+        await asyncio.sleep(0.05)
+        active[model] -= 1
+        return httpx.Response(200, json=COMPLETION)
+
+    gateway = LLMGateway(api_key='sk-test', transport=httpx.MockTransport(handler),
+                         concurrency=8, model_concurrency={'gpt-4': 2})
+
+    async def scenario():
+        await asyncio.gather(*[_chat(gateway, 'gpt-4') for _ in range(6)],
+                             *[_chat(gateway, 'gpt-4o-mini') for _ in range(6)])
+
+    asyncio.run(scenario())
+    assert peak['gpt-4'] == 2, peak
+    assert peak['gpt-4o-mini'] == 6, peak
+    assert gateway.metrics.snapshot()['gpt-4']['in_flight'] == 0
+
+
+def test_deadline_bounds_the_whole_call():
+    """A hanging API fails the call once the deadline passes, and it is recorded as a timeout."""
+    async def handler(request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, json=COMPLETION)
+
+    gateway = LLMGateway(api_key='sk-test', transport=httpx.MockTransport(handler), deadline=0.2)
+    start = time.monotonic()
+    try:
+        asyncio.run(_chat(gateway))
+        raise AssertionError('call should have timed out')
+    except Exception as e:
+        assert 'Timeout' in type(e).__name__, repr(e)
+    assert time.monotonic() - start < 1.5
+    assert gateway.metrics.snapshot()['gpt-4o-mini']['timeouts'] == 1
+
+
+def test_each_event_loop_gets_its_own_client():
+    """Calls from different loops (and threads) use separate pooled clients; aclose() closes them."""
+    gateway = _gateway(lambda request: httpx.Response(200, json=COMPLETION))
+
+    async def call():
+        assert await _chat(gateway) == 'ok'
+        return gateway.async_client()
+
+    first, second = asyncio.run(call()), asyncio.run(call())
+    assert first is not second
+    threaded = []
+    thread = threading.Thread(target=lambda: threaded.append(asyncio.run(call())))
+    thread.start()
+    thread.join()
+    assert threaded and threaded[0] not in (first, second)
+
+    async def shutdown():
+        client = gateway.async_client()
+        await gateway.aclose()
+        return client
+
+    assert asyncio.run(shutdown()).is_closed
+    assert gateway.metrics.snapshot()['gpt-4o-mini']['calls'] == 3
+
+
+def test_survey_analysis_falls_back_on_gateway_errors():
+    """/api/analyze-survey answers with the rule-based analysis when the model call fails."""
+    import server
+
+    survey = {'surveyData': {'unableToGet': {'food': True}}, 'userProfile': {'name': 'Test'}}
+    expected = server.generate_fallback_analysis(survey['surveyData'])
+
+    async def analyze():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            response = await client.post('/api/analyze-survey', json=survey)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    original = server.llm_gateway
+    server.llm_gateway = _gateway(lambda request: httpx.Response(503, json={'error': {}}), max_retries=0)
+    try:
+        assert asyncio.run(analyze()) == expected
+        # Without an API key the model is not called at all
+        server.llm_gateway.api_key = ''
+        os.environ.pop('OPEN_API_KEY', None)
+        key = os.environ.pop('OPENAI_API_KEY', None)
+        try:
+            assert asyncio.run(analyze()) == expected
+            assert 'gpt-4' in server.llm_gateway.metrics.snapshot()
+            assert server.llm_gateway.metrics.snapshot()['gpt-4']['calls'] == 1
+        finally:
+            if key is not None:
+                os.environ['OPENAI_API_KEY'] = key
+    finally:
+        server.llm_gateway = original
+
+
+NO_KEY_SERVER = """
+import asyncio, httpx, server
+
+async def main():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url='http://test') as client:
+        health = (await client.get('/health')).json()
+        assert health['rag_matcher']['status'] == 'degraded', health
+        assert 'OPENAI_API_KEY' in health['rag_matcher']['error'], health
+        response = await client.post('/api/match-resources',
+                                     json={'client_data': {'id': 'c1'}, 'resource_type': 'food'})
+        assert response.status_code == 200, response.text
+        recommendations = response.json()['recommendations']
+        assert recommendations['retrieval'] == 'lexical' and recommendations['retrieved_recommendations']
+        assert 'enrichment_id' not in recommendations
+
+asyncio.run(main())
+"""
+
+
+def test_server_starts_without_an_api_key():
+    """Without an OpenAI key the server imports, reports the key in /health and serves BM25 matches."""
+    env = {key: value for key, value in os.environ.items() if key not in ('OPENAI_API_KEY', 'OPEN_API_KEY')}
+    result = subprocess.run([sys.executable, '-c', NO_KEY_SERVER], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+if __name__ == "__main__":
+    test_transient_errors_are_retried()
+    test_concurrency_is_limited_per_model()
+    test_deadline_bounds_the_whole_call()
+    test_each_event_loop_gets_its_own_client()
+    test_survey_analysis_falls_back_on_gateway_errors()
+    test_server_starts_without_an_api_key()
+    print("✅ LLM gateway tests passed")
+    sys.exit(0)
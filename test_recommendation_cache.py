@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for the finished-recommendation cache: answers are keyed by the catalog
+version they were retrieved from, so a catalog change while a match is in flight
+never leaves old resources cached under the new version. Direct rewrites of
+the catalog file are picked up without blocking the request that notices them.
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import rag_resource_matcher
+
+CLIENT = {'id': 'c1', 'gender': 'female'}
+
+
+def _offline_matcher(catalog: Path):
+    """A BM25-only matcher over a private copy of the catalog."""
+    mode = rag_resource_matcher.RETRIEVAL_MODE
+    rag_resource_matcher.RETRIEVAL_MODE = 'lexical'
+    rag_resource_matcher.RESOURCES_FILE = catalog
+    try:
+        return rag_resource_matcher.RAGResourceMatcher()
+    finally:
+        rag_resource_matcher.RETRIEVAL_MODE = mode
+
+
+def _rewrite_catalog(catalog: Path) -> None:
+    resources = json.loads(catalog.read_text())
+    catalog.write_text(json.dumps(resources[1:]))
+
+
+def test_catalog_change_during_a_match_is_not_cached_as_current():
+    """A reason finished after the catalog changed is stored under the version it was retrieved from."""
+    original_file = rag_resource_matcher.RESOURCES_FILE
+    catalog = Path(tempfile.mkdtemp()) / 'structured_resources.json'
+    shutil.copy(original_file, catalog)
+    try:
+        matcher = _offline_matcher(catalog)
+        match = matcher._start_match(CLIENT, 'housing')
+        matcher._retrieve_match(match)
+        matcher._remember(match, 'current reason')
+        assert matcher._start_match(CLIENT, 'housing')['reason'] == 'current reason'
+
+        match = matcher._start_match(dict(CLIENT, id='c2', gender='male'), 'housing')
+        matcher._retrieve_match(match)
+        _rewrite_catalog(catalog)
+        assert matcher._refresh_catalog()
+        matcher._remember(match, 'stale reason')
+        assert 'reason' not in matcher._start_match(dict(CLIENT, id='c2', gender='male'), 'housing')
+    finally:
+        rag_resource_matcher.RESOURCES_FILE = original_file
+
+
+def test_enrichment_spanning_a_catalog_change_keeps_its_version():
+    """A background reason started before a catalog rewrite does not answer requests on the new catalog."""
+    original_file, original_mode = rag_resource_matcher.RESOURCES_FILE, rag_resource_matcher.REASON_MODE
+    catalog = Path(tempfile.mkdtemp()) / 'structured_resources.json'
+    shutil.copy(original_file, catalog)
+    rag_resource_matcher.REASON_MODE = 'template'
+    release = None
+
+    async def ainvoke(_):
+        await release.wait()
+        return AIMessage(content='old catalog reason')
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        first = await matcher.aget_recommendations(CLIENT, 'housing')
+        _rewrite_catalog(catalog)
+        assert matcher._refresh_catalog()
+        release.set()
+        assert (await matcher.await_enrichment(first['enrichment_id'], timeout=5))['status'] == 'done'
+
+        again = await matcher.aget_recommendations(CLIENT, 'housing')
+        assert again['reason_source'] == 'template'
+        assert again['enrichment_id'] != first['enrichment_id']
+
+    try:
+        matcher = _offline_matcher(catalog)
+        matcher.llm = RunnableLambda(lambda _: AIMessage(content='unused'), afunc=ainvoke)
+        asyncio.run(scenario())
+    finally:
+        rag_resource_matcher.RESOURCES_FILE = original_file
+        rag_resource_matcher.REASON_MODE = original_mode
+
+
+def test_catalog_rewrite_is_refreshed_off_the_request_path():
+    """A request that notices a changed file only stats it; the re-read and re-index run in the background."""
+    original_file = rag_resource_matcher.RESOURCES_FILE
+    catalog = Path(tempfile.mkdtemp()) / 'structured_resources.json'
+    shutil.copy(original_file, catalog)
+    release, refreshed, calls = threading.Event(), threading.Event(), []
+    try:
+        matcher = _offline_matcher(catalog)
+        refresh = matcher._refresh_catalog
+
+        def slow_refresh():
+            calls.append(1)
+            release.wait(5)
+            try:
+                return refresh()
+            finally:
+                refreshed.set()
+
+        matcher._refresh_catalog = slow_refresh
+        version = matcher.catalog_version
+        _rewrite_catalog(catalog)
+        matcher._catalog_checked = 0.0
+
+        started = time.monotonic()
+        match = matcher._start_match(CLIENT, 'housing')
+        assert time.monotonic() - started < 1
+        assert match['cache_key'][-1] == version
+        # A second request while the refresh is running does not start another one
+        matcher._catalog_checked = 0.0
+        matcher._start_match(CLIENT, 'housing')
+
+        release.set()
+        assert refreshed.wait(5)
+        deadline = time.monotonic() + 5
+        while matcher._catalog_check_lock.locked() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert matcher.catalog_version != version and len(calls) == 1
+        assert matcher._start_match(CLIENT, 'housing')['cache_key'][-1] == matcher.catalog_version
+    finally:
+        rag_resource_matcher.RESOURCES_FILE = original_file
+
+
+if __name__ == "__main__":
+    test_catalog_change_during_a_match_is_not_cached_as_current()
+    test_enrichment_spanning_a_catalog_change_keeps_its_version()
+    test_catalog_rewrite_is_refreshed_off_the_request_path()
+    print("✅ Recommendation cache tests passed")
+    sys.exit(0)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for hard eligibility constraints: age limits parsed from age_group, and the
+Chroma index applying client constraints before ranking rather than after.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from rag_resource_matcher import ChromaVectorIndex, resource_eligibility
+
+
+def test_age_limits():
+    """'N or older' is a minimum age; an 'or' offering another way in is no limit."""
+    cases = {
+        '18 or older': (18, 200),
+        '19 or older': (19, 200),
+        '62+': (62, 200),
+        '18-25': (18, 25),
+        '18–25 or women with children': (0, 200),
+        'All ages': (0, 200),
+        'Adults': (18, 200),
+    }
+    for age_group, bounds in cases.items():
+        assert resource_eligibility({'age_group': age_group})['age'] == bounds, age_group
+
+
+def test_chroma_filters_before_ranking():
+    """With most chunks ineligible, Chroma still returns k hits, all of them eligible."""
+    resources = [{'resource_name': f'Veterans program {n}', 'category': 'housing', 'target_population': 'Veterans'}
+                 for n in range(40)]
+    resources += [{'resource_name': f'Open program {n}', 'category': 'housing', 'age_group': '18 or older'}
+                  for n in range(5)]
+    resources += [{'resource_name': 'Youth program', 'category': 'housing', 'age_group': '18-24'}]
+    index = ChromaVectorIndex(DeterministicFakeEmbedding(size=32), Path(tempfile.mkdtemp()))
+    try:
+        index.upsert([f'r{n}:0' for n in range(len(resources))],
+                     [Document(page_content=resource['resource_name'], metadata=resource) for resource in resources])
+        hits = index.search_hits(index.embeddings.embed_documents(['housing help']), 5, 'housing',
+                                 {'veteran': False, 'age': 30})[0]
+        assert sorted(hit.document.metadata['resource_name'] for hit in hits) == [f'Open program {n}' for n in range(5)]
+        assert all(not key.startswith('eligibility_') for hit in hits for key in hit.document.metadata)
+
+        documents = index.search('housing help', 3, 'housing', {'age': 20})
+        assert len(documents) == 3
+    finally:
+        index.reset()
+
+
+if __name__ == "__main__":
+    test_age_limits()
+    test_chroma_filters_before_ranking()
+    print("✅ Resource eligibility tests passed")
+    sys.exit(0)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Tests for how retrieved resources are ranked: BM25 over the indexed resource
+fields, reciprocal rank fusion of BM25 with vector hits, chunk aggregation and
+MMR diversification. Runs without an OpenAI key or network access.
+"""
+import os
+import sys
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import rag_resource_matcher
+from rag_resource_matcher import (LexicalIndex, RAGResourceMatcher, VectorHit, VectorIndex, aggregate_hits,
+                                  mmr_select)
+
+CATALOG = [
+    {'resource_name': 'Eastside Pantry', 'category': 'food', 'services': 'Weekly pantry boxes'},
+    {'resource_name': 'Night Beds', 'category': 'housing', 'eligibility': 'Homeless adults'},
+    {'resource_name': 'Newcomer Center', 'category': 'housing', 'target_population': 'Refugees'},
+    {'resource_name': 'Weekend Hall', 'category': 'food', 'hours': 'Weekends only'},
+    {'resource_name': 'Veterans Village', 'category': 'housing', 'target_population': 'Veterans',
+     'services': 'Transitional housing for veterans'},
+    {'resource_name': 'County Rent Help', 'category': 'housing', 'services': 'Rent deposits and utility bills',
+     'eligibility': 'Veterans and families'},
+    {'resource_name': 'Youth Rooms', 'category': 'housing', 'age_group': '18-24',
+     'services': 'Rooms for young adults leaving foster care, veterans welcome'},
+]
+
+
+def _names(documents):
+    return [doc.metadata['resource_name'] for doc in documents]
+
+
+def _without_api_key():
+    return {key: os.environ.pop(key) for key in ('OPENAI_API_KEY', 'OPEN_API_KEY') if key in os.environ}
+
+
+def test_bm25_ranks_indexed_fields():
+    """Terms in services, eligibility and target_population are found; the best-matching resource leads."""
+    index = LexicalIndex(CATALOG)
+    assert _names(index.search('pantry', 5)) == ['Eastside Pantry']
+    assert _names(index.search('homeless', 5)) == ['Night Beds']
+    assert _names(index.search('refugees', 5)) == ['Newcomer Center']
+    # hours is not an indexed field
+    assert index.search('weekends only', 5) == []
+
+    ranked = _names(index.search('veterans', 5))
+    assert ranked[0] == 'Veterans Village' and set(ranked) == {'Veterans Village', 'County Rent Help', 'Youth Rooms'}
+    assert _names(index.search('veterans', 5, category='food')) == []
+    assert 'Youth Rooms' not in _names(index.search('veterans', 5, constraints={'age': 40}))
+
+
+class _FakeVectorIndex(VectorIndex):
+    """Answers every query with a fixed list of chunk hits."""
+
+    name = 'fake'
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.directory = None
+
+    def search_hits(self, vectors, k, category=None, constraints=None):
+        return [self.hits[:k] for _ in vectors]
+
+
+def test_hybrid_fusion_order_without_an_api_key():
+    """The lexical matcher builds no OpenAI client; hybrid results follow reciprocal rank fusion."""
+    removed = _without_api_key()
+    mode, weight = rag_resource_matcher.RETRIEVAL_MODE, rag_resource_matcher.MMR_LAMBDA
+    rag_resource_matcher.RETRIEVAL_MODE = 'lexical'
+    try:
+        matcher = RAGResourceMatcher()
+        assert matcher.llm is None and matcher.embeddings is None
+        assert matcher.status_report()['llm'] is False
+
+        resources = {name: {'resource_name': name, 'category': 'housing', 'services': services} for name, services in
+                     [('X', 'case management'), ('Y', 'legal aid'), ('Z', 'shelter shelter beds'),
+                      ('W', 'shelter referrals and meals and showers')]}
+        matcher.lexical = LexicalIndex(list(resources.values()))
+        vector = np.ones(4, dtype=np.float32) / 2
+        matcher.index = _FakeVectorIndex([VectorHit(Document(page_content=name, metadata=resources[name]), score, vector)
+                                          for name, score in [('X', 0.9), ('Y', 0.8), ('Z', 0.7)]])
+        matcher.embeddings = DeterministicFakeEmbedding(size=4)
+        rag_resource_matcher.RETRIEVAL_MODE, rag_resource_matcher.MMR_LAMBDA = 'hybrid', 1.0
+
+        # Vector ranks X, Y, Z and BM25 ranks Z, W: Z is in both lists, X and Y beat W on rank alone
+        documents, retrieval = matcher._retrieve('shelter', 'housing')
+        assert retrieval == 'hybrid'
+        assert _names(documents) == ['Z', 'X', 'Y', 'W']
+    finally:
+        rag_resource_matcher.RETRIEVAL_MODE, rag_resource_matcher.MMR_LAMBDA = mode, weight
+        os.environ.update(removed)
+
+
+def _unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _hit(resource: str, score: float, vector) -> VectorHit:
+    return VectorHit(Document(page_content=f'{resource} chunk', metadata={'resource_name': resource}), score, vector)
+
+
+def test_aggregate_hits_max_and_sum():
+    """Chunks collapse to one candidate per resource, scored by the best chunk or by all of them."""
+    hits = [_hit('Single', 0.8, _unit(1, 0, 0)), _hit('Many', 0.6, _unit(0, 1, 0)), _hit('Many', 0.5, _unit(0, 0, 1))]
+    key = lambda doc: doc.metadata['resource_name']
+
+    best = aggregate_hits(hits, key, 'max')
+    assert [(key(c.document), round(c.score, 4)) for c in best] == [('Single', 0.8), ('Many', 0.6)]
+    assert best[1].document.page_content == 'Many chunk'
+    # The resource vector is the normalized mean of its chunk vectors
+    assert np.allclose(best[1].vector, _unit(0, 1, 1))
+
+    summed = aggregate_hits(hits, key, 'sum')
+    assert [(key(c.document), round(c.score, 4)) for c in summed] == [('Many', 1.1), ('Single', 0.8)]
+
+
+def test_mmr_select():
+    """lambda=1 is pure relevance order; below that a near-duplicate of a picked resource is pushed down."""
+    relevance = np.array([0.9, 0.85, 0.6, 0.3], dtype=np.float32)
+    vectors = np.stack([_unit(1, 0, 0), _unit(1, 0.05, 0), _unit(0, 1, 0), _unit(0, 0, 1)])
+
+    assert mmr_select(relevance, vectors, 4, weight=1.0) == [0, 1, 2, 3]
+    # Candidate 1 is nearly a copy of candidate 0, so the less relevant but distinct 2 goes ahead of it
+    assert mmr_select(relevance, vectors, 2, weight=0.7) == [0, 2]
+    assert mmr_select(relevance, vectors, 4, weight=0.7) == [0, 2, 1, 3]
+    # Candidates without a vector are similar to nothing
+    assert mmr_select(relevance, np.zeros((4, 3), dtype=np.float32), 4, weight=0.5) == [0, 1, 2, 3]
+    assert mmr_select(relevance, vectors, 0) == [] and mmr_select(relevance[:2], vectors[:2], 5) == [0, 1]
+
+
+if __name__ == "__main__":
+    test_bm25_ranks_indexed_fields()
+    test_hybrid_fusion_order_without_an_api_key()
+    test_aggregate_hits_max_and_sum()
+    test_mmr_select()
+    print("✅ Resource ranking tests passed")
+    sys.exit(0)
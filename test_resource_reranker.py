@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the feature re-ranker: a client whose profile matches a resource on
+eligibility, hours, ZIP code, wheelchair access, language or past outcomes sees
+it lifted above a slightly more relevant resource that does not match.
+"""
+import sys
+
+import numpy as np
+import pytest
+
+from resource_reranker import ResourceReranker, client_profile
+
+# feature -> (client data, matching resource, resource that does not match)
+CASES = {
+    'eligibility': ({'is_veteran': 'yes'}, {'target_population': 'Veterans'}, {'target_population': 'Adults'}),
+    'gender': ({'gender': 'female'}, {'eligibility': 'Adults'}, {'eligibility': 'Men only'}),
+    'hours': ({}, {'hours': 'Monday - Sunday, 9am-5pm'}, {'hours': 'Tuesdays 9am-noon'}),
+    'distance': ({'zipCode': '94110'}, {'location': '1 Main St, San Francisco, CA 94110'},
+                 {'location': '5 Broadway, New York, NY 10001'}),
+    'ada': ({'notes': 'Uses a wheelchair'}, {'ada_accessible': 'Yes'}, {'ada_accessible': 'No'}),
+    'language': ({'language': 'Spanish'}, {'languages': 'English, Spanish'}, {'languages': 'English'}),
+    'outcome': ({}, {}, {}),
+}
+# Completed and failed referrals per resource id, for the outcome case
+REFERRALS = {'matching': ['completed'] * 4, 'plain': ['declined', 'not_eligible', 'completed']}
+
+
+def _ranked(feature: str, client_data):
+    """Names in re-ranked order; 'plain' is retrieved ahead of 'matching', and 'filler' anchors the relevance span."""
+    _, matching, plain = CASES[feature]
+    resources = [dict(plain, id='plain'), dict(matching, id='matching'), {'id': 'filler'}]
+    keys = [resource['id'] for resource in resources]
+    reranker = ResourceReranker(enabled=True)
+    reranker.index_catalog(resources, keys)
+    if feature == 'outcome':
+        reranker.load_outcomes([{'resources': [{'resource_id': resource_id, 'status': status}
+                                               for resource_id, statuses in REFERRALS.items() for status in statuses]}])
+    scores = reranker.score(np.array([1.0, 0.95, 0.0]), resources, keys, client_profile(client_data))
+    return [keys[i] for i in np.argsort(-scores, kind='stable')]
+
+
+@pytest.mark.parametrize('feature', list(CASES))
+def test_matching_profile_lifts_the_resource(feature):
+    assert _ranked(feature, CASES[feature][0])[:2] == ['matching', 'plain']
+
+
+@pytest.mark.parametrize('feature', ['eligibility', 'gender', 'distance', 'ada', 'language'])
+def test_unrelated_profile_keeps_retrieval_order(feature):
+    """Client-specific features are neutral for a client who has none of them."""
+    assert _ranked(feature, {})[:2] == ['plain', 'matching']
+
+
+def test_outcome_counts_follow_status_changes():
+    """record_status moves a referral between open, completed and failed; the prior keeps new resources at 0.5."""
+    reranker = ResourceReranker(enabled=True)
+    assert reranker.outcome_rates(['new']).tolist() == [0.5]
+    reranker.record_status('r1', None, 'pending')
+    reranker.record_status('r1', 'pending', 'completed')
+    reranker.record_status('r2', None, 'declined')
+    assert np.allclose(reranker.outcome_rates(['r1', 'r2']), [2 / 3, 1 / 3])
+    reranker.record_status('r1', 'completed', 'declined')
+    assert np.allclose(reranker.outcome_rates(['r1']), [1 / 3])
+
+
+def test_disabled_reranker_and_fit_counts():
+    """Disabled, scores are the raw relevance; fit_counts reports what the reasons mention."""
+    resources = [{'id': 'a', 'target_population': 'Veterans', 'languages': 'English, Spanish',
+                  'location': 'CA 94110', 'ada_accessible': 'Yes'}, {'id': 'b'}]
+    relevance = np.array([0.2, 0.9])
+    assert ResourceReranker(enabled=False).score(relevance, resources, ['a', 'b'], client_profile({})).tolist() == \
+        relevance.astype(np.float32).tolist()
+
+    reranker = ResourceReranker(enabled=True)
+    reranker.index_catalog(resources, ['a', 'b'])
+    profile = client_profile({'is_veteran': True, 'zipCode': '94110', 'language': 'Spanish', 'has_disability': True})
+    assert reranker.fit_counts(resources, ['a', 'b'], profile) == {
+        'population': {'veterans': 1}, 'near': 1, 'ada': 1, 'language': 1, 'language_name': 'Spanish'}
+
+
+if __name__ == "__main__":
+    for name in CASES:
+        test_matching_profile_lifts_the_resource(name)
+    for name in ['eligibility', 'gender', 'distance', 'ada', 'language']:
+        test_unrelated_profile_keeps_retrieval_order(name)
+    test_outcome_counts_follow_status_changes()
+    test_disabled_reranker_and_fit_counts()
+    print("✅ Resource re-ranker tests passed")
+    sys.exit(0)
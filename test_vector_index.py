@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Tests for the NumPy vector index: exact top-k search with category and
+eligibility filters, persistence of the index across restarts, and quantized
+(float16 / int8) scanning with full-precision rescoring, and the grace period
+before an index replaced by a rebuild is deleted.
+"""
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import rag_resource_matcher
+from rag_resource_matcher import NumpyVectorIndex, RAGResourceMatcher, recall_memory_report
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=64)
+CATEGORIES = ['food', 'housing', 'transportation']
+QUERIES = [f'client question {n}' for n in range(20)]
+
+
+def _corpus(count: int = 300):
+    ids = [f'r{n}:0' for n in range(count)]
+    documents = [Document(page_content=f'resource text {n}',
+                          metadata={'resource_name': f'Resource {n}', 'category': CATEGORIES[n % 3],
+                                    'age_group': '18-24' if n % 5 == 0 else 'All ages'})
+                 for n in range(count)]
+    return ids, documents
+
+
+def _exact_top_k(documents, queries, k, keep=lambda doc: True):
+    """Reference ranking: full float32 cosine similarity over the eligible documents."""
+    matrix = NumpyVectorIndex._normalize(EMBEDDINGS.embed_documents([doc.page_content for doc in documents]))
+    vectors = NumpyVectorIndex._normalize(EMBEDDINGS.embed_documents(queries))
+    allowed = np.array([keep(doc) for doc in documents])
+    scores = np.where(allowed, vectors @ matrix.T, -np.inf)
+    return [[documents[i].metadata['resource_name'] for i in np.argsort(-row, kind='stable')[:k]] for row in scores]
+
+
+def _names(results):
+    return [[doc.metadata['resource_name'] for doc in documents] for documents in results]
+
+
+def _index(directory: Path, dtype: str = 'float32') -> NumpyVectorIndex:
+    return NumpyVectorIndex(EMBEDDINGS, directory, dtype=dtype)
+
+
+def test_exact_search_with_filters():
+    """float32 search returns exactly the brute-force top k, inside the category and eligibility filters."""
+    ids, documents = _corpus()
+    index = _index(Path(tempfile.mkdtemp()))
+    index.upsert(ids, documents)
+
+    assert _names(index.search_batch(QUERIES, 5)) == _exact_top_k(documents, QUERIES, 5)
+    assert _names(index.search_batch(QUERIES, 5, 'housing')) == \
+        _exact_top_k(documents, QUERIES, 5, lambda doc: doc.metadata['category'] == 'housing')
+    assert _names(index.search_batch(QUERIES, 5, 'food', {'age': 40})) == \
+        _exact_top_k(documents, QUERIES, 5, lambda doc: doc.metadata['category'] == 'food'
+                     and doc.metadata['age_group'] == 'All ages')
+
+    hits = index.search_hits(EMBEDDINGS.embed_documents(QUERIES[:1]), 3)[0]
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+    assert all(abs(np.linalg.norm(hit.vector) - 1) < 1e-5 for hit in hits)
+    assert index.search(QUERIES[0], 5, 'no-such-category') == []
+
+
+def test_persisted_index_reloads():
+    """A new index over the same directory memory-maps the saved matrix and answers identically."""
+    directory = Path(tempfile.mkdtemp())
+    ids, documents = _corpus()
+    index = _index(directory)
+    index.upsert(ids, documents)
+    index.delete(ids[:10])
+    index.upsert([ids[10]], [Document(page_content='replaced text', metadata=documents[10].metadata)])
+    expected = _names(index.search_batch(QUERIES, 5, 'housing'))
+
+    reloaded = _index(directory)
+    assert reloaded.ids() == index.ids() and len(reloaded.ids()) == len(ids) - 10
+    assert isinstance(reloaded._state.matrix, np.memmap)
+    assert _names(reloaded.search_batch(QUERIES, 5, 'housing')) == expected
+    assert reloaded.search('replaced text', 1)[0].metadata['resource_name'] == 'Resource 10'
+
+    reloaded.reset()
+    assert _index(directory).ids() == []
+
+
+def test_quantized_search_agrees_with_float32():
+    """float16 and int8 scans, re-scored at full precision, return the float32 top k in float32 order."""
+    ids, documents = _corpus()
+    directory = Path(tempfile.mkdtemp())
+    exact = _index(directory)
+    exact.upsert(ids, documents)
+    truth = _names(exact.search_batch(QUERIES, 5))
+    for dtype, max_bytes in (('float16', exact.memory_bytes() // 2), ('int8', exact.memory_bytes() // 4 + 4 * len(ids))):
+        # The quantized copy is built from the persisted float32 matrix on load
+        quantized = _index(directory, dtype)
+        assert quantized.memory_bytes() <= max_bytes, dtype
+        assert _names(quantized.search_batch(QUERIES, 5)) == truth, dtype
+        assert _names(quantized.search_batch(QUERIES, 5, 'housing', {'age': 40})) == \
+            _names(exact.search_batch(QUERIES, 5, 'housing', {'age': 40})), dtype
+
+
+def test_recall_memory_report():
+    """The offline report gives full recall for exact float32 and shrinks scan memory with the dtype."""
+    matrix = np.asarray(EMBEDDINGS.embed_documents([f'resource text {n}' for n in range(200)]))
+    report = {(row['dimensions'], row['dtype']): row for row in
+              recall_memory_report(matrix, dimensions=(64, 32), sample=50)}
+    assert report[(64, 'float32')]['recall_at_k'] == 1.0
+    assert report[(64, 'int8')]['recall_at_k'] >= 0.9
+    assert report[(64, 'float16')]['scan_bytes'] == report[(64, 'float32')]['scan_bytes'] // 2
+    assert report[(32, 'float32')]['scan_bytes'] == report[(64, 'float32')]['scan_bytes'] // 2
+
+
+def test_rebuild_keeps_the_replaced_index_for_in_flight_searches():
+    """The index swapped out by a rebuild still answers searches until the grace period has passed."""
+    directory = Path(tempfile.mkdtemp())
+    catalog = directory / 'structured_resources.json'
+    catalog.write_text(json.dumps(json.loads(rag_resource_matcher.RESOURCES_FILE.read_text())[:5]))
+    patched = {'RESOURCES_FILE': catalog, 'VECTOR_INDEX_DIR': directory, 'VECTOR_ENGINE': 'numpy',
+               'RETRIEVAL_MODE': 'lexical', 'INDEX_DISCARD_GRACE_SECONDS': 0.5}
+    original = {name: getattr(rag_resource_matcher, name) for name in patched}
+    for name, value in patched.items():
+        setattr(rag_resource_matcher, name, value)
+    try:
+        matcher = RAGResourceMatcher()
+        matcher.embeddings = EMBEDDINGS
+        ids, documents = _corpus(20)
+        previous = _index(directory / 'numpy-previous')
+        previous.upsert(ids, documents)
+        matcher.index = previous
+
+        matcher._rebuild_index()
+        assert matcher.index is not previous and len(matcher.index.ids()) > 0
+        # A search that picked up the old index before the swap still gets results
+        assert len(previous.search(QUERIES[0], 3)) == 3
+        assert previous.directory.exists()
+
+        time.sleep(1.0)
+        assert not previous.directory.exists()
+        assert (directory / 'ACTIVE-numpy').read_text() == matcher.index.directory.name
+    finally:
+        for name, value in original.items():
+            setattr(rag_resource_matcher, name, value)
+
+
+if __name__ == "__main__":
+    test_exact_search_with_filters()
+    test_persisted_index_reloads()
+    test_quantized_search_agrees_with_float32()
+    test_recall_memory_report()
+    test_rebuild_keeps_the_replaced_index_for_in_flight_searches()
+    print("✅ Vector index tests passed")
+    sys.exit(0)